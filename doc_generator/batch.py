@@ -0,0 +1,236 @@
+import contextlib
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from doc_generator import my_logging, generate_doc
+from doc_generator.concurrent_extraction import ConcurrentExtraction
+from doc_generator.fb_gateway import FirebirdGateway, DEFAULT_ARRAY_SIZE
+from doc_generator.generate_doc import (
+    ProcedureDataFactory,
+    TablesDataFactory,
+    RenderJob,
+    get_render_jobs,
+    get_tables_rows,
+    render_to_file,
+    write_data_files,
+    TEMPLATE_DIR,
+)
+from doc_generator.incremental import IncrementalManifest, get_templates_version
+from doc_generator.instrumentation import instrumentation
+from doc_generator.models import DatabaseSummary, Procedure, ProceduresSummary, Table, TablesSummary
+from doc_generator.output import SubdirectorySink
+from doc_generator.search_index import write_search_index
+from doc_generator.snapshot import SnapshotGateway
+
+
+logger = my_logging.Logger()  # pylint: disable=invalid-name
+
+DEFAULT_BATCH_CONCURRENCY = 4
+
+Catalog = Tuple[ProceduresSummary, Dict[str, Procedure], TablesSummary, Iterable[Table]]
+
+
+class BatchDatabase(NamedTuple):
+    """
+    База данных пакетного режима: подключение (или снимок) и имя подкаталога ее документации
+    """
+
+    name: str
+    dsn: Optional[str] = None
+    snapshot: Optional[str] = None
+    user: str = "sysdba"
+    password: str = "masterkey"
+    charset: str = "UTF8"
+
+
+def get_database_name(source: str) -> str:
+    """
+    Имя подкаталога по строке подключения или пути: имя файла БД без расширения
+    """
+    file_name = re.split(r"[/\\:]", source.rstrip("/\\"))[-1]
+    name = re.sub(r"[^\w.-]", "_", os.path.splitext(file_name)[0])
+    return name or "database"
+
+
+def _get_unique_names(databases: Iterable[BatchDatabase]) -> List[BatchDatabase]:
+    result = []
+    used = set()
+    for database in databases:
+        name = database.name
+        suffix = 1
+        while name in used:
+            suffix += 1
+            name = f"{database.name}-{suffix}"
+        used.add(name)
+        result.append(database._replace(name=name))
+    return result
+
+
+def get_batch_databases(dsns: Iterable[str], **defaults: Any) -> List[BatchDatabase]:
+    return _get_unique_names(BatchDatabase(name=get_database_name(dsn), dsn=dsn, **defaults) for dsn in dsns)
+
+
+def load_batch_config(path: str, **defaults: Any) -> List[BatchDatabase]:
+    """
+    Список баз из JSON-файла вида {"databases": [{"dsn": ..., "name": ..., "user": ..., "password": ...}, ...]}.
+    Вместо dsn можно указать snapshot - путь к снимку схемы. Незаданные параметры берутся из defaults
+    """
+    with open(path, encoding="utf-8") as config_file:
+        config = json.load(config_file)
+
+    databases = []
+    for entry in config["databases"]:
+        source = entry.get("dsn") or entry.get("snapshot")
+        if not source:
+            raise ValueError(f"В описании базы данных не указан dsn или snapshot: {entry}")
+        options = {**defaults, **entry}
+        options.setdefault("name", get_database_name(source))
+        options["name"] = re.sub(r"[^\w.-]", "_", options["name"])
+        databases.append(BatchDatabase(**options))
+    return _get_unique_names(databases)
+
+
+def get_database_gateway(database: BatchDatabase, array_size: int = DEFAULT_ARRAY_SIZE):
+    if database.snapshot:
+        return SnapshotGateway(path=database.snapshot)
+
+    return FirebirdGateway(
+        dsn=database.dsn,
+        user=database.user,
+        password=database.password,
+        charset=database.charset,
+        array_size=array_size,
+    )
+
+
+def extract_catalog(gateway, connections: int = 1, stream_tables: bool = False) -> Catalog:
+    """
+    Выборка каталога и построение моделей процедур и таблиц одной базы данных.
+    С stream_tables таблицы не выбираются заранее, а возвращаются потоком (TablesDataFactory.iter_tables),
+    который выбирает поля при рендеринге. Поток читается после закрытия пула соединений, поэтому весь каталог
+    в этом режиме выбирается через основное соединение, в одной транзакции с полями
+    """
+    if connections > 1 and not stream_tables and isinstance(gateway, FirebirdGateway):
+        extraction = ConcurrentExtraction(gateway, pool_size=connections)
+    else:
+        extraction = contextlib.nullcontext()
+
+    with instrumentation.span("extract"), extraction:
+        procedure_data_factory = ProcedureDataFactory(gateway=gateway)
+        procedures_summary, procedures = procedure_data_factory.get_data()
+
+        tables_data_factory = TablesDataFactory(gateway=gateway)
+        tables_summary = tables_data_factory.get_tables_summary()
+        if stream_tables:
+            tables = tables_data_factory.iter_tables(procedure_data_factory.reverse_dependencies)
+        else:
+            tables = tables_data_factory.get_tables(procedure_data_factory.reverse_dependencies)
+
+    return procedures_summary, procedures, tables_summary, tables
+
+
+class BatchGeneration:
+    """
+    Документация нескольких баз данных за один запуск.
+
+    Выборка идет в пуле потоков: одновременно выбирается не больше concurrency баз, и столько же
+    выбранных каталогов может ждать рендеринга. Задания на страницы всех баз отдаются одним потоком
+    в общий render (и общий пул процессов рендеринга) по мере готовности каталогов, поэтому рендеринг
+    одной базы идет параллельно с выборкой следующих. Шаблоны компилируются один раз на процесс.
+
+    Сайт каждой базы пишется в свой подкаталог, общее оглавление - в index.html
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        databases: List[BatchDatabase],
+        get_gateway: Callable[[BatchDatabase], Any] = get_database_gateway,
+        concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+        connections: int = 1,
+        incremental: bool = False,
+    ) -> None:
+        self._databases = databases
+        self._get_gateway = get_gateway
+        self._concurrency = max(concurrency, 1)
+        self._connections = connections
+        self._incremental = incremental
+        self._manifests: List[Tuple[str, IncrementalManifest]] = []
+        self.summaries: Dict[str, DatabaseSummary] = {}
+
+    def _extract(self, database: BatchDatabase) -> Catalog:
+        return extract_catalog(self._get_gateway(database), self._connections)
+
+    def _get_database_jobs(self, database: BatchDatabase, catalog: Catalog) -> Iterator[RenderJob]:
+        procedures_summary, procedures, tables_summary, tables = catalog
+        self.summaries[database.name] = DatabaseSummary(
+            name=database.name, procedures_summary=procedures_summary, tables_summary=tables_summary
+        )
+
+        target = SubdirectorySink(generate_doc.sink, database.name)
+        write_search_index(procedures.values(), tables, target)
+        write_data_files(procedures, get_tables_rows(tables), target)
+
+        jobs = get_render_jobs(procedures_summary, procedures, tables_summary, tables)
+        if self._incremental:
+            manifest = IncrementalManifest(
+                output_dir=target.output_dir,
+                templates_version=get_templates_version(TEMPLATE_DIR),
+            )
+            self._manifests.append((database.name, manifest))
+            jobs = manifest.select(jobs)
+
+        for job in jobs:
+            yield job._replace(output_file=f"{database.name}/{job.output_file}")
+
+    def get_jobs(self) -> Iterator[RenderJob]:
+        """
+        Задания на страницы всех баз в порядке готовности их каталогов.
+        Ошибка выборки одной базы пишется в лог и в оглавление и не останавливает остальные
+        """
+        databases = iter(self._databases)
+        pending: Dict[Future, BatchDatabase] = {}
+        with ThreadPoolExecutor(max_workers=self._concurrency, thread_name_prefix="batch-extract") as executor:
+
+            def submit_next() -> None:
+                database = next(databases, None)
+                if database is not None:
+                    pending[executor.submit(self._extract, database)] = database
+
+            for _ in range(self._concurrency):
+                submit_next()
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    database = pending.pop(future)
+                    submit_next()
+                    try:
+                        catalog = future.result()
+                    except Exception as error:  # pylint: disable=broad-except
+                        logger.log(f"database {database.name}: {error!r}", level=logging.ERROR)
+                        self.summaries[database.name] = DatabaseSummary(name=database.name, error=str(error))
+                        continue
+                    logger.log(f"database {database.name} extracted")
+                    yield from self._get_database_jobs(database, catalog)
+
+    def finish(self) -> List[DatabaseSummary]:
+        """
+        Удаление устаревших страниц (в инкрементальном режиме) и запись общего оглавления
+        """
+        with instrumentation.span("manifest"):
+            for name, manifest in self._manifests:
+                stale_files = manifest.remove_stale()
+                manifest.save()
+                logger.log(f"database {name}: removed {len(stale_files)} stale pages")
+
+        summaries = [self.summaries[database.name] for database in self._databases if database.name in self.summaries]
+        render_to_file("databases.html", "index.html", databases=summaries)
+        return summaries
+
+    def run(self, render: Callable[[Iterable[RenderJob]], None]) -> List[DatabaseSummary]:
+        render(self.get_jobs())
+        return self.finish()
@@ -0,0 +1,381 @@
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, make_dataclass, replace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
+
+from doc_generator.fb_gateway import FirebirdGateway, DEFAULT_ARRAY_SIZE
+from doc_generator.fb_row_models import FieldRow, ProcedureDependencyRow
+from doc_generator.generate_doc import (
+    ProcedureDataFactory,
+    TablesDataFactory,
+    RenderJob,
+    get_render_jobs,
+    get_data_files,
+    get_tables_rows,
+    env,
+    TEMPLATE_CACHE_ENV,
+)
+from doc_generator.psql_analyzer import scan_source, source_analyzer
+from doc_generator.source_store import read_text
+from doc_generator.synthetic_catalog import SyntheticCatalogConfig, generate_catalog
+
+
+BENCHMARK_VERSION = 1
+
+STAGES: Tuple[str, ...] = ("procedures", "tables", "render")
+
+DEFAULT_SIZES: Tuple[int, ...] = (1000, 10000, 50000)
+
+
+class StageResult(NamedTuple):
+    """
+    Время и пиковый прирост памяти (tracemalloc) на этапе конвейера
+    """
+
+    seconds: float
+    peak_memory: int
+
+
+def render_to_sink(jobs: Iterable[RenderJob]) -> int:
+    """
+    Рендеринг страниц без записи на диск, чтобы пороги не зависели от файловой системы. Возвращает объем в символах
+    """
+    size = 0
+    for job in jobs:
+        for chunk in env.get_template(job.template).generate(**job.context):
+            size += len(chunk)
+    return size
+
+
+def _run_pipeline(gateway: Any, measure: Callable[[str, Callable[[], Any]], Any]) -> None:
+    source_analyzer.clear()
+    procedure_data_factory = ProcedureDataFactory(gateway=gateway)
+    procedures_summary, procedures = measure("procedures", procedure_data_factory.get_data)
+
+    tables_data_factory = TablesDataFactory(gateway=gateway)
+    tables_summary, tables = measure(
+        "tables",
+        lambda: (
+            tables_data_factory.get_tables_summary(),
+            tables_data_factory.get_tables(procedure_data_factory.reverse_dependencies),
+        ),
+    )
+
+    measure(
+        "render",
+        lambda: render_to_sink(get_render_jobs(procedures_summary, procedures, tables_summary, tables))
+        + sum(len(data) for _, data in get_data_files(procedures, get_tables_rows(tables))),
+    )
+
+
+def _measure_time(function: Callable[[], Any]) -> Tuple[Any, float]:
+    gc.collect()
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def _measure_memory(function: Callable[[], Any]) -> Tuple[Any, int]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def benchmark_catalog(
+    config: SyntheticCatalogConfig, repeat: int = 1, trace_memory: bool = True
+) -> Dict[str, StageResult]:
+    """
+    Время этапа - минимум по repeat прогонам без трассировки памяти, память - отдельный прогон под tracemalloc,
+    потому что трассировка в разы замедляет выполнение. Без trace_memory пиковая память не измеряется (0)
+    """
+    gateway = generate_catalog(config)
+    seconds: Dict[str, float] = {}
+    peak_memory: Dict[str, int] = {}
+
+    def measure_time(stage: str, function: Callable[[], Any]) -> Any:
+        result, elapsed = _measure_time(function)
+        seconds[stage] = min(elapsed, seconds.get(stage, elapsed))
+        return result
+
+    def measure_memory(stage: str, function: Callable[[], Any]) -> Any:
+        result, peak_memory[stage] = _measure_memory(function)
+        return result
+
+    for _ in range(repeat):
+        _run_pipeline(gateway, measure_time)
+    if trace_memory:
+        _run_pipeline(gateway, measure_memory)
+
+    return {stage: StageResult(seconds=seconds[stage], peak_memory=peak_memory.get(stage, 0)) for stage in STAGES}
+
+
+def run_benchmark(
+    base_config: SyntheticCatalogConfig,
+    sizes: Iterable[int] = DEFAULT_SIZES,
+    repeat: int = 1,
+    trace_memory: bool = True,
+) -> Dict[str, Any]:
+    results = {}
+    for size in sizes:
+        stages = benchmark_catalog(replace(base_config, procedures=size), repeat=repeat, trace_memory=trace_memory)
+        results[str(size)] = {stage: result._asdict() for stage, result in stages.items()}
+
+    return {
+        "version": BENCHMARK_VERSION,
+        "python": platform.python_version(),
+        "config": asdict(base_config),
+        "results": results,
+    }
+
+
+# Время до первой страницы в новом процессе: импорт, компиляция всех шаблонов (как в процессе-обработчике)
+# и рендеринг главной страницы
+STARTUP_SCRIPT = """
+import os
+from doc_generator.generate_doc import env, TEMPLATE_DIR
+for template_name in os.listdir(TEMPLATE_DIR):
+    env.get_template(template_name)
+env.get_template("index.html").render()
+"""
+
+STARTUP_MODES: Tuple[str, ...] = ("no_cache", "cold_cache", "warm_cache")
+
+
+def _measure_startup(cache_dir: str) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=dict(os.environ, **{TEMPLATE_CACHE_ENV: cache_dir}),
+    )
+    return time.perf_counter() - started
+
+
+def benchmark_startup(repeat: int = 3) -> Dict[str, float]:
+    """
+    Минимальное по repeat запускам время до первой отрендеренной страницы без кеша шаблонов,
+    с пустым кешем (первый запуск) и с заполненным кешем (повторные запуски)
+    """
+    results: Dict[str, List[float]] = {mode: [] for mode in STARTUP_MODES}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for attempt in range(repeat):
+            results["no_cache"].append(_measure_startup(""))
+            cache_dir = os.path.join(temp_dir, str(attempt))
+            results["cold_cache"].append(_measure_startup(cache_dir))
+            results["warm_cache"].append(_measure_startup(cache_dir))
+    return {mode: min(seconds) for mode, seconds in results.items()}
+
+
+def format_startup(startup: Dict[str, float]) -> str:
+    return "\n".join(f"{'startup':>8} {mode:<12} {seconds:>10.3f}" for mode, seconds in startup.items())
+
+
+class FetchResult(NamedTuple):
+    """
+    Скорость выборки строк каталога и память, занимаемая выбранными строками, в пересчете на строку
+    """
+
+    rows_per_second: float
+    bytes_per_row: float
+
+
+class FetchCase(NamedTuple):
+    """
+    Выборка шлюза: метод, модель строки, поля модели в порядке колонок запроса
+    и поля, которые прежняя выборка через itermap обрезала
+    """
+
+    method: str
+    row_type: Type[NamedTuple]
+    columns: Tuple[str, ...]
+    stripped: Tuple[str, ...]
+
+
+FETCH_CASES: Tuple[FetchCase, ...] = (
+    FetchCase(
+        "get_procedure_dependencies",
+        ProcedureDependencyRow,
+        ("procedure_name", "name", "field", "type"),
+        ("procedure_name", "name"),
+    ),
+    FetchCase("get_fields", FieldRow, ("table_name", "name", "description", "type", "length"), ()),
+)
+
+# itermap - построчные словари в датаклассы с обрезанными именами (выборка шлюза до перехода на fetchmany),
+# fetchmany - позиционные кортежи пачками в NamedTuple-строки (текущие методы FirebirdGateway)
+FETCH_MODES: Tuple[str, ...] = ("itermap", "fetchmany")
+
+# Длина имен объектов Firebird: CHAR(31), дополненный пробелами
+NAME_LENGTH = 31
+
+
+class BenchmarkCursor:
+    """
+    Курсор с заранее подготовленными строками: выборка без сервера, с обоими способами чтения курсора fdb
+    """
+
+    def __init__(self, rows: List[Tuple[Any, ...]], columns: Tuple[str, ...]) -> None:
+        self._rows = rows
+        self._columns = columns
+        self._position = 0
+
+    def execute(self, query: str) -> "BenchmarkCursor":  # pylint: disable=unused-argument
+        self._position = 0
+        return self
+
+    def fetchmany(self, size: int) -> List[Tuple[Any, ...]]:
+        rows = self._rows[self._position:self._position + size]
+        self._position += size
+        return rows
+
+    def itermap(self) -> Iterator[Dict[str, Any]]:
+        for row in self._rows:
+            yield dict(zip(self._columns, row))
+
+
+def _get_name(prefix: str, number: int) -> str:
+    return f"{prefix}_{number}".ljust(NAME_LENGTH)
+
+
+def get_fetch_rows(case: FetchCase, rows_count: int) -> List[Tuple[Any, ...]]:
+    """
+    Строки, как их возвращает курсор fdb: имена дополнены пробелами и повторяются в соседних строках
+    """
+    if case.row_type is FieldRow:
+        return [
+            (_get_name("TABLE", number // 40), _get_name("FIELD", number % 40), None, 37, 64)
+            for number in range(rows_count)
+        ]
+    return [
+        (_get_name("PROCEDURE", number // 8), _get_name("PROCEDURE", number % 1000), None, 5)
+        for number in range(rows_count)
+    ]
+
+
+def _fetch_itermap(cursor: BenchmarkCursor, case: FetchCase) -> Iterator[Any]:
+    row_type = make_dataclass(case.row_type.__name__, case.row_type._fields)
+    for row in cursor.execute("").itermap():
+        yield row_type(**{name: value.strip() if name in case.stripped else value for name, value in row.items()})
+
+
+def _fetch(mode: str, case: FetchCase, rows: List[Tuple[Any, ...]], array_size: int) -> Tuple[Any, ...]:
+    cursor = BenchmarkCursor(rows, case.columns)
+    if mode == "itermap":
+        return tuple(_fetch_itermap(cursor, case))
+    gateway = FirebirdGateway("", "", "", array_size=array_size)
+    gateway.set_thread_cursor(cursor)
+    return tuple(getattr(gateway, case.method)())
+
+
+def benchmark_fetch(
+    rows_count: int = 300000, repeat: int = 3, array_size: int = DEFAULT_ARRAY_SIZE
+) -> Dict[str, Dict[str, FetchResult]]:
+    """
+    Выборка rows_count строк каждым способом из FETCH_MODES: лучшая по repeat замерам скорость и объем,
+    который выбранные строки занимают в памяти (tracemalloc) - исходные строки курсора в него не входят
+    """
+    results: Dict[str, Dict[str, FetchResult]] = {}
+    for case in FETCH_CASES:
+        rows = get_fetch_rows(case, rows_count)
+        results[case.method] = {}
+        for mode in FETCH_MODES:
+            seconds: Optional[float] = None
+            for _ in range(repeat):
+                _, elapsed = _measure_time(lambda: _fetch(mode, case, rows, array_size))
+                seconds = elapsed if seconds is None else min(seconds, elapsed)
+            gc.collect()
+            tracemalloc.start()
+            try:
+                fetched = _fetch(mode, case, rows, array_size)
+                size, _ = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            results[case.method][mode] = FetchResult(
+                rows_per_second=len(fetched) / seconds, bytes_per_row=size / len(fetched)
+            )
+    return results
+
+
+def format_fetch(fetch: Dict[str, Dict[str, FetchResult]]) -> str:
+    lines = [f"{'method':<28} {'mode':<10} {'rows/s':>10} {'bytes/row':>10}"]
+    for method, modes in fetch.items():
+        for mode, result in modes.items():
+            lines.append(f"{method:<28} {mode:<10} {result.rows_per_second:>10.0f} {result.bytes_per_row:>10.1f}")
+    return "\n".join(lines)
+
+
+def benchmark_scan(source_length: int = 4000000, repeat: int = 3) -> Dict[str, float]:
+    """
+    Скорость лексического анализа (scan_source, без кеша) одного синтетического исходника длиной source_length
+    символов: лучшее по repeat замерам время и символов в секунду
+    """
+    config = SyntheticCatalogConfig(procedures=1, source_length=source_length, udf_ratio=1.0)
+    text = read_text(next(iter(generate_catalog(config).get_procedures())).source)
+    seconds = min(_measure_time(lambda: scan_source(text))[1] for _ in range(repeat))
+    return {"chars": len(text), "seconds": seconds, "chars_per_second": len(text) / seconds}
+
+
+def format_scan(scan: Dict[str, float]) -> str:
+    return (
+        f"{'scan':>8} {scan['chars']:>12} chars {scan['seconds']:>10.3f}s "
+        f"{scan['chars_per_second'] / 1e6:>8.1f} Mchar/s"
+    )
+
+
+def find_regressions(  # pylint: disable=too-many-arguments
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+    time_threshold: float = 1.5,
+    memory_threshold: float = 1.5,
+    min_seconds: float = 0.05,
+) -> List[str]:
+    """
+    Этапы, время или память которых выросли относительно базового отчета больше чем в threshold раз.
+    Этапы быстрее min_seconds по времени не сравниваются: на них доминирует шум
+    """
+    regressions = []
+    for size, stages in report["results"].items():
+        for stage, result in stages.items():
+            try:
+                base = baseline["results"][size][stage]
+            except KeyError:
+                continue
+
+            if base["seconds"] >= min_seconds and result["seconds"] > base["seconds"] * time_threshold:
+                regressions.append(f"{size}/{stage}: время {base['seconds']:.3f}s -> {result['seconds']:.3f}s")
+            if base["peak_memory"] and result["peak_memory"] > base["peak_memory"] * memory_threshold:
+                regressions.append(f"{size}/{stage}: память {base['peak_memory']} -> {result['peak_memory']} байт")
+    return regressions
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as source:
+        return json.load(source)
+
+
+def save_report(report: Dict[str, Any], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as out:
+        json.dump(report, out, ensure_ascii=False, indent=2)
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"{'size':>8} {'stage':<12} {'seconds':>10} {'peak MiB':>10}"]
+    for size, stages in report["results"].items():
+        for stage, result in stages.items():
+            lines.append(
+                f"{size:>8} {stage:<12} {result['seconds']:>10.3f} {result['peak_memory'] / 2 ** 20:>10.1f}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,162 @@
+from typing import Dict, Iterable, Iterator, List, Mapping, Set
+
+from doc_generator.models import CallGraphMetrics, RuntimeCost
+
+
+def _pop_component(root: str, stack: List[str], on_stack: Set[str]) -> List[str]:
+    component = []
+    while True:
+        member = stack.pop()
+        on_stack.discard(member)
+        component.append(member)
+        if member == root:
+            return component
+
+
+def get_strongly_connected_components(graph: Mapping[str, Iterable[str]]) -> List[List[str]]:
+    """
+    Компоненты сильной связности графа (итеративный алгоритм Тарьяна).
+
+    Компоненты возвращаются в обратном топологическом порядке: каждая компонента идет после всех,
+    до которых из нее можно дойти.
+    """
+    index: Dict[str, int] = {}
+    low_link: Dict[str, int] = {}
+    on_stack: Set[str] = set()
+    stack: List[str] = []
+    components: List[List[str]] = []
+
+    for root in graph:
+        if root in index:
+            continue
+
+        index[root] = low_link[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low_link[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    break
+                if successor in on_stack:
+                    low_link[node] = min(low_link[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[node])
+                if low_link[node] == index[node]:
+                    components.append(_pop_component(node, stack, on_stack))
+
+    return components
+
+
+def get_component_map(components: List[List[str]]) -> Dict[str, int]:
+    """
+    Узел -> номер его компоненты сильной связности
+    """
+    return {node: component_number for component_number, component in enumerate(components) for node in component}
+
+
+def get_call_graph_metrics(graph: Mapping[str, Iterable[str]]) -> Dict[str, CallGraphMetrics]:
+    """
+    Метрики полного транзитивного графа вызовов без построения деревьев.
+
+    Компоненты сильной связности сжимаются в узлы ациклического графа, который обходится один раз
+    в обратном топологическом порядке (в нем их и возвращает алгоритм Тарьяна): множество достижимых
+    процедур компоненты - объединение битовых масок ее преемников, глубина - самый длинный путь до листа.
+    Вызовы внутри компоненты глубину не увеличивают: самый длинный простой путь в цикле не вычислим
+    за линейное время.
+    """
+    components = get_strongly_connected_components(graph)
+    component_map = get_component_map(components)
+    numbers = {node: number for number, node in enumerate(component_map)}
+
+    fan_in: Dict[str, int] = dict.fromkeys(component_map, 0)
+    successors: Dict[str, Set[str]] = {}
+    for node in component_map:
+        successors[node] = set(graph.get(node, ()))
+        for successor in successors[node]:
+            fan_in[successor] += 1
+
+    reachable: List[int] = []
+    depths: List[int] = []
+    metrics = {}
+    for component_number, component in enumerate(components):
+        members = 0
+        for node in component:
+            members |= 1 << numbers[node]
+        is_cycle = len(component) > 1 or component[0] in successors[component[0]]
+
+        component_reachable = members if is_cycle else 0
+        depth = 0
+        for node in component:
+            for successor in successors[node]:
+                successor_component = component_map[successor]
+                if successor_component != component_number:
+                    component_reachable |= reachable[successor_component] | 1 << numbers[successor]
+                    depth = max(depth, depths[successor_component] + 1)
+        reachable.append(component_reachable)
+        depths.append(depth)
+
+        closure_size = bin(component_reachable).count("1")
+        for node in component:
+            metrics[node] = CallGraphMetrics(
+                # Сама процедура в свое замыкание не входит, даже если вызывает себя через цикл
+                closure_size=closure_size - 1 if is_cycle else closure_size,
+                depth=depth,
+                fan_in=fan_in[node],
+                fan_out=len(successors[node]),
+                cycle_size=len(component) if is_cycle else 0,
+            )
+
+    return metrics
+
+
+def _iter_bits(mask: int) -> Iterator[int]:
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+def roll_up_costs(graph: Mapping[str, Iterable[str]], costs: Mapping[str, RuntimeCost]) -> Dict[str, RuntimeCost]:
+    """
+    Стоимость процедур вместе со всеми транзитивно вызываемыми: сумма собственных стоимостей процедуры
+    и ее замыкания, каждая процедура - один раз, даже если достижима несколькими путями.
+
+    Обход тот же, что в get_call_graph_metrics, но битовые маски строятся только по процедурам со стоимостью:
+    их обычно немного, и маски остаются короткими. Процедуры, до которых не дошли вызовы со стоимостью, в результат
+    не попадают
+    """
+    components = get_strongly_connected_components(graph)
+    component_map = get_component_map(components)
+    costed = [node for node in component_map if node in costs]
+    numbers = {node: number for number, node in enumerate(costed)}
+
+    # Процедуры со стоимостью в компоненте и во всех достижимых из нее
+    reachable: List[int] = []
+    totals = {}
+    for component_number, component in enumerate(components):
+        component_reachable = 0
+        for node in component:
+            if node in numbers:
+                component_reachable |= 1 << numbers[node]
+            for successor in graph.get(node, ()):
+                successor_component = component_map[successor]
+                if successor_component != component_number:
+                    component_reachable |= reachable[successor_component]
+        reachable.append(component_reachable)
+
+        if component_reachable:
+            total = sum((costs[costed[number]] for number in _iter_bits(component_reachable)), RuntimeCost())
+            for node in component:
+                totals[node] = total
+
+    return totals
@@ -0,0 +1,133 @@
+import queue
+import struct
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import fdb
+
+from doc_generator import my_logging
+from doc_generator.fb_gateway import fetch_instrumented
+
+
+logger = my_logging.Logger()  # pylint: disable=invalid-name
+
+# Выборки каталога, которые выполняются параллельно
+CATALOG_METHODS: Tuple[str, ...] = (
+    "get_procedures",
+    "get_procedure_dependencies",
+    "get_procedure_parameters",
+    "get_fields",
+    "get_tables",
+    "get_index_segments",
+    "get_procedures_count",
+    "get_procedures_description_count",
+    "get_tables_count",
+    "get_tables_description_count",
+)
+
+SNAPSHOT_NUMBER_QUERY = "select rdb$get_context('SYSTEM', 'SNAPSHOT_NUMBER') from rdb$database"
+
+# Firebird 4+: начать snapshot-транзакцию на указанном номере снимка
+ISC_TPB_AT_SNAPSHOT_NUMBER = 23
+
+
+def get_read_only_tpb(snapshot_number: Optional[int] = None) -> bytes:
+    """
+    Параметры read-only транзакции уровня snapshot (concurrency), опционально на заданном номере снимка
+    """
+    tpb = fdb.TPB()
+    tpb.access_mode = fdb.isc_tpb_read
+    tpb.isolation_level = fdb.isc_tpb_concurrency
+    rendered = tpb.render()
+    if snapshot_number is not None:
+        rendered += bytes((ISC_TPB_AT_SNAPSHOT_NUMBER, 8)) + struct.pack("<q", snapshot_number)
+    return rendered
+
+
+class ConcurrentExtraction:
+    """
+    Параллельное выполнение выборок каталога через пул соединений.
+
+    Первое соединение открывает read-only snapshot-транзакцию и узнает номер ее снимка, остальные начинают
+    транзакции на том же номере, поэтому все выборки видят одно и то же состояние метаданных.
+    Если сервер не поддерживает общий номер снимка (Firebird < 4), выборки выполняются через одно соединение.
+
+    Результаты попадают в кеш шлюза по мере готовности: метод шлюза, вызванный фабрикой данных,
+    ждет только свою выборку.
+    """
+
+    def __init__(self, gateway: Any, pool_size: int = 4, methods: Tuple[str, ...] = CATALOG_METHODS) -> None:
+        self._gateway = gateway
+        self._pool_size = pool_size
+        self._methods = methods
+        self._connections: List[Any] = []
+        self._idle_connections: "queue.Queue[Any]" = queue.Queue()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.futures: Dict[str, Future] = {}
+
+    def _get_snapshot_number(self, connection: Any) -> Optional[int]:
+        try:
+            cursor = connection.cursor()
+            cursor.execute(SNAPSHOT_NUMBER_QUERY)
+            return int(cursor.fetchone()[0])
+        except (fdb.DatabaseError, TypeError, ValueError):
+            return None
+
+    def _open_connections(self) -> None:
+        leader = self._gateway.connect()
+        leader.begin(tpb=get_read_only_tpb())
+        self._connections.append(leader)
+
+        snapshot_number = self._get_snapshot_number(leader) if self._pool_size > 1 else None
+        if self._pool_size > 1 and snapshot_number is None:
+            logger.log("shared snapshot number is not supported, extract with a single connection")
+
+        if snapshot_number is not None:
+            for _ in range(self._pool_size - 1):
+                follower = self._gateway.connect()
+                follower.begin(tpb=get_read_only_tpb(snapshot_number))
+                self._connections.append(follower)
+
+        for connection in self._connections:
+            self._idle_connections.put(connection)
+
+    def _extract(self, method_name: str) -> None:
+        connection = self._idle_connections.get()
+        try:
+            self._gateway.set_thread_cursor(connection.cursor())
+            method = getattr(type(self._gateway), method_name).__wrapped__
+            self._gateway.cache.get_or_load(
+                self._gateway.get_cache_key(method_name),
+                lambda: fetch_instrumented(method_name, lambda: method(self._gateway)),
+            )
+        finally:
+            self._gateway.set_thread_cursor(None)
+            self._idle_connections.put(connection)
+
+    def start(self) -> "ConcurrentExtraction":
+        self._open_connections()
+        self._executor = ThreadPoolExecutor(max_workers=len(self._connections))
+        for method_name in self._methods:
+            future = self._executor.submit(self._extract, method_name)
+            self.futures[method_name] = future
+            self._gateway.pending_results[method_name] = future
+        return self
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        for method_name in self.futures:
+            self._gateway.pending_results.pop(method_name, None)
+
+        for connection in self._connections:
+            connection.commit()
+            connection.close()
+        self._connections = []
+
+    def __enter__(self) -> "ConcurrentExtraction":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
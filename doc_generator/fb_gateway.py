@@ -1,12 +1,15 @@
-from typing import Optional, Dict, Tuple, List, Any, Union, Iterator, Callable, Generator, Type
+import sys
+import threading
+from concurrent.futures import Future
+from typing import Optional, Dict, List, Any, Iterator, Callable, Tuple
 from functools import wraps
-import itertools
-
-import copy
 
 import fdb
 
 from doc_generator import my_logging
+from doc_generator.instrumentation import instrumentation
+from doc_generator.row_cache import RowCache, CacheKey
+from doc_generator.source_store import spill
 from doc_generator.fb_row_models import (
     ProcedureParameterRow,
     ProcedureRow,
@@ -14,45 +17,56 @@ from doc_generator.fb_row_models import (
     CountRow,
     TableRow,
     FieldRow,
+    IndexSegmentRow,
+    CallStatsRow,
+    MetadataFingerprintRow,
 )
 
 
 logger = my_logging.Logger()  # pylint: disable=invalid-name
 
+DEFAULT_ARRAY_SIZE = 1000
+
+
+def fetch_instrumented(method_name: str, fetch: Callable[[], Any]) -> Any:
+    """
+    Выполнение выборки в span fetch.<метод> с подсчетом выбранных строк
+    """
+    with instrumentation.span(f"fetch.{method_name}"):
+        result = fetch()
+        if not isinstance(result, Iterator):
+            return result
+        rows = tuple(result)
+        instrumentation.count("rows", len(rows))
+    return iter(rows)
+
 
 def with_caching(logging: bool = False) -> Callable:
-    cache = {}
+    """
+    Кеширование результата метода шлюза в кеше экземпляра (см. RowCache).
+
+    Генераторы материализуются в кортеж, поэтому повторный вызов возвращает те же строки без обращения к БД.
+    """
 
     def with_caching_decorator(method: Callable) -> Callable:
         @wraps(method)
         def with_caching_wrapper(self, *method_args: List[Any], **method_kwargs: Dict[str, Any]) -> Any:
-            Tee: Type = itertools.tee([], 1)[0].__class__  # pylint: disable=invalid-name
-
             if logging:
-                log = logger.log
-            else:
-
-                def log(*args, **kwargs):  # pylint: disable=unused-argument
-                    pass
-
-            def get_double(original: Any) -> Tuple[Any, Any]:
-                if isinstance(original, (Generator, Tee)):
-                    return original, itertools.tee(original, 1)[0]
-                else:
-                    return original, copy.deepcopy(original)
-
-            formatted_args = ", ".join(method_args)
-            log(f"Call {self.__class__.__name__}.{method.__name__}({formatted_args})")
-
-            try:
-                original, double = get_double(cache[method_args])
-                log(f"get result from cache")
-                return double
-            except KeyError:
-                log(f"execute {method.__name__}...")
-                original, double = get_double(method(self, *method_args, **method_kwargs))
-                cache[method_args] = original
-                return double
+                formatted_args = ", ".join(method_args)
+                logger.debug(f"Call {self.__class__.__name__}.{method.__name__}({formatted_args})")
+
+            def load() -> Any:
+                if logging:
+                    logger.debug(f"execute {method.__name__}...")
+                return fetch_instrumented(method.__name__, lambda: method(self, *method_args, **method_kwargs))
+
+            # Выборка уже выполняется параллельно (см. ConcurrentExtraction) - дожидаемся ее результата в кеше
+            pending = self.pending_results.get(method.__name__)
+            if pending is not None:
+                with instrumentation.span(f"wait.{method.__name__}"):
+                    pending.result()
+
+            return self.cache.get_or_load(self.get_cache_key(method.__name__, method_args), load)
 
         return with_caching_wrapper
 
@@ -62,45 +76,175 @@ def with_caching(logging: bool = False) -> Callable:
 class FirebirdGateway:
     _cursor: Optional[fdb.Cursor] = None
 
-    def __init__(self, dsn: str, user: str, password: str, charset: str = "UTF8") -> None:
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        dsn: str,
+        user: str,
+        password: str,
+        charset: str = "UTF8",
+        cache: Optional[RowCache] = None,
+        array_size: int = DEFAULT_ARRAY_SIZE,
+    ) -> None:
         self._dsn = dsn
         self._user = user
         self._password = password
         self._charset = charset
+        self.cache = cache if cache is not None else RowCache()
+        self.array_size = array_size
+        self.pending_results: Dict[str, Future] = {}
+        self._local = threading.local()
+
+    @property
+    def cache_scope(self) -> str:
+        return self._dsn
+
+    def get_cache_key(self, method_name: str, method_args: Tuple[Any, ...] = ()) -> CacheKey:
+        return self.cache_scope, method_name, method_args
+
+    def invalidate_cache(self, method_name: Optional[str] = None) -> int:
+        return self.cache.invalidate(scope=self.cache_scope, method_name=method_name)
 
     @staticmethod
     def _get_normalized_str_or_none(source: Optional[str]) -> Optional[str]:
         """
         Обрезание лишних пробелов, которые зачем-то возвращаются из Firebird в названиях процедур, полей и т.д.
+
+        Имена многократно повторяются в выборках параметров и зависимостей, поэтому интернируются.
         """
-        return source.strip() if source else source
+        return sys.intern(source.strip()) if source else source
+
+    def connect(self) -> fdb.Connection:
+        return fdb.connect(dsn=self._dsn, user=self._user, password=self._password, charset=self._charset)
 
     def _get_cursor(self) -> fdb.Cursor:
+        # Курсор, выданный текущему потоку пулом соединений
+        thread_cursor = getattr(self._local, "cursor", None)
+        if thread_cursor is not None:
+            return thread_cursor
+
         if not self._cursor:
-            connection = fdb.connect(dsn=self._dsn, user=self._user, password=self._password, charset=self._charset)
-            self._cursor = connection.cursor()
+            self._cursor = self.connect().cursor()
 
         return self._cursor
 
+    def set_thread_cursor(self, cursor: Optional[fdb.Cursor]) -> None:
+        self._local.cursor = cursor
+
+    @staticmethod
+    def _get_rows_size(rows: List[Tuple[Any, ...]]) -> int:
+        """
+        Примерный объем выбранных данных: длина строк и по 8 байт на остальные значения
+        """
+        return sum(len(value) if isinstance(value, str) else 8 for row in rows for value in row)
+
+    def _fetch_rows(self, query: str) -> Iterator[Tuple[Any, ...]]:
+        """
+        Построчная выдача позиционных кортежей, выбираемых из курсора пачками по array_size строк
+        """
+        cursor = self._get_cursor()
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(self.array_size)
+            if not rows:
+                return
+            instrumentation.count("bytes", self._get_rows_size(rows))
+            yield from rows
+
+    def _fetch_count(self, query: str) -> CountRow:
+        cursor = self._get_cursor()
+        cursor.execute(query)
+        return CountRow(count=cursor.fetchone()[0])
+
+    def end_transaction(self) -> None:
+        """
+        Завершение транзакции основного соединения: следующая выборка увидит изменения, закоммиченные после нее
+        """
+        if self._cursor is not None:
+            self._cursor.transaction.commit()
+
+    def get_metadata_fingerprint(self) -> MetadataFingerprintRow:
+        """
+        Отпечаток метаданных для режима наблюдения. Не кешируется и завершает транзакцию,
+        чтобы следующий опрос и повторная выборка каталога видели свежее состояние.
+
+        Размеры текстов не меняются при правке без изменения длины (x = 1 -> x = 2), поэтому в отпечаток входят
+        и суммы хешей исходников и описаний. Хеши берутся по модулю, чтобы сумма не переполняла BIGINT
+        """
+        query = """
+select
+    (select count(*) from RDB$PROCEDURES),
+    (select coalesce(max(RDB$PROCEDURE_ID), 0) from RDB$PROCEDURES),
+    (select coalesce(sum(octet_length(RDB$PROCEDURE_SOURCE)), 0) + coalesce(sum(octet_length(RDB$DESCRIPTION)), 0)
+        from RDB$PROCEDURES),
+    (select coalesce(sum(mod(hash(RDB$PROCEDURE_SOURCE), 2147483647)), 0)
+        + coalesce(sum(mod(hash(RDB$DESCRIPTION), 2147483647)), 0) from RDB$PROCEDURES),
+    (select count(*) from RDB$PROCEDURE_PARAMETERS),
+    (select count(*) from RDB$RELATIONS),
+    (select coalesce(sum(RDB$FORMAT), 0) + coalesce(sum(octet_length(RDB$DESCRIPTION)), 0) from RDB$RELATIONS),
+    (select count(*) + coalesce(sum(octet_length(RDB$DESCRIPTION)), 0) from RDB$RELATION_FIELDS),
+    (select coalesce(sum(mod(hash(RDB$DESCRIPTION), 2147483647)), 0) from RDB$RELATIONS)
+        + (select coalesce(sum(mod(hash(RDB$DESCRIPTION), 2147483647)), 0) from RDB$RELATION_FIELDS),
+    (select count(*) from RDB$DEPENDENCIES),
+    (select count(*) + coalesce(sum(RDB$INDEX_INACTIVE), 0) + coalesce(sum(RDB$STATISTICS), 0) from RDB$INDICES)
+    from RDB$DATABASE
+;
+        """
+        try:
+            cursor = self._get_cursor()
+            cursor.execute(query)
+            fingerprint = MetadataFingerprintRow._make(cursor.fetchone())
+            self.end_transaction()
+        except fdb.DatabaseError:
+            # Соединение могло быть разорвано: следующий опрос подключится заново
+            self._cursor = None
+            raise
+        return fingerprint
+
+    def get_call_stats(self) -> Iterator[CallStatsRow]:
+        """
+        Снимок выполняющихся вызовов процедур других соединений. Не кешируется: каждый вызов - новый снимок.
+        Таблицы мониторинга неизменны в пределах транзакции, поэтому после выборки транзакция завершается
+        """
+        query = """
+select
+    st.MON$ATTACHMENT_ID,
+    cs.MON$CALL_ID,
+    cs.MON$CALLER_ID,
+    cs.MON$OBJECT_NAME,
+    datediff(millisecond from cs.MON$TIMESTAMP to current_timestamp),
+    coalesce(io.MON$PAGE_READS, 0),
+    coalesce(io.MON$PAGE_FETCHES, 0),
+    coalesce(rs.MON$RECORD_SEQ_READS, 0) + coalesce(rs.MON$RECORD_IDX_READS, 0)
+    from MON$CALL_STACK as cs
+    join MON$STATEMENTS as st on st.MON$STATEMENT_ID = cs.MON$STATEMENT_ID
+    left join MON$IO_STATS as io on io.MON$STAT_ID = cs.MON$STAT_ID
+    left join MON$RECORD_STATS as rs on rs.MON$STAT_ID = cs.MON$STAT_ID
+    where
+        cs.MON$OBJECT_TYPE = 5
+        and st.MON$ATTACHMENT_ID <> current_connection
+;
+        """
+        normalize = self._get_normalized_str_or_none
+        for row in self._fetch_rows(query):
+            attachment_id, call_id, caller_id, name, elapsed_ms, page_reads, page_fetches, record_reads = row
+            yield CallStatsRow(
+                attachment_id, call_id, caller_id, normalize(name), elapsed_ms, page_reads, page_fetches, record_reads
+            )
+        self.end_transaction()
+
     @with_caching()
     def get_procedures_count(self) -> CountRow:
         query = """
 select count(*) from RDB$PROCEDURES;
         """
-        cursor = self._get_cursor().execute(query)
-        row = cursor.fetchonemap()
-
-        return CountRow(count=row["COUNT"])
+        return self._fetch_count(query)
 
     @with_caching()
     def get_procedures_description_count(self) -> CountRow:
         query = """
 select count(*) from RDB$PROCEDURES where RDB$DESCRIPTION is not null;
         """
-        cursor = self._get_cursor().execute(query)
-        row = cursor.fetchonemap()
-
-        return CountRow(count=row["COUNT"])
+        return self._fetch_count(query)
 
     @with_caching()
     def get_tables_count(self) -> CountRow:
@@ -110,10 +254,7 @@ from rdb$relations
 where rdb$view_blr is null
 and (rdb$system_flag is null or rdb$system_flag = 0);
             """
-        cursor = self._get_cursor().execute(query)
-        row = cursor.fetchonemap()
-
-        return CountRow(count=row["COUNT"])
+        return self._fetch_count(query)
 
     @with_caching()
     def get_tables_description_count(self) -> CountRow:
@@ -124,13 +265,13 @@ where rdb$view_blr is null
 and (rdb$system_flag is null or rdb$system_flag = 0)
 and not rdb$description is null;
         """
-        cursor = self._get_cursor().execute(query)
-        row = cursor.fetchonemap()
-
-        return CountRow(count=row["COUNT"])
+        return self._fetch_count(query)
 
     @with_caching(logging=True)
     def get_procedures(self) -> Iterator[ProcedureRow]:
+        """
+        Исходный код выгружается в хранилище исходников, если оно задано: в кеше выборок остаются только ссылки
+        """
         query = """
 select
     pr.RDB$PROCEDURE_NAME,
@@ -139,14 +280,9 @@ select
     from RDB$PROCEDURES as pr
 ;
         """
-        cursor = self._get_cursor().execute(query)
-        for row in cursor.itermap():
-            procedure = ProcedureRow(
-                name=self._get_normalized_str_or_none(row["RDB$PROCEDURE_NAME"]),
-                description=row["RDB$DESCRIPTION"],
-                source=row["RDB$PROCEDURE_SOURCE"],
-            )
-            yield procedure
+        normalize = self._get_normalized_str_or_none
+        for name, description, source in self._fetch_rows(query):
+            yield ProcedureRow(normalize(name), description, spill(source))
 
     @with_caching(logging=True)
     def get_procedure_parameters(self) -> Iterator[ProcedureParameterRow]:
@@ -165,19 +301,17 @@ select
     where pp.RDB$PARAMETER_TYPE is not null
 ;
         """
-
-        cursor = self._get_cursor().execute(query)
-        for row in cursor.itermap():
-            parameter = ProcedureParameterRow(
-                procedure_name=self._get_normalized_str_or_none(row["RDB$PROCEDURE_NAME"]),
-                name=self._get_normalized_str_or_none(row["RDB$PARAMETER_NAME"]),
-                type=row["RDB$PARAMETER_TYPE"],
-                dependency_field=self._get_normalized_str_or_none(row["DEPENDENCY_FIELD"]),
+        normalize = self._get_normalized_str_or_none
+        for procedure_name, name, parameter_type, dependency_field in self._fetch_rows(query):
+            yield ProcedureParameterRow(
+                normalize(procedure_name), normalize(dependency_field), normalize(name), parameter_type
             )
-            yield parameter
 
     @with_caching(logging=True)
     def get_procedure_dependencies(self) -> Iterator[ProcedureDependencyRow]:
+        """
+        Зависимости процедур от объектов целиком, а для таблиц - и от отдельных полей (field не пустое)
+        """
         query = """
 select
     dp.RDB$DEPENDENT_NAME,
@@ -188,21 +322,15 @@ select
     where
         dp.RDB$DEPENDENT_TYPE = 5
         and dp.RDB$DEPENDED_ON_TYPE in (0, 2, 5, 15)
-        and dp.RDB$FIELD_NAME is null
+        and (dp.RDB$FIELD_NAME is null or dp.RDB$DEPENDED_ON_TYPE = 0)
 ;
         """
-        cursor = self._get_cursor().execute(query)
-        for row in cursor.itermap():
-            procedure_dependency = ProcedureDependencyRow(
-                procedure_name=self._get_normalized_str_or_none(row["RDB$DEPENDENT_NAME"]),
-                name=self._get_normalized_str_or_none(row["RDB$DEPENDED_ON_NAME"]),
-                type=row["RDB$DEPENDED_ON_TYPE"],
-                field=row["RDB$FIELD_NAME"],
-            )
-            yield procedure_dependency
+        normalize = self._get_normalized_str_or_none
+        for procedure_name, name, field, dependency_type in self._fetch_rows(query):
+            yield ProcedureDependencyRow(normalize(procedure_name), normalize(name), normalize(field), dependency_type)
 
     @with_caching(logging=True)
-    def get_dependency_procedures_with_fields(self) -> Iterator[Dict[str, Union[str, int]]]:
+    def get_dependency_procedures_with_fields(self) -> Iterator[ProcedureDependencyRow]:
         query = """
 select
     dp.RDB$DEPENDENT_NAME,
@@ -215,14 +343,9 @@ select
         and dp.RDB$FIELD_NAME is not null
 ;
         """
-        cursor = self._get_cursor().execute(query)
-        for row in cursor.itermap():
-            procedure = ProcedureRow(
-                name=self._get_normalized_str_or_none(row["RDB$PROCEDURE_NAME"]),
-                description=row["RDB$DESCRIPTION"],
-                source=row["RDB$PROCEDURE_SOURCE"],
-            )
-            yield procedure
+        normalize = self._get_normalized_str_or_none
+        for procedure_name, name, field in self._fetch_rows(query):
+            yield ProcedureDependencyRow(normalize(procedure_name), normalize(name), normalize(field), 5)
 
     @with_caching()
     def get_tables(self) -> Iterator[TableRow]:
@@ -230,15 +353,19 @@ select
 select rdb$relation_name, rdb$description
 from rdb$relations
 where rdb$view_blr is null
-and (rdb$system_flag is null or rdb$system_flag = 0);
+and (rdb$system_flag is null or rdb$system_flag = 0)
+order by rdb$relation_name;
         """
-        cursor = self._get_cursor().execute(query)
-        for row in cursor.itermap():
-            table = TableRow(name=row["rdb$relation_name"], description=row["rdb$description"])
-            yield table
+        normalize = self._get_normalized_str_or_none
+        for name, description in self._fetch_rows(query):
+            yield TableRow(normalize(name), description)
 
-    @with_caching()
-    def get_fields(self) -> Iterator[FieldRow]:
+    def _iter_fields(self) -> Iterator[FieldRow]:
+        """
+        Поля идут группами по таблицам (порядок - по имени таблицы, затем по позиции поля),
+        поэтому таблицу можно собрать, как только закончилась группа ее полей.
+        У таблицы без полей одна строка с пустым именем поля (left join)
+        """
         query = """
 select r.rdb$relation_name, rf.rdb$field_name, rf.rdb$description, f.rdb$field_type, f.rdb$field_length
 from rdb$relations as r
@@ -246,15 +373,56 @@ left join rdb$relation_fields as rf on r.rdb$relation_name = rf.rdb$relation_nam
 left join rdb$fields as f on f.rdb$field_name = rf.rdb$field_source
 where r.rdb$view_blr is null
 and (r.rdb$system_flag is null or r.rdb$system_flag = 0)
-order by rf.rdb$field_position;
-        """
-        cursor = self._get_cursor().execute(query)
-        for row in cursor.itermap():
-            table = FieldRow(
-                table_name=row["rdb$relation_name"],
-                name=row["rdb$field_name"],
-                description=row["rdb$description"],
-                type=row["rdb$field_type"],
-                length=row["rdb$field_length"],
+order by r.rdb$relation_name, rf.rdb$field_position;
+        """
+        normalize = self._get_normalized_str_or_none
+        for table_name, name, description, field_type, length in self._fetch_rows(query):
+            yield FieldRow(normalize(table_name), normalize(name), field_type, length, description)
+
+    @with_caching()
+    def get_fields(self) -> Iterator[FieldRow]:
+        return self._iter_fields()
+
+    def iter_fields(self) -> Iterator[FieldRow]:
+        """
+        Поля таблиц без кеша выборок: строки выдаются по мере выборки из курсора и в памяти не остаются
+        (см. TablesDataFactory.iter_tables). Пока поток не дочитан, курсор основного соединения занят
+        """
+        return self._iter_fields()
+
+    @with_caching()
+    def get_index_segments(self) -> Iterator[IndexSegmentRow]:
+        """
+        Индексы, их сегменты, селективность и ограничения таблиц одной выборкой
+        """
+        query = """
+select
+    i.rdb$relation_name,
+    i.rdb$index_name,
+    s.rdb$field_name,
+    s.rdb$field_position,
+    i.rdb$unique_flag,
+    i.rdb$index_inactive,
+    i.rdb$statistics,
+    rc.rdb$constraint_type
+from rdb$indices as i
+join rdb$relations as r on r.rdb$relation_name = i.rdb$relation_name
+left join rdb$index_segments as s on s.rdb$index_name = i.rdb$index_name
+left join rdb$relation_constraints as rc on rc.rdb$index_name = i.rdb$index_name
+where r.rdb$view_blr is null
+and (r.rdb$system_flag is null or r.rdb$system_flag = 0)
+order by i.rdb$relation_name, i.rdb$index_name, s.rdb$field_position;
+        """
+        normalize = self._get_normalized_str_or_none
+        for row in self._fetch_rows(query):
+            table_name, index_name, field_name, position, unique, inactive, selectivity, constraint = row
+            yield IndexSegmentRow(
+                normalize(table_name),
+                normalize(index_name),
+                normalize(field_name),
+                position,
+                bool(unique),
+                bool(inactive),
+                selectivity,
+                normalize(constraint),
             )
-            yield table
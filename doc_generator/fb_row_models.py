@@ -1,10 +1,9 @@
-from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, NamedTuple
 from doc_generator.models import ObjectTypes, ParameterTypes
+from doc_generator.source_store import SourceText
 
 
-@dataclass
-class CountRow:
+class CountRow(NamedTuple):
     """
     Результат выборки количества сущностей
     """
@@ -12,19 +11,18 @@ class CountRow:
     count: int
 
 
-@dataclass
-class ProcedureRow:
+class ProcedureRow(NamedTuple):
     """
     Результата выборки процедур
     """
 
     name: str
     description: str
-    source: str
+    # Текст или ссылка на него в хранилище исходников (см. source_store)
+    source: SourceText
 
 
-@dataclass
-class ProcedureParameterRow:
+class ProcedureParameterRow(NamedTuple):
     """
     Результат выборки параметров сущностей
     """
@@ -35,8 +33,7 @@ class ProcedureParameterRow:
     type: ParameterTypes
 
 
-@dataclass
-class ProcedureDependencyRow:
+class ProcedureDependencyRow(NamedTuple):
     """
     Результат выборки зависимостей процедуры
     """
@@ -47,8 +44,7 @@ class ProcedureDependencyRow:
     type: ObjectTypes
 
 
-@dataclass
-class TableRow:
+class TableRow(NamedTuple):
     """
     Результат выборки таблиц
     """
@@ -57,8 +53,7 @@ class TableRow:
     description: str
 
 
-@dataclass
-class FieldRow:
+class FieldRow(NamedTuple):
     """
     Результат выборки полей таблиц
     """
@@ -68,3 +63,55 @@ class FieldRow:
     type: int
     length: int
     description: Optional[str]
+
+
+class IndexSegmentRow(NamedTuple):
+    """
+    Результат выборки индексов таблиц: строка на сегмент индекса (у индекса по выражению - одна строка без поля).
+    selectivity - RDB$STATISTICS, constraint_type - тип ограничения, которое поддерживает индекс
+    """
+
+    table_name: str
+    index_name: str
+    field_name: Optional[str]
+    position: Optional[int]
+    unique: bool
+    inactive: bool
+    selectivity: Optional[float]
+    constraint_type: Optional[str]
+
+
+class CallStatsRow(NamedTuple):
+    """
+    Результат выборки снимка мониторинга: выполняющийся вызов процедуры (MON$CALL_STACK) и его статистика.
+    caller_id - вызов, из которого вызвана процедура (None - вызвана запросом), elapsed_ms - время от начала
+    вызова до момента снимка
+    """
+
+    attachment_id: int
+    call_id: int
+    caller_id: Optional[int]
+    procedure_name: str
+    elapsed_ms: int
+    page_reads: int
+    page_fetches: int
+    record_reads: int
+
+
+class MetadataFingerprintRow(NamedTuple):
+    """
+    Дешевый отпечаток метаданных: количества, суммарные размеры и хеши содержимого объектов,
+    меняющиеся при изменении схемы
+    """
+
+    procedures_count: int
+    procedures_max_id: int
+    procedures_text_length: int
+    procedures_text_hash: int
+    parameters_count: int
+    relations_count: int
+    relations_format_sum: int
+    fields_count: int
+    descriptions_hash: int
+    dependencies_count: int
+    indices_state: float
@@ -1,69 +1,69 @@
 # pylint: disable=redefined-outer-name
 
-from typing import Dict, Tuple, Callable, List, Optional
-from collections import deque
+import itertools
+import json
+import os
+from operator import attrgetter
+from typing import Dict, Tuple, List, Optional, Any, NamedTuple, Iterable, Iterator, Callable, Set
 
 import jinja2
 
 from doc_generator.fb_gateway import FirebirdGateway
+from doc_generator.fb_row_models import FieldRow, TableRow
 from doc_generator.models import (
     ParameterTypes,
     ObjectTypes,
     ProcedureParameter,
     ProceduresSummary,
     Dependency,
-    DependentProcedure,
-    DependencyTraverseTuple,
+    ReverseDependencies,
     ProcedureSource,
     Procedure,
     TablesSummary,
     Table,
     Field,
+    Index,
 )
-from doc_generator.utils import lazy_property
+from doc_generator.call_graph import get_call_graph_metrics
+from doc_generator.index_coverage import (
+    get_indexes,
+    get_leading_indexes,
+    get_unindexed_columns,
+    is_unindexed,
+    sort_unindexed_columns,
+    UNINDEXED_USAGE_THRESHOLD,
+)
+from doc_generator.instrumentation import instrumentation
+from doc_generator.output import DirectorySink
+from doc_generator.psql_analyzer import SourceAnalyzer, source_analyzer
+from doc_generator.source_store import SourceText, read_text
+
+
+# Максимальная отображаемая глубина дерева зависимостей процедуры
+DEPENDENCY_TREE_MAX_DEPTH = 5
 
 
 class ProcedureSourceDataFactory:  # pylint: disable=too-few-public-methods
-    def __init__(self, text: str) -> None:
+    def __init__(self, text: SourceText, analyzer: SourceAnalyzer = source_analyzer) -> None:
         self._text = text
+        self._analyzer = analyzer
 
     @staticmethod
-    def _count(source: str, condition: Callable) -> int:
-        return sum(1 for l in source if condition(l))
-
-    @lazy_property
-    def _length(self) -> int:
-        return len(self._text)
-
-    @lazy_property
-    def _letters(self) -> int:
-        return self._count(self._text, str.isalpha)
-
-    @lazy_property
-    def _lower(self) -> int:
-        return self._count(self._text, str.islower)
-
-    @lazy_property
-    def _upper(self) -> int:
-        return self._count(self._text, str.isupper)
-
-    @lazy_property
-    def _lower_percent(self) -> int:
+    def _get_percent(part: int, total: int) -> float:
         try:
-            return self._lower / self._letters * 100
-        except ZeroDivisionError:
-            return 0
-
-    @lazy_property
-    def _upper_percent(self) -> int:
-        try:
-            return self._upper / self._letters * 100
+            return part / total * 100
         except ZeroDivisionError:
             return 0
 
     def get_procedure_source_code(self) -> ProcedureSource:
+        statistics = self._analyzer.analyze(read_text(self._text))
         return ProcedureSource(
-            text=self._text, length=self._length, lower_percent=self._lower_percent, upper_percent=self._upper_percent
+            text=self._text,
+            length=statistics.length,
+            lower_percent=self._get_percent(statistics.lower, statistics.letters),
+            upper_percent=self._get_percent(statistics.upper, statistics.letters),
+            camel_case_identifiers=list(statistics.camel_case_identifiers),
+            deprecated_udfs=list(statistics.deprecated_udfs),
         )
 
 
@@ -84,29 +84,85 @@ class TablesDataFactory:
         field_type = cls.FIELD_TYPE_MAP.get(field_index)
         return field_type.format(length=field_length) if field_type else "unknown"
 
-    def get_tables(self) -> List[Table]:
-        field_rows = self._gateway.get_fields()
-        table_rows = self._gateway.get_tables()
-
-        fields = dict()
-        for field_row in field_rows:
-            field = Field(
-                name=field_row.name,
-                type=self.get_field_type(field_row.type, field_row.length),
-                description=field_row.description,
-            )
-            fields.setdefault(field_row.table_name, []).append(field)
-
-        tables = []
-        for table_row in table_rows:
-            tables.append(Table(name=table_row.name, description=table_row.description, fields=fields[table_row.name]))
+    def get_tables(self, reverse_dependencies: Optional[ReverseDependencies] = None) -> List[Table]:
+        """
+        Таблицы с полями. С reverse_dependencies у таблиц и полей заполняются использующие их процедуры
+        """
+        with instrumentation.span("tables"):
+            return list(self._iter_tables(self._gateway.get_fields(), reverse_dependencies or ReverseDependencies()))
+
+    def iter_tables(self, reverse_dependencies: Optional[ReverseDependencies] = None) -> Iterator[Table]:
+        """
+        Потоковая сборка таблиц: поля выбираются без кеша, и таблица отдается, как только пришли все ее поля.
+        В памяти одновременно находятся поля одной таблицы, а не всей схемы
+        """
+        return self._iter_tables(self._gateway.iter_fields(), reverse_dependencies or ReverseDependencies())
+
+    def _get_field(
+        self, field_row: FieldRow, reverse_dependencies: ReverseDependencies, leading_indexes: Dict[str, List[str]]
+    ) -> Field:
+        table_field = Field(
+            name=field_row.name,
+            type=self.get_field_type(field_row.type, field_row.length),
+            description=field_row.description,
+            used_by=reverse_dependencies.get_used_by(
+                reverse_dependencies.column, (field_row.table_name, field_row.name)
+            ),
+            indexes=leading_indexes.get(field_row.name, []),
+        )
+        table_field.unindexed = is_unindexed(table_field)
+        return table_field
+
+    def _get_table(
+        self,
+        table_row: TableRow,
+        field_rows: Iterable[FieldRow],
+        reverse_dependencies: ReverseDependencies,
+        indexes: List[Index],
+    ) -> Table:
+        leading_indexes = get_leading_indexes(indexes)
+        return Table(
+            name=table_row.name,
+            description=table_row.description,
+            # Строка без имени поля - таблица без полей в left join выборки полей
+            fields=[
+                self._get_field(field_row, reverse_dependencies, leading_indexes)
+                for field_row in field_rows
+                if field_row.name
+            ],
+            used_by=reverse_dependencies.get_used_by(reverse_dependencies.table, table_row.name),
+            indexes=indexes,
+        )
 
-        return tables
+    def _iter_tables(
+        self, field_rows: Iterable[FieldRow], reverse_dependencies: ReverseDependencies
+    ) -> Iterator[Table]:
+        """
+        Группировка полей, идущих группами по таблицам (см. get_fields шлюза), на лету.
+        Строки таблиц (имя и описание) и индексы небольшие и выбираются заранее
+        """
+        table_rows = {table_row.name: table_row for table_row in self._gateway.get_tables()}
+        indexes = get_indexes(self._gateway.get_index_segments())
+        done: Set[str] = set()
+        for table_name, table_field_rows in itertools.groupby(field_rows, key=attrgetter("table_name")):
+            if table_name in done:
+                raise ValueError(f"Поля таблицы {table_name} выбраны не одной группой")
+            table_row = table_rows.pop(table_name, None)
+            if table_row is None:
+                continue
+            done.add(table_name)
+            yield self._get_table(table_row, table_field_rows, reverse_dependencies, indexes.get(table_name, []))
+
+        # Таблицы, для которых не выбрано ни одной строки полей
+        for table_row in table_rows.values():
+            yield self._get_table(table_row, (), reverse_dependencies, indexes.get(table_row.name, []))
 
 
 class ProcedureDataFactory:  # pylint: disable=too-few-public-methods
     def __init__(self, gateway: FirebirdGateway) -> None:
         self._gateway = gateway
+        # Заполняется в get_data вместе с прямыми зависимостями процедур
+        self.reverse_dependencies = ReverseDependencies()
 
     def _get_procedures_summary(self) -> ProceduresSummary:
 
@@ -128,18 +184,34 @@ class ProcedureDataFactory:  # pylint: disable=too-few-public-methods
                 procedures[procedure_parameter_row.procedure_name].parameters.output.append(procedure_parameter)
 
     def _add_procedures_dependencies(self, procedures: Dict[str, Procedure]) -> None:
-
+        """
+        Прямые зависимости процедур и обратный индекс (reverse_dependencies) за один проход по строкам каталога
+        """
         procedure_dependency_rows = self._gateway.get_procedure_dependencies()
+        reverse = self.reverse_dependencies = ReverseDependencies()
 
         for procedure_dependency_row in procedure_dependency_rows:
-            if ObjectTypes.has_value(procedure_dependency_row.type):
-                procedure = procedures[procedure_dependency_row.procedure_name]
-                if procedure_dependency_row.type == ObjectTypes.TABLE.value:
-                    procedure.dependencies.table.append(Dependency(name=procedure_dependency_row.name))
-                elif procedure_dependency_row.type == ObjectTypes.PROCEDURE.value:
-                    procedure.dependencies.procedure.append(procedures[procedure_dependency_row.name])
-                elif procedure_dependency_row.type == ObjectTypes.UDF.value:
-                    procedure.dependencies.udf.append(Dependency(name=procedure_dependency_row.name))
+            if not ObjectTypes.has_value(procedure_dependency_row.type):
+                continue
+
+            procedure = procedures[procedure_dependency_row.procedure_name]
+            name = procedure_dependency_row.name
+            # Зависимость от поля таблицы: в прямые зависимости попадает только зависимость от таблицы целиком
+            if procedure_dependency_row.field and procedure_dependency_row.type == ObjectTypes.TABLE.value:
+                reverse.add(reverse.column, (name, procedure_dependency_row.field), procedure.name)
+                reverse.add(reverse.table, name, procedure.name)
+            elif procedure_dependency_row.type == ObjectTypes.TABLE.value:
+                procedure.dependencies.table.append(Dependency(name=name))
+                reverse.add(reverse.table, name, procedure.name)
+            elif procedure_dependency_row.type == ObjectTypes.PROCEDURE.value:
+                procedure.dependencies.procedure.append(procedures[name])
+                reverse.add(reverse.procedure, name, procedure.name)
+            elif procedure_dependency_row.type == ObjectTypes.UDF.value:
+                procedure.dependencies.udf.append(Dependency(name=name))
+                reverse.add(reverse.udf, name, procedure.name)
+
+        for procedure in procedures.values():
+            procedure.used_by = reverse.get_used_by(reverse.procedure, procedure.name)
 
     def _get_procedures(self) -> Dict[str, Procedure]:
         procedure_rows = self._gateway.get_procedures()
@@ -153,82 +225,248 @@ class ProcedureDataFactory:  # pylint: disable=too-few-public-methods
         return procedures
 
     @staticmethod
-    def _add_dependency_procedures_tree(procedure: Procedure, max_depth: int = 5) -> None:
-        dependency_queue = deque()
-        dependency_passed = {procedure.name}
-        # TODO: mode=(write|count), чтобы можно было продолжать считать без записи в dict, только для статистики
-        # TODO: Подумать еще про циклы (которые считать не надо). Наверное, хватит просто отдельного списка
-        dependency_queue += [
-            DependencyTraverseTuple(
-                dependency=dependency_procedure, tree=procedure.dependency_tree, passed=dependency_passed, depth=0
-            )
-            for dependency_procedure in procedure.dependencies.procedure
-        ]
+    def _add_call_graph_metrics(procedures: Dict[str, Procedure]) -> None:
+        graph = {
+            name: [dependency.name for dependency in procedure.dependencies.procedure]
+            for name, procedure in procedures.items()
+        }
+        for name, metrics in get_call_graph_metrics(graph).items():
+            procedures[name].call_graph = metrics
 
-        unique_procedures = set()
-        tree_degree = 0
-
-        while dependency_queue:
-            traverse = dependency_queue.popleft()
-
-            unique_procedures.add(traverse.dependency.name)
-
-            # Зависимость встречалась ранее в ветке
-            if traverse.dependency.name in traverse.passed:
-                # TODO: вероятно, стоит сразу помечать заведомо циклические процедуры и кешировать,
-                # TODO: но проверку отключать нельзя - может быть цикл в конкретной ветке
-
-                cycled_dependent = DependentProcedure(name=traverse.dependency.name, is_cycled=True)
-                traverse.tree.append(cycled_dependent)
-            # Превышает максимально отображаемую глубину зависимостей
-            elif traverse.depth >= max_depth - 1 and traverse.dependency.dependencies.procedure:
-                depth_limited_dependent = DependentProcedure(name=traverse.dependency.name, in_depth_limit=True)
-                traverse.tree.append(depth_limited_dependent)
-            # лист дерева
-            elif not traverse.dependency.dependencies.procedure:
-                tree_degree += 1
-                dangling_dependent = DependentProcedure(name=traverse.dependency.name)
-                traverse.tree.append(dangling_dependent)
-            else:
-                tree_degree += 1
-                next_passed = traverse.passed.union({traverse.dependency.name})
-                subtree_root = DependentProcedure(name=traverse.dependency.name)
-                traverse.tree.append(subtree_root)
-                next_depth = traverse.depth + 1
-                for next_dependency_procedure in traverse.dependency.dependencies.procedure:
-                    dependency_queue.append(
-                        DependencyTraverseTuple(
-                            dependency=next_dependency_procedure,
-                            tree=subtree_root.dependency_tree,
-                            passed=next_passed,
-                            depth=next_depth,
-                        )
-                    )
-
-    def _add_dependency_trees(self, procedures: Dict[str, Procedure]) -> None:
+    @staticmethod
+    def _add_source_summary(procedures_summary: ProceduresSummary, procedures: Dict[str, Procedure]) -> None:
         for procedure in procedures.values():
-            self._add_dependency_procedures_tree(procedure)
+            if procedure.source.deprecated_udfs:
+                procedures_summary.deprecated_udf_count += 1
+            if procedure.source.camel_case_identifiers:
+                procedures_summary.camel_case_count += 1
 
     def get_data(self) -> Tuple[ProceduresSummary, Dict[str, Procedure]]:
         # TODO: внутри представлять в виде dict, но возвращать лучше list
-        procedures_summary = self._get_procedures_summary()
-        procedures = self._get_procedures()
-        self._add_procedures_parameters(procedures)
-        self._add_procedures_dependencies(procedures)
-        self._add_dependency_trees(procedures)
+        with instrumentation.span("procedures"):
+            procedures_summary = self._get_procedures_summary()
+            with instrumentation.span("build_procedures"):
+                procedures = self._get_procedures()
+                self._add_source_summary(procedures_summary, procedures)
+            with instrumentation.span("build_parameters"):
+                self._add_procedures_parameters(procedures)
+            with instrumentation.span("build_dependencies"):
+                self._add_procedures_dependencies(procedures)
+            with instrumentation.span("call_graph_metrics"):
+                self._add_call_graph_metrics(procedures)
+            instrumentation.count("procedures", len(procedures))
         return procedures_summary, procedures
 
 
-env = jinja2.Environment(
-    loader=jinja2.FileSystemLoader("doc_generator/template"),  # pylint: disable=invalid-name
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template")
+
+# Каталог кеша скомпилированных шаблонов. Пустое значение отключает кеш, без значения - временный каталог jinja2
+TEMPLATE_CACHE_ENV = "DOC_GENERATOR_TEMPLATE_CACHE"
+
+
+def get_bytecode_cache() -> Optional[jinja2.BytecodeCache]:
+    """
+    Кеш байткода шаблонов на диске: повторные запуски и процессы-обработчики не компилируют шаблоны заново.
+    Запись кеша проверяется по контрольной сумме исходника, поэтому измененный шаблон перекомпилируется
+    """
+    cache_dir = os.environ.get(TEMPLATE_CACHE_ENV)
+    if cache_dir == "":
+        return None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    return jinja2.FileSystemBytecodeCache(cache_dir or None)
+
+
+env = jinja2.Environment(  # pylint: disable=invalid-name
+    loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
     trim_blocks=True,
     lstrip_blocks=True,
+    bytecode_cache=get_bytecode_cache(),
 )
 
 
+def configure_template_cache(cache_dir: str) -> None:
+    """
+    Смена каталога кеша шаблонов (пустая строка - без кеша). Настройка передается процессам-обработчикам
+    через переменную окружения, поэтому вызывать ее нужно до запуска пула
+    """
+    os.environ[TEMPLATE_CACHE_ENV] = cache_dir
+    env.bytecode_cache = get_bytecode_cache()
+
+
+class RenderJob(NamedTuple):
+    """
+    Задание на генерацию одной страницы
+    """
+
+    template: str
+    output_file: str
+    context: Dict[str, Any]
+
+
+# Получатель сгенерированных файлов, заменяется при выборе режима вывода
+sink = DirectorySink()  # pylint: disable=invalid-name
+
+
+def get_render_jobs(
+    procedures_summary: ProceduresSummary,
+    procedures: Dict[str, Procedure],
+    tables_summary: TablesSummary,
+    tables: Iterable[Table],
+) -> Iterator[RenderJob]:
+    yield RenderJob(template="index.html", output_file="index.html", context={})
+    yield RenderJob(template="search.html", output_file="search.html", context={})
+    # Строки списков процедур и таблиц не рендерятся в страницу, а пишутся в файлы данных (get_data_files)
+    yield RenderJob(
+        template="procedures.html",
+        output_file="procedures.html",
+        context={"procedures_summary": procedures_summary},
+    )
+    yield RenderJob(template="tables.html", output_file="tables.html", context={"tables_summary": tables_summary})
+    for procedure_name, procedure in procedures.items():
+        yield RenderJob(
+            template="procedure.html",
+            output_file=f"procedure-{procedure_name}.html",
+            context={"procedure": procedure},
+        )
+
+    # Отчет о покрытии индексами собирается по ходу прохода по таблицам и рендерится после них
+    unindexed_columns = []
+    for table in tables:
+        unindexed_columns.extend(get_unindexed_columns(table))
+        yield RenderJob(template="table.html", output_file=f"table-{table.name}.html", context={"table": table})
+
+    yield RenderJob(
+        template="index-coverage.html",
+        output_file="index-coverage.html",
+        context={"columns": sort_unindexed_columns(unindexed_columns), "threshold": UNINDEXED_USAGE_THRESHOLD},
+    )
+
+
+def get_procedures_rows(procedures: Iterable[Procedure]) -> List[list]:
+    """
+    Строки таблицы procedures.html в порядке ее колонок. Проценты округляются фильтром round шаблонов,
+    как в прежней таблице, которая рендерилась в HTML
+    """
+    round_percent = env.filters["round"]
+    return [
+        [
+            procedure.name,
+            int(bool(procedure.description)),
+            len(procedure.parameters.input),
+            len(procedure.parameters.output),
+            len(procedure.dependencies.procedure),
+            len(procedure.dependencies.table),
+            len(procedure.dependencies.udf),
+            procedure.source.length,
+            round_percent(procedure.source.upper_percent),
+            round_percent(procedure.source.lower_percent),
+            procedure.call_graph.fan_in,
+            procedure.call_graph.closure_size,
+            procedure.call_graph.depth,
+            procedure.call_graph.cycle_size,
+            *get_cost_columns(procedure),
+        ]
+        for procedure in procedures
+    ]
+
+
+def get_cost_columns(procedure: Procedure) -> List[Optional[int]]:
+    """
+    Колонки стоимости по данным мониторинга: вызовы, собственное время, чтения и выборки страниц,
+    время вместе с вызываемыми процедурами. Без данных - пустые значения
+    """
+    cost = procedure.cost
+    total_elapsed_ms = procedure.total_cost.elapsed_ms if procedure.total_cost else None
+    if cost is None:
+        return [None, None, None, None, total_elapsed_ms]
+    return [cost.calls, cost.elapsed_ms, cost.page_reads, cost.page_fetches, total_elapsed_ms]
+
+
+def get_tables_rows(tables: Iterable[Table]) -> List[list]:
+    """
+    Строки таблицы tables.html в порядке ее колонок
+    """
+    return [[table.name, table.description, len(table.fields)] for table in tables]
+
+
+class TablesStream:
+    """
+    Однократный проход по таблицам при рендеринге: по ходу от каждой таблицы остается только ее строка
+    для tables-data.js (rows), остальное забирает on_table (поисковый индекс). Таблицы из iter_tables
+    после рендеринга своей страницы не хранятся
+    """
+
+    def __init__(self, tables: Iterable[Table], on_table: Optional[Callable[[Table], None]] = None) -> None:
+        self._tables = tables
+        self._on_table = on_table
+        self.rows: List[list] = []
+
+    def __iter__(self) -> Iterator[Table]:
+        for table in self._tables:
+            self.rows.extend(get_tables_rows((table,)))
+            if self._on_table is not None:
+                self._on_table(table)
+            yield table
+
+
+def get_call_graph(procedures: Dict[str, Procedure]) -> Dict[str, Any]:
+    """
+    Граф вызовов процедур для раскрытия деревьев зависимостей в браузере:
+    имена процедур и для каждой - номера процедур, от которых она зависит
+    """
+    numbers = {name: number for number, name in enumerate(procedures)}
+    call_graph = {
+        "max_depth": DEPENDENCY_TREE_MAX_DEPTH,
+        "names": list(procedures),
+        "edges": [
+            [numbers[dependency.name] for dependency in procedure.dependencies.procedure]
+            for procedure in procedures.values()
+        ],
+    }
+    # Время вместе с вызываемыми процедурами для узлов дерева зависимостей - только если есть данные мониторинга
+    if any(procedure.total_cost for procedure in procedures.values()):
+        call_graph["costs"] = [
+            procedure.total_cost.elapsed_ms if procedure.total_cost else None for procedure in procedures.values()
+        ]
+    return call_graph
+
+
+def dump_data_script(variable: str, data: Any) -> bytes:
+    """
+    Данные в виде скрипта с глобальной переменной, а не .json: подключаются тегом script
+    и поэтому работают и при открытии страниц из файловой системы, где загрузка через XHR запрещена
+    """
+    return f"var {variable} = {json.dumps(data, ensure_ascii=False, separators=(',', ':'))};\n".encode("utf-8")
+
+
+def get_data_files(procedures: Dict[str, Procedure], tables_rows: List[list]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Файлы данных для procedures.html и tables.html (строки таблиц - get_tables_rows или TablesStream.rows):
+    DataTables строит из них DOM только для видимых строк. Граф вызовов общий для всех страниц процедур
+    """
+    yield "procedures-data.js", dump_data_script("PROCEDURES_DATA", get_procedures_rows(procedures.values()))
+    yield "tables-data.js", dump_data_script("TABLES_DATA", tables_rows)
+    yield "call-graph.js", dump_data_script("CALL_GRAPH", get_call_graph(procedures))
+
+
+def write_data_files(
+    procedures: Dict[str, Procedure], tables_rows: List[list], target: Optional[DirectorySink] = None
+) -> None:
+    target = target or sink
+    with instrumentation.span("data_files"):
+        for output_file, data in get_data_files(procedures, tables_rows):
+            target.write_if_changed(output_file, data)
+            instrumentation.count("bytes", len(data))
+
+
 def render_to_file(template: str, output_file: str, *args, **kwargs):
     template = env.get_template(template)
-    output = template.render(*args, **kwargs)
+    size = sink.write(output_file, template.generate(*args, **kwargs))
+    instrumentation.count("pages")
+    instrumentation.count("bytes", size)
+
 
-    with open(f"dist/{output_file}", "w", encoding="utf-8") as out:
-        out.write(output)
+def render_jobs(jobs: Iterable[RenderJob]) -> None:
+    for job in jobs:
+        render_to_file(job.template, job.output_file, **job.context)
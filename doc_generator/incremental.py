@@ -0,0 +1,118 @@
+import enum
+import hashlib
+import json
+import os
+from dataclasses import fields, is_dataclass
+from typing import Any, Dict, Iterable, Iterator, Set
+
+from doc_generator.generate_doc import RenderJob
+from doc_generator.instrumentation import instrumentation
+from doc_generator.models import Procedure
+from doc_generator.output import get_compressed_siblings, write_atomic
+from doc_generator.source_store import SourceBlob
+
+
+MANIFEST_FILE = ".manifest.json"
+MANIFEST_VERSION = 1
+
+
+def _normalize(value: Any, is_root: bool = True) -> Any:
+    """
+    Приведение модели к вложенным кортежам из примитивов для вычисления хеша.
+
+    Ссылки на другие процедуры (Dependencies.procedure) учитываются только по имени:
+    граф процедур связный, и без этого каждая модель тянула бы за собой всю схему.
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (enum.Enum, SourceBlob)):
+        # Ссылка на выгруженный исходник учитывается по хешу текста, а не по смещению в файле хранилища
+        return value.value if isinstance(value, enum.Enum) else ("SourceBlob", value.digest)
+    if isinstance(value, Procedure) and not is_root:
+        return ("Procedure", value.name)
+    if is_dataclass(value):
+        return (value.__class__.__name__,) + tuple(
+            _normalize(getattr(value, model_field.name), is_root=False) for model_field in fields(value)
+        )
+    if isinstance(value, dict):
+        return tuple((key, _normalize(item, is_root=True)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item, is_root=False) for item in value)
+    raise TypeError(f"Неподдерживаемый тип в модели: {type(value)}")
+
+
+def get_model_digest(value: Any) -> str:
+    return hashlib.blake2b(repr(_normalize(value)).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def get_templates_version(template_dir: str) -> str:
+    """
+    Хеш содержимого всех шаблонов: любое изменение шаблона инвалидирует все страницы
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for template_name in sorted(os.listdir(template_dir)):
+        digest.update(template_name.encode("utf-8"))
+        with open(os.path.join(template_dir, template_name), "rb") as template_file:
+            digest.update(template_file.read())
+    return digest.hexdigest()
+
+
+class IncrementalManifest:
+    """
+    Манифест сгенерированных страниц: имя файла -> хеш входной модели и версии шаблонов
+    """
+
+    def __init__(self, output_dir: str, templates_version: str) -> None:
+        self._output_dir = output_dir
+        self._templates_version = templates_version
+        self._previous: Dict[str, str] = self._load()
+        self._current: Dict[str, str] = {}
+
+    @property
+    def _path(self) -> str:
+        return os.path.join(self._output_dir, MANIFEST_FILE)
+
+    def _load(self) -> Dict[str, str]:
+        try:
+            with open(self._path, encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("templates") != self._templates_version:
+            return {}
+        return manifest["files"]
+
+    def select(self, jobs: Iterable[RenderJob]) -> Iterator[RenderJob]:
+        """
+        Пропускает только задания, входные данные которых изменились с прошлого запуска
+        """
+        for job in jobs:
+            digest = get_model_digest(job.context)
+            self._current[job.output_file] = digest
+            if self._previous.get(job.output_file) != digest or not os.path.exists(
+                os.path.join(self._output_dir, job.output_file)
+            ):
+                yield job
+            else:
+                instrumentation.count("unchanged_pages")
+
+    def remove_stale(self) -> Set[str]:
+        """
+        Удаляет страницы объектов, которых больше нет в схеме, вместе с их сжатыми копиями
+        """
+        stale_files = set(self._previous) - set(self._current)
+        for output_file in stale_files:
+            path = os.path.join(self._output_dir, output_file)
+            for stale_path in [path] + get_compressed_siblings(path):
+                try:
+                    os.remove(stale_path)
+                except FileNotFoundError:
+                    pass
+        return stale_files
+
+    def save(self) -> None:
+        manifest = {"version": MANIFEST_VERSION, "templates": self._templates_version, "files": self._current}
+        write_atomic(self._path, [json.dumps(manifest, ensure_ascii=False)])
+        self._previous = self._current
+        self._current = {}
@@ -0,0 +1,60 @@
+from typing import Dict, Iterable, List
+
+from doc_generator.fb_row_models import IndexSegmentRow
+from doc_generator.models import Field, Index, Table, UnindexedColumn
+
+
+# Поле без индекса отмечается, если на него ссылается не меньше стольких процедур
+UNINDEXED_USAGE_THRESHOLD = 3
+
+
+def get_indexes(index_segment_rows: Iterable[IndexSegmentRow]) -> Dict[str, List[Index]]:
+    """
+    Индексы по таблицам из строк сегментов (строки одного индекса идут подряд по позиции сегмента)
+    """
+    indexes: Dict[str, Dict[str, Index]] = {}
+    for row in index_segment_rows:
+        table_indexes = indexes.setdefault(row.table_name, {})
+        index = table_indexes.get(row.index_name)
+        if index is None:
+            index = table_indexes[row.index_name] = Index(
+                name=row.index_name,
+                unique=row.unique,
+                active=not row.inactive,
+                selectivity=row.selectivity,
+                constraint=row.constraint_type,
+            )
+        if row.field_name:
+            index.fields.append(row.field_name)
+    return {table_name: list(table_indexes.values()) for table_name, table_indexes in indexes.items()}
+
+
+def get_leading_indexes(indexes: Iterable[Index]) -> Dict[str, List[str]]:
+    """
+    Поле -> активные индексы, в которых оно первый сегмент. Только такой индекс ускоряет поиск по полю:
+    по второму и следующим сегментам Firebird индекс не использует
+    """
+    leading: Dict[str, List[str]] = {}
+    for index in indexes:
+        if index.active and index.fields:
+            leading.setdefault(index.fields[0], []).append(index.name)
+    return leading
+
+
+def is_unindexed(table_field: Field, threshold: int = UNINDEXED_USAGE_THRESHOLD) -> bool:
+    return not table_field.indexes and len(table_field.used_by) >= threshold
+
+
+def get_unindexed_columns(table: Table) -> List[UnindexedColumn]:
+    return [
+        UnindexedColumn(table_name=table.name, field_name=table_field.name, procedures_count=len(table_field.used_by))
+        for table_field in table.fields
+        if table_field.unindexed
+    ]
+
+
+def sort_unindexed_columns(columns: Iterable[UnindexedColumn]) -> List[UnindexedColumn]:
+    """
+    Сначала поля, на которые ссылается больше всего процедур
+    """
+    return sorted(columns, key=lambda column: (-column.procedures_count, column.table_name, column.field_name))
@@ -0,0 +1,162 @@
+import contextlib
+import json
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None  # pylint: disable=invalid-name
+
+
+REPORT_VERSION = 1
+
+SpanPath = Tuple[str, ...]
+
+
+@dataclass
+class SpanStats:
+    """
+    Накопленная статистика по всем вхождениям в span с одним и тем же путем
+    """
+
+    calls: int = 0
+    seconds: float = 0
+    counters: Counter = field(default_factory=Counter)
+    peak_rss: int = 0
+    traced_peak: int = 0
+
+
+def get_peak_rss() -> int:
+    """
+    Пиковый RSS процесса в байтах (0, если платформа не поддерживает resource)
+    """
+    if resource is None:
+        return 0
+    # ru_maxrss в Linux - в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Instrumentation:
+    """
+    Вложенные замеры времени (span), счетчики и память по этапам генерации.
+
+    Стек span-ов свой у каждого потока: span, открытый в рабочем потоке, становится корневым.
+    Счетчики относятся к текущему (самому вложенному) span-у потока.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._spans: Dict[SpanPath, SpanStats] = {}
+        self._sections: Dict[str, Any] = {}
+        self._started = time.perf_counter()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._spans = {}
+            self._sections = {}
+            self._started = time.perf_counter()
+
+    def _get_stack(self) -> List[str]:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _get_stats(self, path: SpanPath) -> SpanStats:
+        try:
+            return self._spans[path]
+        except KeyError:
+            return self._spans.setdefault(path, SpanStats())
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        stack = self._get_stack()
+        stack.append(name)
+        path = tuple(stack)
+        # Статистика заводится при входе, чтобы в отчете span-ы шли в порядке начала, родитель перед потомками
+        with self._lock:
+            self._get_stats(path)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            traced_peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+            peak_rss = get_peak_rss()
+            with self._lock:
+                stats = self._get_stats(path)
+                stats.calls += 1
+                stats.seconds += elapsed
+                stats.peak_rss = max(stats.peak_rss, peak_rss)
+                stats.traced_peak = max(stats.traced_peak, traced_peak)
+
+    def count(self, name: str, value: int = 1) -> None:
+        path = tuple(self._get_stack())
+        with self._lock:
+            self._get_stats(path).counters[name] += value
+
+    def set_section(self, name: str, value: Any) -> None:
+        """
+        Произвольный раздел отчета, например статистика кеша
+        """
+        with self._lock:
+            self._sections[name] = value
+
+    def get_report(self, top_allocations: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            spans = [
+                {
+                    "path": list(path),
+                    "calls": stats.calls,
+                    "seconds": stats.seconds,
+                    "counters": dict(stats.counters),
+                    "peak_rss": stats.peak_rss,
+                    "traced_peak": stats.traced_peak,
+                }
+                for path, stats in self._spans.items()
+            ]
+            sections = dict(self._sections)
+
+        memory: Dict[str, Any] = {"peak_rss": get_peak_rss()}
+        if tracemalloc.is_tracing():
+            memory["traced_current"], memory["traced_peak"] = tracemalloc.get_traced_memory()
+            memory["top_allocations"] = [
+                {"location": str(statistic.traceback), "size": statistic.size, "count": statistic.count}
+                for statistic in tracemalloc.take_snapshot().statistics("lineno")[:top_allocations]
+            ]
+
+        return {
+            "version": REPORT_VERSION,
+            "seconds": time.perf_counter() - self._started,
+            "spans": spans,
+            "memory": memory,
+            **sections,
+        }
+
+    def save_report(self, path: str, report: Optional[Dict[str, Any]] = None) -> None:
+        report = report if report is not None else self.get_report()
+        with open(path, "w", encoding="utf-8") as out:
+            json.dump(report, out, ensure_ascii=False, indent=2)
+
+    def format_summary(self, report: Optional[Dict[str, Any]] = None) -> str:
+        report = report if report is not None else self.get_report()
+        lines = [f"{'span':<48} {'calls':>7} {'seconds':>9} {'RSS MiB':>8}  counters"]
+        for span in report["spans"]:
+            name = "  " * (len(span["path"]) - 1) + (span["path"][-1] if span["path"] else "<без span>")
+            counters = ", ".join(f"{key}={value}" for key, value in sorted(span["counters"].items()))
+            lines.append(
+                f"{name:<48} {span['calls']:>7} {span['seconds']:>9.3f} {span['peak_rss'] / 2 ** 20:>8.1f}  {counters}"
+            )
+        lines.append(f"Всего: {report['seconds']:.3f}s, пиковый RSS {report['memory']['peak_rss'] / 2 ** 20:.1f} MiB")
+        return "\n".join(lines)
+
+
+instrumentation = Instrumentation()  # pylint: disable=invalid-name
@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import enum
 from dataclasses import dataclass, field
-from typing import List, NamedTuple, Set, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
+
+from doc_generator.source_store import SourceText, read_text
 
 
 class ParameterTypes(enum.Enum):
@@ -49,6 +51,10 @@ class ProceduresSummary:
 
     total_count: int
     description_count: int
+    deprecated_udf_count: int = 0
+    camel_case_count: int = 0
+    # Процедур, для которых есть данные мониторинга (см. monitoring)
+    cost_count: int = 0
 
 
 @dataclass
@@ -71,32 +77,82 @@ class Dependencies:
     udf: List[Dependency] = field(default_factory=list)
 
 
-# TODO: бред какой-то с неймингом: то dependent, то dependency_tree
 @dataclass
-class DependentProcedure:
-    name: str
-    is_cycled: bool = False
-    in_depth_limit: bool = False
-    dependency_tree: List[DependentProcedure] = field(default_factory=list)  # pylint: disable=undefined-variable
+class ReverseDependencies:
+    """
+    Обратный индекс зависимостей: объект -> процедуры, которые от него зависят.
+
+    Процедуры хранятся ключами dict (упорядоченное множество в порядке строк каталога),
+    колонки - по ключу (таблица, поле)
+    """
+
+    procedure: Dict[str, Dict[str, None]] = field(default_factory=dict)
+    table: Dict[str, Dict[str, None]] = field(default_factory=dict)
+    column: Dict[Tuple[str, str], Dict[str, None]] = field(default_factory=dict)
+    udf: Dict[str, Dict[str, None]] = field(default_factory=dict)
+
+    @staticmethod
+    def add(index: Dict[Any, Dict[str, None]], key: Any, procedure_name: str) -> None:
+        index.setdefault(key, {})[procedure_name] = None
+
+    @staticmethod
+    def get_used_by(index: Dict[Any, Dict[str, None]], key: Any) -> List[str]:
+        return list(index.get(key, ()))
+
+
+@dataclass
+class CallGraphMetrics:
+    """
+    Метрики процедуры по полному графу вызовов: число транзитивно вызываемых процедур, самая длинная цепочка
+    вызовов, число различных вызывающих и вызываемых процедур и размер группы цикла (0 - вне цикла)
+    """
+
+    closure_size: int = 0
+    depth: int = 0
+    fan_in: int = 0
+    fan_out: int = 0
+    cycle_size: int = 0
 
 
-class DependencyTraverseTuple(NamedTuple):
+@dataclass
+class RuntimeCost:
     """
-    Служебная структура для обхода зависимостей и построения дерева зависимостей
+    Стоимость выполнения процедуры по снимкам мониторинга (MON$): число наблюдавшихся вызовов,
+    время в миллисекундах, чтения и выборки страниц, прочитанные записи
     """
 
-    dependency: Procedure
-    tree: List[DependentProcedure]
-    passed: Set[str]
-    depth: int
+    calls: int = 0
+    elapsed_ms: int = 0
+    page_reads: int = 0
+    page_fetches: int = 0
+    record_reads: int = 0
+
+    def __add__(self, other: "RuntimeCost") -> "RuntimeCost":
+        return RuntimeCost(
+            calls=self.calls + other.calls,
+            elapsed_ms=self.elapsed_ms + other.elapsed_ms,
+            page_reads=self.page_reads + other.page_reads,
+            page_fetches=self.page_fetches + other.page_fetches,
+            record_reads=self.record_reads + other.record_reads,
+        )
 
 
 @dataclass
 class ProcedureSource:
-    text: str
+    """
+    Исходный код процедуры и его статистика. text - сам текст или ссылка на него в хранилище исходников,
+    поэтому читать текст нужно через read_text
+    """
+
+    text: SourceText
     length: int
     lower_percent: int
     upper_percent: int
+    camel_case_identifiers: List[str] = field(default_factory=list)
+    deprecated_udfs: List[str] = field(default_factory=list)
+
+    def read_text(self) -> Optional[str]:
+        return read_text(self.text)
 
 
 @dataclass
@@ -107,7 +163,11 @@ class Procedure:
     dependencies: Dependencies = field(default_factory=Dependencies)
     parameters: ProcedureParameters = field(default_factory=ProcedureParameters)
     _dependency_field_map: Dict[str, List[str]] = field(default_factory=dict)
-    dependency_tree: List[DependentProcedure] = field(default_factory=list)
+    used_by: List[str] = field(default_factory=list)
+    call_graph: CallGraphMetrics = field(default_factory=CallGraphMetrics)
+    # Собственная стоимость и стоимость вместе со всеми транзитивно вызываемыми процедурами (None - нет данных)
+    cost: Optional[RuntimeCost] = None
+    total_cost: Optional[RuntimeCost] = None
 
 
 @dataclass
@@ -115,6 +175,27 @@ class Field:
     name: str
     type: str
     description: Optional[str]
+    used_by: List[str] = field(default_factory=list)
+    # Активные индексы, в которых поле - первый сегмент (по ним возможен поиск по значению поля)
+    indexes: List[str] = field(default_factory=list)
+    # На поле ссылается много процедур, а индекса по нему нет (см. index_coverage)
+    unindexed: bool = False
+
+
+@dataclass
+class Index:
+    """
+    Индекс таблицы. Поля в порядке сегментов, у индекса по выражению полей нет.
+    selectivity - RDB$STATISTICS: доля записей на одно значение ключа (чем меньше, тем избирательнее индекс),
+    None - статистика не собиралась. constraint - ограничение, которое поддерживает индекс
+    """
+
+    name: str
+    fields: List[str] = field(default_factory=list)
+    unique: bool = False
+    active: bool = True
+    selectivity: Optional[float] = None
+    constraint: Optional[str] = None
 
 
 @dataclass
@@ -122,3 +203,63 @@ class Table:
     name: str
     description: Optional[str]
     fields: List[Field] = field(default_factory=list)
+    used_by: List[str] = field(default_factory=list)
+    indexes: List[Index] = field(default_factory=list)
+
+
+@dataclass
+class UnindexedColumn:
+    """
+    Строка отчета о покрытии индексами: поле без индекса и число ссылающихся на него процедур
+    """
+
+    table_name: str
+    field_name: str
+    procedures_count: int
+
+
+@dataclass
+class DatabaseSummary:
+    """
+    Строка общего оглавления пакетного режима: сайт базы данных лежит в подкаталоге name.
+    Если выборка из БД не удалась, сводок нет, а error содержит описание ошибки
+    """
+
+    name: str
+    procedures_summary: Optional[ProceduresSummary] = None
+    tables_summary: Optional[TablesSummary] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ObjectChange:
+    """
+    Изменение процедуры или таблицы между двумя версиями схемы: изменившиеся части (aspects),
+    добавленные, удаленные и измененные элементы вида "<вид>:<имя>" и diff исходного кода
+    """
+
+    name: str
+    aspects: List[str] = field(default_factory=list)
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    source_diff: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ObjectsDiff:
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[ObjectChange] = field(default_factory=list)
+
+
+@dataclass
+class SchemaDiff:
+    """
+    Разница между старой (old) и новой (new) версиями схемы
+    """
+
+    old: str
+    new: str
+    procedures: ObjectsDiff = field(default_factory=ObjectsDiff)
+    tables: ObjectsDiff = field(default_factory=ObjectsDiff)
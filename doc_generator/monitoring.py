@@ -0,0 +1,187 @@
+import gzip
+import itertools
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from doc_generator import my_logging
+from doc_generator.call_graph import roll_up_costs
+from doc_generator.fb_row_models import CallStatsRow
+from doc_generator.instrumentation import instrumentation
+from doc_generator.models import Procedure, ProceduresSummary, RuntimeCost
+
+
+logger = my_logging.Logger()  # pylint: disable=invalid-name
+
+MONITORING_FORMAT = "firebird-doc-monitoring"
+MONITORING_VERSION = 1
+
+DEFAULT_CAPTURE_INTERVAL = 1.0
+CHUNK_SIZE = 5000
+
+# Снимок мониторинга - номер и строки вызовов
+Capture = Tuple[int, Iterable[CallStatsRow]]
+# Вызов в снимке: (соединение, номер вызова)
+CallKey = Tuple[int, int]
+# Вызов и его статистика: (процедура, время, чтения страниц, выборки страниц, прочитанные записи)
+CallStats = Tuple[str, int, int, int, int]
+
+
+class MonitoringError(Exception):
+    pass
+
+
+def iter_live_captures(
+    gateway: Any,
+    count: int,
+    interval: float = DEFAULT_CAPTURE_INTERVAL,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[Capture]:
+    """
+    Снимки мониторинга через шлюз с интервалом interval секунд. Строки снимка выбираются при его обработке
+    """
+    for number in range(count):
+        if number:
+            sleep(interval)
+        yield number, gateway.get_call_stats()
+
+
+def export_captures(captures: Iterable[Capture], path: str, compresslevel: int = 6) -> int:
+    """
+    Потоковая запись снимков в файл: gzip, JSON Lines, первая строка - заголовок, остальные - порции строк
+    вида [номер снимка, [строка, ...]]. Возвращает число записанных строк
+    """
+    header = {"format": MONITORING_FORMAT, "version": MONITORING_VERSION, "fields": list(CallStatsRow._fields)}
+    rows_count = 0
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=compresslevel) as out:
+        out.write(json.dumps(header, ensure_ascii=False))
+        out.write("\n")
+        for number, rows in captures:
+            iterator = iter(rows)
+            while True:
+                chunk = list(itertools.islice(iterator, CHUNK_SIZE))
+                if not chunk:
+                    break
+                out.write(json.dumps([number, chunk], ensure_ascii=False, separators=(",", ":")))
+                out.write("\n")
+                rows_count += len(chunk)
+    return rows_count
+
+
+def _check_header(header: Dict[str, Any]) -> None:
+    if header.get("format") != MONITORING_FORMAT:
+        raise MonitoringError("Файл не является снимком мониторинга")
+    if header.get("version") != MONITORING_VERSION:
+        raise MonitoringError(f"Неподдерживаемая версия снимка мониторинга: {header.get('version')}")
+    if header.get("fields") != list(CallStatsRow._fields):
+        raise MonitoringError("Несовместимый набор полей снимка мониторинга")
+
+
+def _iter_chunks(path: str) -> Iterator[Tuple[int, List[list]]]:
+    with gzip.open(path, "rt", encoding="utf-8") as source:
+        _check_header(json.loads(source.readline()))
+        for line in source:
+            number, chunk = json.loads(line)
+            yield number, chunk
+
+
+def load_captures(path: str) -> Iterator[Capture]:
+    """
+    Снимки из файла по одному, строки снимка читаются порциями по мере обработки
+    """
+    for number, chunks in itertools.groupby(_iter_chunks(path), key=lambda item: item[0]):
+        yield number, (CallStatsRow._make(row) for _, chunk in chunks for row in chunk)
+
+
+class CostAggregator:
+    """
+    Стоимость вызовов процедур по последовательности снимков.
+
+    Статистика вызова в MON$ накапливается, пока он выполняется, и один вызов может попасть в несколько
+    снимков подряд. Поэтому вызов учитывается один раз - по последнему снимку, в котором он был: в памяти
+    хранятся только вызовы предыдущего снимка, и память не зависит от общего числа строк.
+
+    Время вызова включает время вложенных вызовов, поэтому собственное время - это время вызова за вычетом
+    времени вызванных из него процедур в том же снимке
+    """
+
+    def __init__(self) -> None:
+        # Процедура -> [вызовы, время, чтения страниц, выборки страниц, прочитанные записи]
+        self._totals: Dict[str, List[int]] = {}
+        self._previous: Dict[CallKey, CallStats] = {}
+        self._previous_children: Dict[CallKey, int] = {}
+        self.calls_count = 0
+
+    def add_capture(self, rows: Iterable[CallStatsRow]) -> None:
+        current: Dict[CallKey, CallStats] = {}
+        # Вызов -> суммарное время вызванных из него процедур
+        children_elapsed: Dict[CallKey, int] = {}
+        for row in rows:
+            key = (row.attachment_id, row.call_id)
+            current[key] = (row.procedure_name, row.elapsed_ms, row.page_reads, row.page_fetches, row.record_reads)
+            if row.caller_id is not None:
+                caller_key = (row.attachment_id, row.caller_id)
+                children_elapsed[caller_key] = children_elapsed.get(caller_key, 0) + row.elapsed_ms
+
+        # Вызовы, которых нет в новом снимке (или номер которых занят вызовом другой процедуры), завершились
+        for key, stats in self._previous.items():
+            current_stats = current.get(key)
+            if current_stats is None or current_stats[0] != stats[0]:
+                self._add(stats, self._previous_children.get(key, 0))
+        self._previous = current
+        self._previous_children = children_elapsed
+
+    def _add(self, stats: CallStats, children_elapsed_ms: int) -> None:
+        procedure_name, elapsed_ms, page_reads, page_fetches, record_reads = stats
+        totals = self._totals.get(procedure_name)
+        if totals is None:
+            totals = self._totals[procedure_name] = [0, 0, 0, 0, 0]
+        totals[0] += 1
+        totals[1] += max(elapsed_ms - children_elapsed_ms, 0)
+        totals[2] += page_reads
+        totals[3] += page_fetches
+        totals[4] += record_reads
+        self.calls_count += 1
+
+    def finish(self) -> Dict[str, RuntimeCost]:
+        for key, stats in self._previous.items():
+            self._add(stats, self._previous_children.get(key, 0))
+        self._previous = {}
+        self._previous_children = {}
+        return {procedure_name: RuntimeCost(*totals) for procedure_name, totals in self._totals.items()}
+
+
+def aggregate_costs(captures: Iterable[Capture]) -> Dict[str, RuntimeCost]:
+    """
+    Собственная стоимость процедур по снимкам, идущим по порядку
+    """
+    with instrumentation.span("monitoring"):
+        aggregator = CostAggregator()
+        for _, rows in captures:
+            aggregator.add_capture(rows)
+        costs = aggregator.finish()
+        instrumentation.count("calls", aggregator.calls_count)
+    logger.log(f"monitoring: {aggregator.calls_count} calls of {len(costs)} procedures")
+    return costs
+
+
+def add_runtime_costs(
+    procedures: Dict[str, Procedure],
+    costs: Dict[str, RuntimeCost],
+    procedures_summary: Optional[ProceduresSummary] = None,
+) -> None:
+    """
+    Стоимость процедур из мониторинга в моделях: собственная и свернутая по графу вызовов
+    (вместе со всеми транзитивно вызываемыми процедурами). Процедуры, которых нет в схеме, пропускаются
+    """
+    costs = {name: cost for name, cost in costs.items() if name in procedures}
+    graph = {
+        name: [dependency.name for dependency in procedure.dependencies.procedure]
+        for name, procedure in procedures.items()
+    }
+    for name, total_cost in roll_up_costs(graph, costs).items():
+        procedure = procedures[name]
+        procedure.cost = costs.get(name)
+        procedure.total_cost = total_cost
+    if procedures_summary is not None:
+        procedures_summary.cost_count = len(costs)
@@ -1,10 +1,31 @@
-# pylint: disable=all
+import logging
+import sys
+
+
+LOGGER_NAME = "doc_generator"
 
 
 class Logger:
     """
-    Заглушка на случай появления нормального логгирования
+    Обертка над стандартным logging: все сообщения приложения идут в один логгер doc_generator
     """
 
-    def log(self, msg):
-        print(msg)
+    def __init__(self, name: str = LOGGER_NAME) -> None:
+        self._logger = logging.getLogger(name)
+
+    def log(self, msg: str, level: int = logging.INFO) -> None:
+        self._logger.log(level, msg)
+
+    def debug(self, msg: str) -> None:
+        self._logger.debug(msg)
+
+
+def configure(verbose: bool = False) -> None:
+    """
+    Вывод сообщений в stderr с отметкой времени
+    """
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    root_logger = logging.getLogger(LOGGER_NAME)
+    root_logger.handlers = [handler]
+    root_logger.setLevel(logging.DEBUG if verbose else logging.INFO)
@@ -0,0 +1,366 @@
+import gzip
+import io
+import os
+import queue
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Iterable, List, Optional, Set, Tuple, Union
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli не установлен
+    brotli = None  # pylint: disable=invalid-name
+
+
+OUTPUT_DIR = "dist"
+WRITE_BUFFER_SIZE = 64 * 1024
+
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Файлы, для которых пишутся сжатые копии: остальные (например, уже сжатые) не сжимаются повторно
+COMPRESSIBLE_EXTENSIONS = (".html", ".js", ".json", ".css")
+COMPRESSED_SUFFIXES = (".gz", ".br")
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.xz")
+
+# Ограничение очереди архива: рендеринг не уходит вперед записи больше чем на столько файлов
+ARCHIVE_QUEUE_SIZE = 256
+
+
+def write_atomic(path: str, chunks: Iterable[Union[str, bytes]], binary: bool = False) -> None:
+    """
+    Потоковая запись во временный файл рядом с целевым и атомарная замена целевого файла
+    """
+    directory, file_name = os.path.split(path)
+    temp_path = os.path.join(directory, f".{file_name}.{uuid.uuid4().hex}.tmp")
+    try:
+        if binary:
+            out = open(temp_path, "xb", buffering=WRITE_BUFFER_SIZE)
+        else:
+            out = open(temp_path, "x", encoding="utf-8", buffering=WRITE_BUFFER_SIZE)
+        with out:
+            out.writelines(chunks)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """
+    Атомарная запись файла, только если его содержимое изменилось. Возвращает признак записи
+    """
+    try:
+        with open(path, "rb") as source:
+            if source.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+
+    write_atomic(path, (data,), binary=True)
+    return True
+
+
+class DirectorySink:
+    """
+    Запись сгенерированных файлов в каталог (по умолчанию - OUTPUT_DIR).
+
+    after_write вызывается с путем каждого записанного файла: так к записи подключается предварительное сжатие
+    (Precompressor). Другой получатель файлов - ArchiveSink
+    """
+
+    def __init__(self, output_dir: Optional[str] = None, after_write: Optional[Callable[[str], None]] = None) -> None:
+        self._output_dir = output_dir
+        self._after_write = after_write
+
+    @property
+    def output_dir(self) -> str:
+        return self._output_dir or OUTPUT_DIR
+
+    def write(self, output_file: str, chunks: Iterable[Union[str, bytes]], binary: bool = False) -> int:
+        """
+        Потоковая запись файла. Возвращает его размер в байтах
+        """
+        path = os.path.join(self.output_dir, output_file)
+        write_atomic(path, chunks, binary=binary)
+        if self._after_write is not None:
+            self._after_write(path)
+        return os.path.getsize(path)
+
+    def write_if_changed(self, output_file: str, data: bytes) -> bool:
+        path = os.path.join(self.output_dir, output_file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = write_if_changed(path, data)
+        if written and self._after_write is not None:
+            self._after_write(path)
+        return written
+
+    def remove_except(self, directory: str, keep: Set[str]) -> None:
+        """
+        Удаление файлов подкаталога, которых нет в keep (устаревших после прошлой генерации)
+        """
+        path = os.path.join(self.output_dir, directory)
+        for file_name in set(os.listdir(path)) - keep:
+            os.remove(os.path.join(path, file_name))
+
+    def make_directory(self, directory: str) -> None:
+        os.makedirs(os.path.join(self.output_dir, directory), exist_ok=True)
+
+    def flush(self) -> None:
+        flush = getattr(self._after_write, "flush", None)
+        if flush is not None:
+            flush()
+
+    def close(self) -> None:
+        close = getattr(self._after_write, "close", None)
+        if close is not None:
+            close()
+
+    def abort(self) -> None:
+        """
+        Завершение после ошибки генерации: уже записанные в каталог файлы остаются
+        """
+
+    def __enter__(self) -> "DirectorySink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class SubdirectorySink(DirectorySink):
+    """
+    Запись в подкаталог другого получателя: в пакетном режиме сайт каждой базы данных пишется в свой подкаталог.
+    Закрывает получателя его владелец, а не подкаталог
+    """
+
+    def __init__(self, parent: DirectorySink, directory: str) -> None:
+        super().__init__()
+        self._parent = parent
+        self._directory = directory
+        parent.make_directory(directory)
+
+    @property
+    def output_dir(self) -> str:
+        return os.path.join(self._parent.output_dir, self._directory)
+
+    def _get_output_file(self, output_file: str) -> str:
+        return f"{self._directory}/{output_file}"
+
+    def write(self, output_file: str, chunks: Iterable[Union[str, bytes]], binary: bool = False) -> int:
+        return self._parent.write(self._get_output_file(output_file), chunks, binary=binary)
+
+    def write_if_changed(self, output_file: str, data: bytes) -> bool:
+        return self._parent.write_if_changed(self._get_output_file(output_file), data)
+
+    def remove_except(self, directory: str, keep: Set[str]) -> None:
+        self._parent.remove_except(self._get_output_file(directory), keep)
+
+    def make_directory(self, directory: str) -> None:
+        self._parent.make_directory(self._get_output_file(directory))
+
+    def flush(self) -> None:
+        self._parent.flush()
+
+    def close(self) -> None:
+        pass
+
+
+def get_compressed_siblings(path: str) -> List[str]:
+    return [f"{path}{suffix}" for suffix in COMPRESSED_SUFFIXES]
+
+
+class Precompressor:
+    """
+    Сжатые копии (.gz, .br) записанных файлов для отдачи статическим сервером без сжатия на лету.
+
+    Файлы сжимаются в пуле потоков параллельно с рендерингом: zlib и brotli отпускают GIL.
+    Файл перечитывается с диска, поэтому запись страниц остается потоковой.
+    """
+
+    def __init__(
+        self,
+        gzip_level: Optional[int] = DEFAULT_COMPRESSION_LEVEL,
+        brotli_level: Optional[int] = None,
+        threads: int = 2,
+    ) -> None:
+        if brotli_level is not None and brotli is None:
+            raise RuntimeError("Для сжатия brotli необходимо установить пакет brotli")
+        self._gzip_level = gzip_level
+        self._brotli_level = brotli_level
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._lock = threading.Lock()
+        self._pending: Set[Future] = set()
+
+    def __call__(self, path: str) -> None:
+        if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        future = self._executor.submit(self._compress, path)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+
+    def _discard(self, future: Future) -> None:
+        # Ошибки сжатия не теряются: завершенные с ошибкой задания остаются до flush
+        if future.exception() is None:
+            with self._lock:
+                self._pending.discard(future)
+
+    def _compress(self, path: str) -> None:
+        with open(path, "rb") as source:
+            data = source.read()
+        if self._gzip_level is not None:
+            write_atomic(f"{path}.gz", (gzip.compress(data, compresslevel=self._gzip_level, mtime=0),), binary=True)
+        if self._brotli_level is not None:
+            write_atomic(f"{path}.br", (brotli.compress(data, quality=self._brotli_level),), binary=True)
+
+    def flush(self) -> None:
+        """
+        Ожидание сжатия всех переданных файлов. Первая ошибка сжатия пробрасывается
+        """
+        with self._lock:
+            pending = list(self._pending)
+            self._pending = set()
+        for future in pending:
+            future.result()
+
+    def close(self) -> None:
+        self.flush()
+        self._executor.shutdown()
+
+
+ArchiveEntry = Optional[Tuple[str, bytes]]
+
+
+class ArchiveSink(DirectorySink):
+    """
+    Запись всего сайта в один архив (zip или tar, в том числе сжатый) без отдельных файлов на диске.
+
+    Файлы передаются через ограниченную очередь в поток записи, который сжимает архив параллельно
+    с рендерингом. Архив пишется во временный файл и заменяет целевой только после успешного close
+    """
+
+    def __init__(self, path: str, compression_level: int = DEFAULT_COMPRESSION_LEVEL) -> None:
+        super().__init__()
+        if not path.endswith(ARCHIVE_EXTENSIONS):
+            raise ValueError(f"Неподдерживаемый формат архива {path}, ожидается один из {ARCHIVE_EXTENSIONS}")
+        self._path = path
+        self._compression_level = compression_level
+        self._temp_path = f"{path}.tmp"
+        self._queue: "queue.Queue[ArchiveEntry]" = queue.Queue(maxsize=ARCHIVE_QUEUE_SIZE)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="archive-writer", daemon=True)
+        self._thread.start()
+
+    def _open_archive(self) -> Union[zipfile.ZipFile, tarfile.TarFile]:
+        if self._path.endswith(".zip"):
+            return zipfile.ZipFile(
+                self._temp_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=self._compression_level
+            )
+        if self._path.endswith((".tar.gz", ".tgz")):
+            return tarfile.open(self._temp_path, "w:gz", compresslevel=self._compression_level)
+        if self._path.endswith(".tar.xz"):
+            return tarfile.open(self._temp_path, "w:xz", preset=self._compression_level)
+        return tarfile.open(self._temp_path, "w")
+
+    @staticmethod
+    def _add(archive: Union[zipfile.ZipFile, tarfile.TarFile], name: str, data: bytes) -> None:
+        if isinstance(archive, zipfile.ZipFile):
+            archive.writestr(name, data)
+            return
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        archive.addfile(info, io.BytesIO(data))
+
+    def _run(self) -> None:
+        finished = False
+        try:
+            with self._open_archive() as archive:
+                while not finished:
+                    entry = self._queue.get()
+                    if entry is None:
+                        finished = True
+                    else:
+                        self._add(archive, *entry)
+        except BaseException as error:  # pylint: disable=broad-except
+            self._error = error
+            # Освобождение очереди, чтобы рендеринг не заблокировался на заполненной очереди
+            while not finished:
+                finished = self._queue.get() is None
+
+    def _put(self, output_file: str, data: bytes) -> None:
+        if self._error is not None:
+            raise self._error
+        self._queue.put((output_file, data))
+
+    def write(self, output_file: str, chunks: Iterable[Union[str, bytes]], binary: bool = False) -> int:
+        data = b"".join(chunks) if binary else "".join(chunks).encode("utf-8")
+        self._put(output_file, data)
+        return len(data)
+
+    def write_if_changed(self, output_file: str, data: bytes) -> bool:
+        self._put(output_file, data)
+        return True
+
+    def remove_except(self, directory: str, keep: Set[str]) -> None:
+        """
+        Архив собирается заново при каждой генерации, устаревших файлов в нем нет
+        """
+
+    def make_directory(self, directory: str) -> None:
+        """
+        Каталоги в архиве не создаются отдельно: они следуют из путей файлов
+        """
+
+    def flush(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _finish(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _remove_temp(self) -> None:
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def close(self) -> None:
+        self._finish()
+        if self._error is not None:
+            self._remove_temp()
+            raise self._error
+        os.replace(self._temp_path, self._path)
+
+    def abort(self) -> None:
+        """
+        Незаконченный архив удаляется, предыдущий архив остается на месте
+        """
+        self._finish()
+        self._remove_temp()
+
+
+def get_sink(
+    archive: Optional[str] = None,
+    output_dir: Optional[str] = None,
+    gzip_level: Optional[int] = None,
+    brotli_level: Optional[int] = None,
+    compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+) -> DirectorySink:
+    """
+    Получатель файлов по режиму вывода: архив, каталог со сжатыми копиями или просто каталог
+    (output_dir, по умолчанию - OUTPUT_DIR)
+    """
+    if archive:
+        return ArchiveSink(archive, compression_level=compression_level)
+    if gzip_level is not None or brotli_level is not None:
+        return DirectorySink(output_dir, after_write=Precompressor(gzip_level=gzip_level, brotli_level=brotli_level))
+    return DirectorySink(output_dir)
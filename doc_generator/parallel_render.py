@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import replace
+from multiprocessing.context import BaseContext
+from typing import Any, Iterable, Iterator, List, Optional, Set
+
+from doc_generator import generate_doc
+from doc_generator.generate_doc import RenderJob, render_jobs, env, TEMPLATE_DIR
+from doc_generator.output import get_sink
+from doc_generator.models import Procedure, Dependency
+
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def _detach_procedure(procedure: Procedure) -> Procedure:
+    """
+    Копия процедуры для передачи в процесс-обработчик.
+
+    Зависимости-процедуры заменены ссылками по имени: без этого pickle каждой процедуры тянул бы за собой
+    весь связный граф процедур, а шаблоны используют у них только имя.
+    """
+    dependencies = replace(
+        procedure.dependencies,
+        procedure=[Dependency(name=dependency.name) for dependency in procedure.dependencies.procedure],
+    )
+    return replace(procedure, dependencies=dependencies)
+
+
+def _map_procedures(value: Any, function: Any) -> Any:
+    if isinstance(value, Procedure):
+        return function(value)
+    if isinstance(value, dict):
+        return {key: _map_procedures(item, function) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_map_procedures(item, function) for item in value]
+    return value
+
+
+def _map_job(job: RenderJob, function: Any) -> RenderJob:
+    return job._replace(context={key: _map_procedures(value, function) for key, value in job.context.items()})
+
+
+def _get_batches(jobs: Iterable[RenderJob], batch_size: int) -> Iterator[List[RenderJob]]:
+    batch = []
+    for job in jobs:
+        batch.append(_map_job(job, _detach_procedure))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _init_worker(output_dir: str, gzip_level: Optional[int], brotli_level: Optional[int]) -> None:
+    """
+    Однократная компиляция всех шаблонов в процессе-обработчике (дальше они берутся из кеша окружения)
+    и настройка получателя страниц. Каталог вывода передается явно: при запуске процессов через spawn
+    глобальные переменные родителя не наследуются
+    """
+    for template_name in os.listdir(TEMPLATE_DIR):
+        env.get_template(template_name)
+    generate_doc.sink = get_sink(output_dir=output_dir, gzip_level=gzip_level, brotli_level=brotli_level)
+
+
+def _render_batch(batch: List[RenderJob]) -> int:
+    render_jobs(batch)
+    # Пачка считается готовой, когда сжаты и ее страницы
+    generate_doc.sink.flush()
+    return len(batch)
+
+
+def render_jobs_parallel(  # pylint: disable=too-many-arguments
+    jobs: Iterable[RenderJob],
+    processes: int,
+    output_dir: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    gzip_level: Optional[int] = None,
+    brotli_level: Optional[int] = None,
+    mp_context: Optional[BaseContext] = None,
+) -> int:
+    """
+    Рендеринг и запись страниц в каталог output_dir в пуле процессов.
+
+    Задания отправляются пачками, и в очереди одновременно находится не больше двух пачек на процесс,
+    чтобы генератор заданий не материализовался в памяти целиком. Сжатые копии страниц пишут сами процессы.
+    """
+    rendered_count = 0
+    max_pending = processes * 2
+    pending: Set[Future] = set()
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(output_dir, gzip_level, brotli_level),
+    ) as executor:
+        for batch in _get_batches(jobs, batch_size):
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                rendered_count += sum(future.result() for future in done)
+            pending.add(executor.submit(_render_batch, batch))
+
+        done, _ = wait(pending)
+        rendered_count += sum(future.result() for future in done)
+
+    return rendered_count
@@ -0,0 +1,139 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict, Counter
+from typing import NamedTuple, Optional, Tuple
+
+
+# Нерекомендованные функции из rfunc
+DEPRECATED_UDFS = frozenset(("Z", "C", "MAXNUM", "MINNUM"))
+
+# Ключевые слова PSQL: написанные с заглавной буквы (Begin, Select) они не считаются CamelCase-идентификаторами
+PSQL_KEYWORDS = frozenset(
+    (
+        "ACTIVE", "ADD", "AFTER", "ALL", "ALTER", "AND", "ANY", "AS", "ASC", "AT", "AUTONOMOUS", "AVG", "BEFORE",
+        "BEGIN", "BETWEEN", "BIGINT", "BLOB", "BREAK", "BY", "CASE", "CAST", "CHAR", "CHARACTER", "CLOSE",
+        "COALESCE", "COMMIT", "CONTAINING", "COUNT", "CREATE", "CURRENT_DATE", "CURRENT_TIMESTAMP", "CURSOR",
+        "DATE", "DECIMAL", "DECLARE", "DEFAULT", "DELETE", "DESC", "DISTINCT", "DO", "DOUBLE", "ELSE", "END",
+        "ENTRY_POINT", "EXCEPTION", "EXECUTE", "EXISTS", "EXIT", "EXTRACT", "FETCH", "FIRST", "FLOAT", "FOR",
+        "FROM", "FULL", "GEN_ID", "GROUP", "HAVING", "IF", "IN", "INNER", "INSERT", "INTEGER", "INTO", "IS",
+        "JOIN", "LAST", "LEAVE", "LEFT", "LIKE", "LOWER", "MATCHING", "MAX", "MERGE", "MIN", "NOT", "NULL",
+        "NULLIF", "NUMERIC", "OF", "ON", "OPEN", "OR", "ORDER", "OUTER", "POSITION", "PROCEDURE", "RETURNING",
+        "RETURNS", "RIGHT", "ROLLBACK", "ROWS", "SELECT", "SET", "SKIP", "SMALLINT", "SOME", "STARTING",
+        "STATEMENT", "SUBSTRING", "SUM", "SUSPEND", "THEN", "TIME", "TIMESTAMP", "TRANSACTION", "TRIM", "UNION",
+        "UPDATE", "UPPER", "USING", "VALUES", "VARCHAR", "VARIABLE", "VIEW", "WHEN", "WHERE", "WHILE", "WITH",
+    )
+)
+
+# Лексемы PSQL: комментарии, строковые константы и идентификаторы в кавычках совпадают без захвата,
+# слово кода (вместе с открывающей скобкой, если это вызов) - в группе. Лексема определяется по первому символу,
+# поэтому слова внутри строк и комментариев не видны
+TOKEN_RE = re.compile(
+    r"""
+    --[^\n]*
+    |/\*.*?(?:\*/|\Z)
+    |'[^']*(?:''[^']*)*'?
+    |"[^"]*(?:""[^"]*)*"?
+    |(\w+(?:\s*\()?)
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+
+class SourceStatistics(NamedTuple):
+    """
+    Результат лексического анализа исходного кода процедуры
+    """
+
+    length: int
+    letters: int
+    lower: int
+    upper: int
+    camel_case_identifiers: Tuple[str, ...]
+    deprecated_udfs: Tuple[str, ...]
+
+
+def is_camel_case(word: str) -> bool:
+    """
+    CamelCase - переход от строчной буквы к заглавной внутри слова (myVar, GetBalance), но не ключевое слово
+    """
+    if word.upper() in PSQL_KEYWORDS:
+        return False
+    return any(char.islower() and next_char.isupper() for char, next_char in zip(word, word[1:]))
+
+
+def scan_source(text: str) -> SourceStatistics:
+    """
+    Анализ исходного кода PSQL за один лексический проход.
+
+    Текст разбирается на лексемы одним регулярным выражением, и слова кода подсчитываются в Counter:
+    оба шага идут на C, а в Python разбирается только каждое различное слово один раз. Из слов кода,
+    без строковых констант, комментариев и идентификаторов в кавычках, берутся и регистр букв,
+    и CamelCase-идентификаторы, и вызовы нерекомендованных UDF
+    """
+    code_words = Counter(TOKEN_RE.findall(text))
+    # Пустая группа - совпала строка, комментарий или идентификатор в кавычках
+    code_words.pop("", None)
+
+    letters = lower = upper = 0
+    camel_case_identifiers = set()
+    deprecated_udfs = set()
+    for code_word, count in code_words.items():
+        word = code_word.rstrip("( \t\r\n")
+        word_lower = sum(char.islower() for char in word)
+        word_upper = sum(char.isupper() for char in word)
+        letters += sum(char.isalpha() for char in word) * count
+        lower += word_lower * count
+        upper += word_upper * count
+        if code_word.endswith("(") and word.upper() in DEPRECATED_UDFS:
+            deprecated_udfs.add(word.upper())
+        elif word_lower and word_upper and is_camel_case(word):
+            camel_case_identifiers.add(word)
+
+    return SourceStatistics(
+        length=len(text),
+        letters=letters,
+        lower=lower,
+        upper=upper,
+        camel_case_identifiers=tuple(sorted(camel_case_identifiers)),
+        deprecated_udfs=tuple(sorted(deprecated_udfs)),
+    )
+
+
+class SourceAnalyzer:
+    """
+    Анализ исходного кода с кешем по хешу текста: неизменившиеся процедуры повторно не разбираются
+    """
+
+    def __init__(self, max_entries: Optional[int] = 100000) -> None:
+        self._max_entries = max_entries
+        self._cache: "OrderedDict[bytes, SourceStatistics]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def analyze(self, text: str) -> SourceStatistics:
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            statistics = self._cache.get(digest)
+            if statistics is not None:
+                self.hits += 1
+                self._cache.move_to_end(digest)
+                return statistics
+            self.misses += 1
+
+        statistics = scan_source(text)
+        with self._lock:
+            self._cache[digest] = statistics
+            if self._max_entries is not None and len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return statistics
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+source_analyzer = SourceAnalyzer()  # pylint: disable=invalid-name
@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+
+CacheKey = Tuple[Hashable, str, Tuple[Any, ...]]
+
+
+class RowCache:
+    """
+    Кеш материализованных результатов выборок.
+
+    Результат хранится один раз в виде кортежа и отдается при попадании как есть, без копирования.
+    Ключ - (область, метод, аргументы), где область обычно DSN базы данных.
+    При заданном max_rows из кеша вытесняются давно не использованные выборки.
+    """
+
+    def __init__(self, max_rows: Optional[int] = None) -> None:
+        self._max_rows = max_rows
+        self._entries: "OrderedDict[CacheKey, Tuple[Any, int]]" = OrderedDict()
+        self._rows = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _materialize(result: Any) -> Tuple[Any, int]:
+        if isinstance(result, Iterator):
+            rows = tuple(result)
+            return rows, len(rows)
+        return result, 1
+
+    def _evict(self) -> None:
+        while self._max_rows is not None and self._rows > self._max_rows and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._rows -= size
+            self.evictions += 1
+
+    def get_or_load(self, key: CacheKey, loader: Callable[[], Any]) -> Any:
+        """
+        Загрузка выполняется без блокировки, чтобы разные выборки могли загружаться параллельно
+        """
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+
+        value, size = self._materialize(loader())
+        with self._lock:
+            if (self._max_rows is None or size <= self._max_rows) and key not in self._entries:
+                self._entries[key] = (value, size)
+                self._rows += size
+                self._evict()
+        return value
+
+    def invalidate(self, scope: Optional[Hashable] = None, method_name: Optional[str] = None) -> int:
+        """
+        Сброс записей кеша, подходящих под область и метод (None - любые)
+        """
+        with self._lock:
+            keys = [
+                key
+                for key in self._entries
+                if (scope is None or key[0] == scope) and (method_name is None or key[1] == method_name)
+            ]
+            for key in keys:
+                _, size = self._entries.pop(key)
+                self._rows -= size
+        return len(keys)
+
+    @property
+    def hit_ratio(self) -> float:
+        try:
+            return self.hits / (self.hits + self.misses)
+        except ZeroDivisionError:
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "rows": self._rows,
+            "hit_ratio": self.hit_ratio,
+        }
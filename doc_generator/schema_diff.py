@@ -0,0 +1,216 @@
+import dataclasses
+import difflib
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from doc_generator import generate_doc
+from doc_generator.generate_doc import RenderJob
+from doc_generator.output import DirectorySink
+from doc_generator.instrumentation import instrumentation
+from doc_generator.models import ObjectChange, ObjectsDiff, Procedure, SchemaDiff, Table
+from doc_generator.source_store import get_digest
+
+
+DIFF_VERSION = 1
+CHANGES_FILE = "changes.json"
+
+# Строк контекста вокруг изменений в diff исходного кода
+SOURCE_DIFF_CONTEXT = 3
+
+DEPENDENCY_KINDS = ("table", "trigger", "procedure", "index", "udf")
+
+
+class Aspect(NamedTuple):
+    """
+    Сравниваемая часть объекта: content - ее содержимое из строк и кортежей примитивов (для хеша и сравнения),
+    items - словарь ее элементов для поэлементного описания изменений (если часть из них состоит)
+    """
+
+    content: Callable[[Any], Any]
+    items: Optional[Callable[[Any], Dict[str, Any]]] = None
+
+
+Aspects = Dict[str, Aspect]
+
+
+def get_procedure_parameters(procedure: Procedure) -> Dict[str, int]:
+    """
+    Параметры процедуры "<направление>:<имя>" -> позиция
+    """
+    parameters = {f"input:{parameter.name}": number for number, parameter in enumerate(procedure.parameters.input)}
+    parameters.update(
+        {f"output:{parameter.name}": number for number, parameter in enumerate(procedure.parameters.output)}
+    )
+    return parameters
+
+
+def get_procedure_dependency_names(procedure: Procedure) -> Tuple[Tuple[str, ...], ...]:
+    """
+    Имена зависимостей процедуры по видам. Порядок строк каталога в разных БД разный, поэтому имена сортируются
+    """
+    return tuple(
+        tuple(sorted(dependency.name for dependency in getattr(procedure.dependencies, kind)))
+        for kind in DEPENDENCY_KINDS
+    )
+
+
+def get_procedure_dependencies(procedure: Procedure) -> Dict[str, None]:
+    """
+    Зависимости процедуры "<вид>:<имя>"
+    """
+    return {
+        f"{kind}:{name}": None
+        for kind, names in zip(DEPENDENCY_KINDS, get_procedure_dependency_names(procedure))
+        for name in names
+    }
+
+
+def get_table_fields(table: Table) -> Dict[str, Tuple[str, Optional[str]]]:
+    return {f"field:{table_field.name}": (table_field.type, table_field.description) for table_field in table.fields}
+
+
+# Сравниваемые части объектов. Производные данные (метрики графа вызовов, "используется в")
+# не сравниваются: они меняются вслед за другими объектами, а не при изменении самого объекта
+PROCEDURE_ASPECTS: Aspects = {
+    "description": Aspect(lambda procedure: procedure.description),
+    # Исходники сравниваются по хешу: выгруженный в хранилище текст при этом не перечитывается
+    "source": Aspect(lambda procedure: get_digest(procedure.source.text)),
+    "parameters": Aspect(
+        lambda procedure: (
+            tuple(parameter.name for parameter in procedure.parameters.input),
+            tuple(parameter.name for parameter in procedure.parameters.output),
+        ),
+        get_procedure_parameters,
+    ),
+    "dependencies": Aspect(get_procedure_dependency_names, get_procedure_dependencies),
+}
+TABLE_ASPECTS: Aspects = {
+    "description": Aspect(lambda table: table.description),
+    "fields": Aspect(
+        lambda table: tuple(
+            (table_field.name, table_field.type, table_field.description) for table_field in table.fields
+        ),
+        get_table_fields,
+    ),
+}
+
+
+def get_object_digest(item: Any, aspects: Aspects) -> bytes:
+    """
+    Хеш нормализованного содержимого всех частей объекта. Строки (исходный код) хешируются как есть,
+    без repr; метка типа перед частью отличает строку "None" от отсутствующего значения
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for aspect in aspects.values():
+        value = aspect.content(item)
+        if isinstance(value, str):
+            digest.update(b"s")
+            digest.update(value.encode("utf-8"))
+        else:
+            digest.update(b"r")
+            digest.update(repr(value).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.digest()
+
+
+def get_digests(objects: Iterable[Any], aspects: Aspects) -> Dict[str, bytes]:
+    return {item.name: get_object_digest(item, aspects) for item in objects}
+
+
+def get_source_diff(old_text: Optional[str], new_text: Optional[str], old: str, new: str) -> List[str]:
+    return list(
+        difflib.unified_diff(
+            (old_text or "").splitlines(),
+            (new_text or "").splitlines(),
+            fromfile=old,
+            tofile=new,
+            n=SOURCE_DIFF_CONTEXT,
+            lineterm="",
+        )
+    )
+
+
+def _get_object_change(old_object: Any, new_object: Any, aspects: Aspects) -> ObjectChange:
+    change = ObjectChange(name=new_object.name)
+    for aspect_name, aspect in aspects.items():
+        if aspect.content(old_object) == aspect.content(new_object):
+            continue
+        change.aspects.append(aspect_name)
+        if aspect.items is None:
+            continue
+        old_items = aspect.items(old_object)
+        new_items = aspect.items(new_object)
+        change.added.extend(key for key in new_items if key not in old_items)
+        change.removed.extend(key for key in old_items if key not in new_items)
+        change.changed.extend(key for key, value in new_items.items() if key in old_items and old_items[key] != value)
+    return change
+
+
+def diff_objects(old_objects: Dict[str, Any], new_objects: Dict[str, Any], aspects: Aspects) -> ObjectsDiff:
+    """
+    Сравнение двух наборов объектов соединением по имени и хешу содержимого: линейно по числу объектов.
+    По частям и поэлементно сравниваются только объекты с изменившимся хешем
+    """
+    old_digests = get_digests(old_objects.values(), aspects)
+    new_digests = get_digests(new_objects.values(), aspects)
+
+    objects_diff = ObjectsDiff(
+        added=sorted(name for name in new_digests if name not in old_digests),
+        removed=sorted(name for name in old_digests if name not in new_digests),
+    )
+    for name in sorted(new_digests):
+        old_digest = old_digests.get(name)
+        if old_digest is not None and old_digest != new_digests[name]:
+            objects_diff.changed.append(_get_object_change(old_objects[name], new_objects[name], aspects))
+    return objects_diff
+
+
+def diff_schemas(  # pylint: disable=too-many-arguments
+    old_procedures: Dict[str, Procedure],
+    old_tables: List[Table],
+    new_procedures: Dict[str, Procedure],
+    new_tables: List[Table],
+    old: str = "old",
+    new: str = "new",
+) -> SchemaDiff:
+    """
+    Изменения процедур и таблиц между двумя схемами. Diff исходного кода строится только для процедур,
+    у которых изменился хеш исходника
+    """
+    with instrumentation.span("schema_diff"):
+        schema_diff = SchemaDiff(
+            old=old,
+            new=new,
+            procedures=diff_objects(old_procedures, new_procedures, PROCEDURE_ASPECTS),
+            tables=diff_objects(
+                {table.name: table for table in old_tables}, {table.name: table for table in new_tables}, TABLE_ASPECTS
+            ),
+        )
+        for change in schema_diff.procedures.changed:
+            if "source" in change.aspects:
+                change.source_diff = get_source_diff(
+                    old_procedures[change.name].source.read_text(),
+                    new_procedures[change.name].source.read_text(),
+                    old,
+                    new,
+                )
+        instrumentation.count("changed_objects", len(schema_diff.procedures.changed) + len(schema_diff.tables.changed))
+    return schema_diff
+
+
+def get_changes_data(schema_diff: SchemaDiff) -> bytes:
+    data = {"version": DIFF_VERSION, **dataclasses.asdict(schema_diff)}
+    return json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8")
+
+
+def write_changes(schema_diff: SchemaDiff, sink: Optional[DirectorySink] = None) -> None:
+    """
+    Машиночитаемый diff схем в changes.json (по умолчанию - через generate_doc.sink)
+    """
+    sink = sink or generate_doc.sink
+    sink.write_if_changed(CHANGES_FILE, get_changes_data(schema_diff))
+
+
+def get_changes_job(schema_diff: SchemaDiff) -> RenderJob:
+    return RenderJob(template="changes.html", output_file="changes.html", context={"diff": schema_diff})
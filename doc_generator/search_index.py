@@ -0,0 +1,194 @@
+import json
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from doc_generator import generate_doc
+from doc_generator.instrumentation import instrumentation
+from doc_generator.models import Procedure, Table
+from doc_generator.output import DirectorySink, get_compressed_siblings
+
+
+SEARCH_DIR = "search"
+META_KEY = "meta"
+META_FILE = f"{META_KEY}.js"
+SEARCH_INDEX_VERSION = 2
+
+# Функция страницы поиска, которую вызывает загруженный скрипт шарда
+LOADED_CALLBACK = "searchIndexLoaded"
+
+# Длина префикса токена, по которому токены распределяются по шардам
+SHARD_PREFIX_LENGTH = 2
+
+PROCEDURE_KIND = "p"
+TABLE_KIND = "t"
+
+# Веса полей - разные степени двойки: токен, найденный в нескольких полях документа, получает сумму их весов
+NAME_WEIGHT = 16
+PARAMETER_WEIGHT = 8
+DEPENDENCY_WEIGHT = 4
+DESCRIPTION_WEIGHT = 2
+SOURCE_WEIGHT = 1
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Ключевые слова PSQL встречаются почти в каждой процедуре: их списки документов занимали бы большую часть
+# индекса и ничего не давали поиску
+STOP_WORDS = frozenset(
+    (
+        "and", "as", "begin", "by", "case", "declare", "do", "else", "end", "exception", "execute", "exit", "for",
+        "from", "if", "in", "insert", "into", "is", "join", "left", "not", "null", "or", "procedure", "returning",
+        "returns", "select", "set", "suspend", "then", "update", "values", "variable", "when", "where", "while",
+    )
+)
+
+# (вид документа, имя объекта)
+SearchDocument = Tuple[str, str]
+
+
+def get_tokens(text: str) -> Set[str]:
+    """
+    Токены текста в нижнем регистре. Идентификаторы вида GET_CLIENT_BALANCE индексируются целиком
+    и по частям, чтобы находиться и по отдельным словам
+    """
+    tokens = set()
+    for word in TOKEN_RE.findall(text.lower()):
+        tokens.add(word)
+        if "_" in word:
+            tokens.update(word.split("_"))
+    return {token for token in tokens if len(token) >= SHARD_PREFIX_LENGTH and token not in STOP_WORDS}
+
+
+def get_shard_key(token: str) -> str:
+    """
+    Имя шарда по префиксу токена: коды символов в hex, чтобы имя файла не зависело от алфавита.
+    В search.html вычисляется так же
+    """
+    return "-".join(format(ord(char), "x") for char in token[:SHARD_PREFIX_LENGTH])
+
+
+def _get_procedure_fields(procedure: Procedure) -> Iterator[Tuple[str, int]]:
+    yield procedure.name, NAME_WEIGHT
+    for parameter in procedure.parameters.input + procedure.parameters.output:
+        yield parameter.name, PARAMETER_WEIGHT
+    for dependency in procedure.dependencies.procedure + procedure.dependencies.table + procedure.dependencies.udf:
+        yield dependency.name, DEPENDENCY_WEIGHT
+    if procedure.description:
+        yield procedure.description, DESCRIPTION_WEIGHT
+    yield procedure.source.read_text(), SOURCE_WEIGHT
+
+
+def _get_table_fields(table: Table) -> Iterator[Tuple[str, int]]:
+    yield table.name, NAME_WEIGHT
+    for table_field in table.fields:
+        yield table_field.name, PARAMETER_WEIGHT
+        if table_field.description:
+            yield table_field.description, DESCRIPTION_WEIGHT
+    if table.description:
+        yield table.description, DESCRIPTION_WEIGHT
+
+
+class SearchIndexBuilder:
+    """
+    Инвертированный индекс для поиска на клиенте: токен -> документы с весом совпадения.
+
+    Токены распределяются по шардам по префиксу, каждый шард и список документов пишутся отдельными
+    скриптами: страница поиска загружает список документов и только те шарды, которые нужны для токенов запроса.
+    """
+
+    def __init__(self) -> None:
+        self._documents: List[SearchDocument] = []
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+
+    def add(self, kind: str, name: str, weighted_fields: Iterable[Tuple[str, int]]) -> None:
+        document_id = len(self._documents)
+        self._documents.append((kind, name))
+
+        weights: Dict[str, int] = defaultdict(int)
+        for text, weight in weighted_fields:
+            for token in get_tokens(text):
+                weights[token] |= weight
+        for token, weight in weights.items():
+            self._postings[token][document_id] = weight
+
+    def add_procedures(self, procedures: Iterable[Procedure]) -> None:
+        for procedure in procedures:
+            self.add(PROCEDURE_KIND, procedure.name, _get_procedure_fields(procedure))
+
+    def add_table(self, table: Table) -> None:
+        self.add(TABLE_KIND, table.name, _get_table_fields(table))
+
+    def add_tables(self, tables: Iterable[Table]) -> None:
+        for table in tables:
+            self.add_table(table)
+
+    @staticmethod
+    def _encode_postings(postings: Dict[int, int]) -> List[int]:
+        """
+        Плоский список [разность id, вес, ...]: id документов растут, и маленькие разности хорошо сжимаются
+        """
+        encoded = []
+        previous_id = 0
+        for document_id in sorted(postings):
+            encoded.extend((document_id - previous_id, postings[document_id]))
+            previous_id = document_id
+        return encoded
+
+    def get_shards(self) -> Dict[str, Dict[str, List[int]]]:
+        shards: Dict[str, Dict[str, List[int]]] = defaultdict(dict)
+        for token in sorted(self._postings):
+            shards[get_shard_key(token)][token] = self._encode_postings(self._postings[token])
+        return shards
+
+    def get_meta(self, shard_keys: Iterable[str]) -> dict:
+        return {
+            "version": SEARCH_INDEX_VERSION,
+            "prefix_length": SHARD_PREFIX_LENGTH,
+            "documents": self._documents,
+            "shards": sorted(shard_keys),
+        }
+
+
+def dump_index_script(key: str, value) -> bytes:
+    """
+    Шард в виде скрипта, передающего данные странице поиска: как и файлы данных (generate_doc.dump_data_script),
+    подключается тегом script и поэтому загружается и при открытии страниц из файловой системы, где fetch запрещен.
+    Для отдачи сервером сжатыми пишутся копии .gz/.br (--gzip, --brotli)
+    """
+    data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return f"{LOADED_CALLBACK}({json.dumps(key)},{data});\n".encode("utf-8")
+
+
+def write_search_index(
+    procedures: Iterable[Procedure], tables: Iterable[Table], sink: Optional[DirectorySink] = None
+) -> None:
+    """
+    Построение индекса и запись шардов в каталог search (по умолчанию - через generate_doc.sink)
+    """
+    with instrumentation.span("search_index"):
+        builder = SearchIndexBuilder()
+        builder.add_procedures(procedures)
+        builder.add_tables(tables)
+        write_search_shards(builder, sink)
+
+
+def write_search_shards(builder: SearchIndexBuilder, sink: Optional[DirectorySink] = None) -> None:
+    """
+    Запись шардов построенного индекса. Шарды исчезнувших префиксов удаляются вместе с их сжатыми копиями
+    """
+    sink = sink or generate_doc.sink
+    shards = builder.get_shards()
+
+    file_names = {META_FILE}
+    written_count = 0
+    for shard_key, shard in shards.items():
+        file_name = f"{shard_key}.js"
+        file_names.add(file_name)
+        written_count += sink.write_if_changed(f"{SEARCH_DIR}/{file_name}", dump_index_script(shard_key, shard))
+    meta = dump_index_script(META_KEY, builder.get_meta(shards))
+    written_count += sink.write_if_changed(f"{SEARCH_DIR}/{META_FILE}", meta)
+
+    sink.remove_except(SEARCH_DIR, file_names.union(*map(get_compressed_siblings, file_names)))
+
+    instrumentation.count("search_shards", len(shards))
+    instrumentation.count("search_files_written", written_count)
@@ -0,0 +1,228 @@
+import gzip
+import hashlib
+import json
+import os
+from operator import itemgetter
+from typing import Dict, Iterator, List, Any, Tuple, Type, Optional, Sequence
+
+from doc_generator.fb_row_models import (
+    ProcedureParameterRow,
+    ProcedureRow,
+    ProcedureDependencyRow,
+    CountRow,
+    TableRow,
+    FieldRow,
+    IndexSegmentRow,
+)
+from doc_generator.source_store import spill, read_text
+
+
+SNAPSHOT_FORMAT = "firebird-doc-snapshot"
+SNAPSHOT_VERSION = 1
+
+# Секция снимка -> (модель строки, метод шлюза)
+ROW_SECTIONS: Dict[str, Tuple[Type, str]] = {
+    "procedures": (ProcedureRow, "get_procedures"),
+    "procedure_parameters": (ProcedureParameterRow, "get_procedure_parameters"),
+    "procedure_dependencies": (ProcedureDependencyRow, "get_procedure_dependencies"),
+    "tables": (TableRow, "get_tables"),
+    "fields": (FieldRow, "get_fields"),
+    "index_segments": (IndexSegmentRow, "get_index_segments"),
+}
+# Секции, появившиеся позже формата: в прежних снимках их нет, и выборки пустые
+OPTIONAL_SECTIONS = ("index_segments",)
+
+COUNT_METHODS = (
+    "get_procedures_count",
+    "get_procedures_description_count",
+    "get_tables_count",
+    "get_tables_description_count",
+)
+
+CHUNK_SIZE = 5000
+# Порция процедур ограничена и по объему исходников: порция читается из снимка целиком
+CHUNK_SOURCE_SIZE = 4 * 1024 * 1024
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _get_field_names(row_class: Type) -> List[str]:
+    return list(row_class._fields)
+
+
+def export_snapshot(gateway: Any, path: str, compresslevel: int = 6) -> None:
+    """
+    Потоково выгружает все выборки шлюза в файл снимка.
+
+    Снимок - gzip-файл в формате JSON Lines: первая строка - заголовок с версией формата,
+    остальные - порции строк выборок в виде позиционных списков.
+    """
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "sections": {section: _get_field_names(row_class) for section, (row_class, _) in ROW_SECTIONS.items()},
+        "counts": {method_name: getattr(gateway, method_name)().count for method_name in COUNT_METHODS},
+    }
+
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=compresslevel) as out:
+        out.write(json.dumps(header, ensure_ascii=False))
+        out.write("\n")
+
+        for section, (_, method_name) in ROW_SECTIONS.items():
+            chunk = []
+            source_size = 0
+            for row in getattr(gateway, method_name)():
+                if isinstance(row, ProcedureRow):
+                    row = row._replace(source=read_text(row.source))
+                    source_size += len(row.source or "")
+                chunk.append(row)
+                if len(chunk) >= CHUNK_SIZE or source_size >= CHUNK_SOURCE_SIZE:
+                    _write_chunk(out, section, chunk)
+                    chunk = []
+                    source_size = 0
+            if chunk:
+                _write_chunk(out, section, chunk)
+
+
+def _write_chunk(out: Any, section: str, chunk: List[Tuple[Any, ...]]) -> None:
+    out.write(json.dumps([section, chunk], ensure_ascii=False, separators=(",", ":")))
+    out.write("\n")
+
+
+def _check_header(header: Dict[str, Any]) -> None:
+    if header.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError("Файл не является снимком схемы")
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Неподдерживаемая версия снимка: {header.get('version')}")
+
+    for section, (row_class, _) in ROW_SECTIONS.items():
+        if section in OPTIONAL_SECTIONS and section not in header["sections"]:
+            continue
+        if header["sections"].get(section) != _get_field_names(row_class):
+            raise SnapshotError(f"Несовместимый набор полей в секции {section}")
+
+
+class InMemoryGateway:
+    """
+    Шлюз с тем же набором методов, что и FirebirdGateway, но отдающий строки выборок из памяти.
+
+    Секции - позиционные последовательности значений в порядке полей моделей строк из ROW_SECTIONS,
+    counts - результаты методов из COUNT_METHODS.
+    """
+
+    def __init__(
+        self, sections: Optional[Dict[str, List[Sequence[Any]]]] = None, counts: Optional[Dict[str, int]] = None
+    ) -> None:
+        self._sections: Dict[str, List[Sequence[Any]]] = {section: [] for section in ROW_SECTIONS}
+        self._sections.update(sections or {})
+        self._counts = counts
+
+    def _load(self) -> None:
+        pass
+
+    def _get_count(self, method_name: str) -> CountRow:
+        self._load()
+        return CountRow(count=self._counts[method_name])
+
+    def _iter_rows(self, section: str) -> Iterator[Any]:
+        self._load()
+        row_class, _ = ROW_SECTIONS[section]
+        return map(row_class._make, self._sections[section])
+
+    def get_procedures_count(self) -> CountRow:
+        return self._get_count("get_procedures_count")
+
+    def get_procedures_description_count(self) -> CountRow:
+        return self._get_count("get_procedures_description_count")
+
+    def get_tables_count(self) -> CountRow:
+        return self._get_count("get_tables_count")
+
+    def get_tables_description_count(self) -> CountRow:
+        return self._get_count("get_tables_description_count")
+
+    def get_procedures(self) -> Iterator[ProcedureRow]:
+        return self._iter_rows("procedures")
+
+    def get_procedure_parameters(self) -> Iterator[ProcedureParameterRow]:
+        return self._iter_rows("procedure_parameters")
+
+    def get_procedure_dependencies(self) -> Iterator[ProcedureDependencyRow]:
+        return self._iter_rows("procedure_dependencies")
+
+    def get_tables(self) -> Iterator[TableRow]:
+        return self._iter_rows("tables")
+
+    def get_fields(self) -> Iterator[FieldRow]:
+        """
+        Поля группами по таблицам, как у FirebirdGateway. Снимки прежних версий упорядочены только по позиции поля,
+        устойчивая сортировка по имени таблицы сохраняет порядок полей внутри таблицы
+        """
+        self._load()
+        return map(FieldRow._make, sorted(self._sections["fields"], key=itemgetter(0)))
+
+    def iter_fields(self) -> Iterator[FieldRow]:
+        return self.get_fields()
+
+    def get_index_segments(self) -> Iterator[IndexSegmentRow]:
+        return self._iter_rows("index_segments")
+
+    def get_metadata_fingerprint(self) -> str:
+        """
+        Хеш всех строк каталога: в памяти он дешев, а шлюз может меняться между опросами режима наблюдения
+        """
+        self._load()
+        digest = hashlib.blake2b(repr(self._counts).encode("utf-8"), digest_size=16)
+        for section in ROW_SECTIONS:
+            for row in self._sections[section]:
+                digest.update(repr(tuple(row)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def invalidate_cache(self, method_name: Optional[str] = None) -> int:  # pylint: disable=unused-argument
+        """
+        Строки отдаются из памяти без кеша выборок, сбрасывать нечего
+        """
+        return 0
+
+
+class SnapshotGateway(InMemoryGateway):
+    """
+    Шлюз, читающий данные из снимка. Снимок загружается при первом обращении
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self._path = path
+
+    def get_metadata_fingerprint(self) -> str:
+        """
+        Снимок перечитывается только при изменении файла, поэтому отпечаток - время изменения и размер файла
+        """
+        stat = os.stat(self._path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def invalidate_cache(self, method_name: Optional[str] = None) -> int:  # pylint: disable=unused-argument
+        """
+        Сброс загруженного снимка: при следующем обращении он будет прочитан из файла заново
+        """
+        self._sections = {section: [] for section in ROW_SECTIONS}
+        self._counts = None
+        return len(ROW_SECTIONS)
+
+    def _load(self) -> None:
+        if self._counts is not None:
+            return
+
+        with gzip.open(self._path, "rt", encoding="utf-8") as source:
+            header = json.loads(source.readline())
+            _check_header(header)
+            for line in source:
+                section, chunk = json.loads(line)
+                if section == "procedures":
+                    # Исходники выгружаются в хранилище сразу по мере чтения порций снимка
+                    chunk = [[name, description, spill(text)] for name, description, text in chunk]
+                self._sections[section].extend(chunk)
+
+        self._counts = header["counts"]
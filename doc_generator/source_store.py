@@ -0,0 +1,117 @@
+import hashlib
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Dict, NamedTuple, Optional, Union
+
+
+def get_source_digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SourceBlob(NamedTuple):
+    """
+    Ссылка на исходный код процедуры, выгруженный в файл хранилища (SourceStore): вместо текста в моделях
+    и кеше выборок хранятся путь, смещение и длина в байтах. Ссылка передается в процессы рендеринга
+    и читается там же. digest - хеш текста, по нему сравниваются исходники без чтения файла
+    """
+
+    path: str
+    offset: int
+    length: int
+    digest: str
+
+    def read(self) -> str:
+        return _read(self.path, self.offset, self.length).decode("utf-8")
+
+
+SourceText = Union[str, SourceBlob, None]
+
+# Открытые на чтение файлы хранилищ в текущем процессе
+_readers: Dict[str, BinaryIO] = {}
+_readers_lock = threading.Lock()
+
+
+def _read(path: str, offset: int, length: int) -> bytes:
+    """
+    Позиционное чтение, а не mmap: прочитанные страницы остаются в кеше ОС и не увеличивают RSS процесса.
+    pread не сдвигает позицию файла, общую с процессами, унаследовавшими его при fork
+    """
+    with _readers_lock:
+        reader = _readers.get(path)
+        if reader is None:
+            reader = _readers[path] = open(path, "rb")  # pylint: disable=consider-using-with
+    if hasattr(os, "pread"):
+        return os.pread(reader.fileno(), length, offset)
+    with _readers_lock:
+        reader.seek(offset)
+        return reader.read(length)
+
+
+def _close_reader(path: str) -> None:
+    with _readers_lock:
+        reader = _readers.pop(path, None)
+    if reader is not None:
+        reader.close()
+
+
+class SourceStore:
+    """
+    Файл, в который исходный код процедур выгружается при выборке: в памяти остаются только ссылки (SourceBlob),
+    и пиковая память не зависит от общего объема исходников. Текст нужен ненадолго - для анализа, поискового
+    индекса и сравнения схем - и перечитывается из файла по ссылке.
+
+    Файл только дописывается и удаляется при закрытии хранилища
+    """
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        descriptor, self.path = tempfile.mkstemp(prefix="doc-generator-source-", suffix=".bin", dir=directory)
+        # Запись без буфера: записанный текст сразу доступен для чтения по ссылке, в том числе другим процессам
+        self._file = os.fdopen(descriptor, "wb", buffering=0)
+        self._lock = threading.Lock()
+        self.size = 0
+
+    def put(self, text: str) -> SourceBlob:
+        data = text.encode("utf-8")
+        with self._lock:
+            offset = self.size
+            self._file.write(data)
+            self.size += len(data)
+        return SourceBlob(path=self.path, offset=offset, length=len(data), digest=get_source_digest(text))
+
+    def close(self) -> None:
+        _close_reader(self.path)
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self) -> "SourceStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+# Хранилище, в которое выгружаются исходники при выборке. None - исходники хранятся в памяти
+store: Optional[SourceStore] = None  # pylint: disable=invalid-name
+
+
+def spill(text: Optional[str]) -> SourceText:
+    """
+    Выгрузка текста в текущее хранилище. Пустые тексты не выгружаются
+    """
+    if store is None or not text:
+        return text
+    return store.put(text)
+
+
+def read_text(source: SourceText) -> Optional[str]:
+    if isinstance(source, SourceBlob):
+        return source.read()
+    return source
+
+
+def get_digest(source: SourceText) -> str:
+    if isinstance(source, SourceBlob):
+        return source.digest
+    return get_source_digest(source or "")
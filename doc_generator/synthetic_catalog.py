@@ -0,0 +1,153 @@
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Any
+
+from doc_generator.models import ObjectTypes, ParameterTypes
+from doc_generator.snapshot import InMemoryGateway
+
+
+# Фрагменты тела процедуры, из которых собирается синтетический исходный код
+SOURCE_STATEMENTS: Tuple[str, ...] = (
+    "  select first 1 t.ID, t.NAME from {table} as t where t.ID = :ID into :RESULT_ID, :RESULT_NAME;\n",
+    "  for select t.ID, t.AMOUNT from {table} as t where t.PARENT_ID = :PARENT_ID\n"
+    "    into :ITEM_ID, :AMOUNT do\n  begin\n    TOTAL = TOTAL + coalesce(AMOUNT, 0);\n    suspend;\n  end\n",
+    "  update {table} set CHANGED_AT = current_timestamp where ID = :ID;\n",
+    "  -- пересчет итогов по документу\n  insert into {table} (ID, NAME) values (gen_id(G_{table}, 1), 'New row');\n",
+    "  if (ITEM_ID is null) then\n    exception E_NOT_FOUND 'Item not found';\n",
+    "  /* значение по умолчанию */\n  resultValue = coalesce(:VALUE, 'Default');\n",
+)
+
+UDF_STATEMENT = "  RESULT_ID = z(maxnum(:ITEM_ID, 0));\n"
+
+FIELD_TYPES: Tuple[Tuple[int, int], ...] = ((8, 4), (10, 4), (14, 1), (27, 8), (37, 255))
+
+
+@dataclass
+class SyntheticCatalogConfig:  # pylint: disable=too-many-instance-attributes
+    """
+    Параметры синтетического каталога.
+
+    Процедуры раскладываются по depth слоям, каждая вызывает fan_out процедур следующего слоя, поэтому
+    глубина графа вызовов без циклов не превышает depth. Доля cycle_ratio процедур дополнительно вызывает
+    одну из процедур, из которых она сама вызывается (прямо или через несколько слоев), образуя циклы.
+    """
+
+    procedures: int
+    fan_out: int = 3
+    depth: int = 8
+    cycle_ratio: float = 0.02
+    tables: Optional[int] = None
+    fields_per_table: int = 40
+    tables_per_procedure: int = 3
+    parameters_per_procedure: int = 6
+    source_length: int = 1500
+    udf_ratio: float = 0.1
+    description_ratio: float = 0.5
+    seed: int = 0
+
+    @property
+    def table_count(self) -> int:
+        return self.tables if self.tables is not None else max(1, self.procedures // 5)
+
+
+def _get_layer_bounds(config: SyntheticCatalogConfig) -> List[Tuple[int, int]]:
+    layers = max(1, min(config.depth, config.procedures))
+    return [
+        (layer * config.procedures // layers, (layer + 1) * config.procedures // layers) for layer in range(layers)
+    ]
+
+
+def _get_source(rnd: random.Random, name: str, tables: List[str], config: SyntheticCatalogConfig) -> str:
+    parts = [f"create or alter procedure {name}\nas\nbegin\n"]
+    length = len(parts[0])
+    if rnd.random() < config.udf_ratio:
+        parts.append(UDF_STATEMENT)
+    while length < config.source_length:
+        statement = rnd.choice(SOURCE_STATEMENTS).format(table=rnd.choice(tables))
+        parts.append(statement)
+        length += len(statement)
+    parts.append("end\n")
+    return "".join(parts)
+
+
+def _add_procedures(
+    rnd: random.Random, config: SyntheticCatalogConfig, table_names: List[str], sections: Dict[str, List[Any]]
+) -> None:
+    for index in range(config.procedures):
+        name = f"P_{index:06d}"
+        description = f"Процедура {index}" if rnd.random() < config.description_ratio else None
+        used_tables = rnd.sample(table_names, min(config.tables_per_procedure, len(table_names)))
+        sections["procedures"].append((name, description, _get_source(rnd, name, used_tables, config)))
+
+        for table_name in used_tables:
+            sections["procedure_dependencies"].append((name, table_name, None, ObjectTypes.TABLE.value))
+
+        for parameter_index in range(config.parameters_per_procedure):
+            parameter_type = ParameterTypes.INPUT.value if parameter_index % 2 else ParameterTypes.OUTPUT.value
+            parameter_name = f"PARAM_{parameter_index}"
+            dependency_field = parameter_name if parameter_type == ParameterTypes.OUTPUT.value else None
+            sections["procedure_parameters"].append((name, dependency_field, parameter_name, parameter_type))
+
+
+def _get_ancestor(rnd: random.Random, callers: Dict[int, List[int]], index: int, max_steps: int) -> int:
+    ancestor = index
+    for _ in range(rnd.randint(1, max(1, max_steps))):
+        if not callers.get(ancestor):
+            break
+        ancestor = rnd.choice(callers[ancestor])
+    return ancestor
+
+
+def _add_calls(rnd: random.Random, config: SyntheticCatalogConfig, sections: Dict[str, List[Any]]) -> None:
+    bounds = _get_layer_bounds(config)
+    callers: Dict[int, List[int]] = {}
+    for layer, (begin, end) in enumerate(bounds):
+        for index in range(begin, end):
+            called = set()
+            if layer + 1 < len(bounds):
+                next_begin, next_end = bounds[layer + 1]
+                called.update(rnd.randrange(next_begin, next_end) for _ in range(config.fan_out))
+            if rnd.random() < config.cycle_ratio:
+                called.add(_get_ancestor(rnd, callers, index, layer))
+            called.discard(index)
+
+            for called_index in sorted(called):
+                callers.setdefault(called_index, []).append(index)
+                sections["procedure_dependencies"].append(
+                    (f"P_{index:06d}", f"P_{called_index:06d}", None, ObjectTypes.PROCEDURE.value)
+                )
+            if rnd.random() < config.udf_ratio:
+                sections["procedure_dependencies"].append((f"P_{index:06d}", "Z", None, ObjectTypes.UDF.value))
+
+
+def generate_catalog(config: SyntheticCatalogConfig) -> InMemoryGateway:
+    """
+    Синтетический каталог с детерминированным (по seed) содержимым, отдаваемый через шлюз в памяти
+    """
+    rnd = random.Random(config.seed)
+    sections: Dict[str, List[Any]] = {
+        "procedures": [],
+        "procedure_parameters": [],
+        "procedure_dependencies": [],
+        "tables": [],
+        "fields": [],
+    }
+
+    table_names = [f"T_{index:05d}" for index in range(config.table_count)]
+    for table_name in table_names:
+        description = f"Таблица {table_name}" if rnd.random() < config.description_ratio else None
+        sections["tables"].append((table_name, description))
+        for field_index in range(config.fields_per_table):
+            field_type, field_length = rnd.choice(FIELD_TYPES)
+            sections["fields"].append((table_name, f"FIELD_{field_index}", field_type, field_length, None))
+
+    _add_procedures(rnd, config, table_names, sections)
+    _add_calls(rnd, config, sections)
+
+    counts = {
+        "get_procedures_count": len(sections["procedures"]),
+        "get_procedures_description_count": sum(1 for row in sections["procedures"] if row[1] is not None),
+        "get_tables_count": len(sections["tables"]),
+        "get_tables_description_count": sum(1 for row in sections["tables"] if row[1] is not None),
+    }
+    return InMemoryGateway(sections=sections, counts=counts)
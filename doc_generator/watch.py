@@ -0,0 +1,66 @@
+import logging
+import time
+from typing import Any, Callable, Optional
+
+from doc_generator import my_logging
+
+
+logger = my_logging.Logger()  # pylint: disable=invalid-name
+
+DEFAULT_WATCH_INTERVAL = 10.0
+
+
+class MetadataWatcher:
+    """
+    Режим наблюдения: периодический опрос дешевого отпечатка метаданных и перегенерация документации
+    только при его изменении.
+
+    Соединение шлюза, скомпилированные шаблоны и кеш разбора исходников живут между перегенерациями.
+    Отпечаток снимается до выборки каталога: изменение, закоммиченное во время генерации,
+    даст другой отпечаток при следующем опросе, и документация будет перегенерирована еще раз
+    """
+
+    def __init__(
+        self,
+        gateway: Any,
+        regenerate: Callable[[], None],
+        interval: float = DEFAULT_WATCH_INTERVAL,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._gateway = gateway
+        self._regenerate = regenerate
+        self._interval = interval
+        self._sleep = sleep
+        self._fingerprint: Any = None
+        self.regenerations = 0
+
+    def poll(self) -> bool:
+        """
+        Один опрос. Первый опрос генерирует документацию всегда. Возвращает True, если была перегенерация
+        """
+        fingerprint = self._gateway.get_metadata_fingerprint()
+        if self.regenerations and fingerprint == self._fingerprint:
+            return False
+
+        logger.log("metadata changed, regenerate..." if self.regenerations else "generate...")
+        self._gateway.invalidate_cache()
+        self._regenerate()
+        # Отпечаток запоминается только после успешной генерации: при ошибке она повторится на следующем опросе
+        self._fingerprint = fingerprint
+        self.regenerations += 1
+        return True
+
+    def run(self, max_polls: Optional[int] = None) -> None:
+        """
+        Опрос с интервалом до прерывания (или max_polls опросов). Ошибки опроса и генерации
+        (например, разрыв соединения) пишутся в лог и не останавливают наблюдение
+        """
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            if polls:
+                self._sleep(self._interval)
+            try:
+                self.poll()
+            except Exception as error:  # pylint: disable=broad-except
+                logger.log(f"watch: {error!r}", level=logging.ERROR)
+            polls += 1
@@ -0,0 +1,116 @@
+import argparse
+import sys
+
+from doc_generator import my_logging
+from doc_generator.synthetic_catalog import SyntheticCatalogConfig
+from doc_generator.benchmark import (
+    DEFAULT_SIZES,
+    run_benchmark,
+    benchmark_startup,
+    format_startup,
+    benchmark_fetch,
+    format_fetch,
+    benchmark_scan,
+    format_scan,
+    find_regressions,
+    load_report,
+    save_report,
+    format_report,
+)
+
+
+logger = my_logging.Logger()  # pylint: disable=invalid-name
+
+
+def get_argument_parser() -> argparse.ArgumentParser:
+    argument_parser = argparse.ArgumentParser(description="Нагрузочное тестирование генератора на синтетической схеме")
+    argument_parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        help=(
+            f"Количество процедур в схемах (по умолчанию {' '.join(map(str, DEFAULT_SIZES))}). "
+            "С --startup, --fetch или --scan схемы прогоняются, только если размеры заданы"
+        ),
+    )
+    argument_parser.add_argument('--fan-out', type=int, default=3, help="Количество вызовов из процедуры")
+    argument_parser.add_argument('--depth', type=int, default=8, help="Глубина графа вызовов")
+    argument_parser.add_argument('--cycle-ratio', type=float, default=0.02, help="Доля процедур с обратным вызовом")
+    argument_parser.add_argument('--fields-per-table', type=int, default=40)
+    argument_parser.add_argument('--source-length', type=int, default=1500, help="Объем кода процедуры")
+    argument_parser.add_argument('--seed', type=int, default=0)
+    argument_parser.add_argument('--repeat', type=int, default=1, help="Количество замеров времени")
+    argument_parser.add_argument(
+        '--no-memory', action='store_true', help="Не измерять пиковую память (прогон под tracemalloc долгий)"
+    )
+    argument_parser.add_argument(
+        '--startup', action='store_true', help="Измерить время до первой страницы с кешем шаблонов и без него"
+    )
+    argument_parser.add_argument(
+        '--fetch', action='store_true', help="Измерить скорость выборки строк каталога и память на строку"
+    )
+    argument_parser.add_argument('--fetch-rows', type=int, default=300000, help="Количество строк выборки")
+    argument_parser.add_argument(
+        '--scan', action='store_true', help="Измерить скорость лексического анализа исходного кода процедуры"
+    )
+    argument_parser.add_argument('--scan-length', type=int, default=4000000, help="Объем анализируемого кода")
+    argument_parser.add_argument('-o', '--output', type=str, help="Сохранить результаты в JSON-файл")
+    argument_parser.add_argument('--baseline', type=str, help="JSON-файл с результатами для сравнения")
+    argument_parser.add_argument('--time-threshold', type=float, default=1.5)
+    argument_parser.add_argument('--memory-threshold', type=float, default=1.5)
+    return argument_parser
+
+
+def main() -> None:
+    args = get_argument_parser().parse_args()
+    my_logging.configure()
+
+    config = SyntheticCatalogConfig(
+        procedures=0,
+        fan_out=args.fan_out,
+        depth=args.depth,
+        cycle_ratio=args.cycle_ratio,
+        fields_per_table=args.fields_per_table,
+        source_length=args.source_length,
+        seed=args.seed,
+    )
+    # --startup, --fetch и --scan - самостоятельные замеры: этапы генерации на синтетических схемах
+    # прогоняются вместе с ними, только если размеры схем заданы явно
+    if args.sizes is not None:
+        sizes = args.sizes
+    else:
+        sizes = [] if args.startup or args.fetch or args.scan else list(DEFAULT_SIZES)
+    report = run_benchmark(config, sizes=sizes, repeat=args.repeat, trace_memory=not args.no_memory)
+    if report["results"]:
+        logger.log(format_report(report))
+    if args.startup:
+        report["startup"] = benchmark_startup(repeat=max(args.repeat, 3))
+        logger.log(format_startup(report["startup"]))
+    if args.fetch:
+        fetch = benchmark_fetch(rows_count=args.fetch_rows, repeat=max(args.repeat, 3))
+        report["fetch"] = {
+            method: {mode: result._asdict() for mode, result in modes.items()} for method, modes in fetch.items()
+        }
+        logger.log(format_fetch(fetch))
+    if args.scan:
+        report["scan"] = benchmark_scan(source_length=args.scan_length, repeat=max(args.repeat, 3))
+        logger.log(format_scan(report["scan"]))
+
+    if args.output:
+        save_report(report, args.output)
+
+    if args.baseline:
+        regressions = find_regressions(
+            report,
+            load_report(args.baseline),
+            time_threshold=args.time_threshold,
+            memory_threshold=args.memory_threshold,
+        )
+        for regression in regressions:
+            logger.log(f"регрессия: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
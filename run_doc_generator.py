@@ -1,68 +1,497 @@
-import jinja2
 import argparse
+import contextlib
+import functools
+import itertools
+import sys
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from doc_generator.my_logging import Logger
-from doc_generator.fb_gateway import FirebirdGateway
+from doc_generator import my_logging, generate_doc, source_store
+from doc_generator.instrumentation import instrumentation
+from doc_generator.psql_analyzer import source_analyzer
+from doc_generator.fb_gateway import FirebirdGateway, DEFAULT_ARRAY_SIZE
+from doc_generator.snapshot import SnapshotGateway, export_snapshot
+from doc_generator.source_store import SourceStore
+from doc_generator.parallel_render import render_jobs_parallel
+from doc_generator.incremental import IncrementalManifest, get_templates_version
+from doc_generator.search_index import SearchIndexBuilder, write_search_shards
+from doc_generator.models import DatabaseSummary, RuntimeCost
+from doc_generator.schema_diff import diff_schemas, write_changes, get_changes_job
+from doc_generator.output import ArchiveSink, get_sink, DEFAULT_COMPRESSION_LEVEL
+from doc_generator.watch import MetadataWatcher, DEFAULT_WATCH_INTERVAL
+from doc_generator.monitoring import (
+    add_runtime_costs,
+    aggregate_costs,
+    export_captures,
+    iter_live_captures,
+    load_captures,
+    DEFAULT_CAPTURE_INTERVAL,
+)
+from doc_generator.batch import (
+    BatchDatabase,
+    BatchGeneration,
+    extract_catalog,
+    get_batch_databases,
+    get_database_gateway,
+    load_batch_config,
+    DEFAULT_BATCH_CONCURRENCY,
+)
 from doc_generator.generate_doc import (
-    ProcedureDataFactory,
-    TablesDataFactory,
-    render_to_file,
+    RenderJob,
+    TablesStream,
+    get_render_jobs,
+    render_jobs,
+    write_data_files,
+    TEMPLATE_DIR,
 )
 
 
-logger = Logger()  # pylint: disable=invalid-name
+logger = my_logging.Logger()  # pylint: disable=invalid-name
 
-if __name__ == "__main__":
-    # pylint: disable=invalid-name, redefined-outer-name
 
-    argument_parser = argparse.ArgumentParser(
-        description="Генератор HTML-документации для схемы данных из FDB-файла"
-    )
-    argument_parser.add_argument('-dsn', '--data_source_name', required=True, type=str)
+def get_argument_parser() -> argparse.ArgumentParser:
+    argument_parser = argparse.ArgumentParser(description="Генератор HTML-документации для схемы данных из FDB-файла")
+    argument_parser.add_argument('-dsn', '--data_source_name', type=str)
     argument_parser.add_argument('-u', '--user', type=str, default='sysdba')
     argument_parser.add_argument('-p', '--password', type=str, default='masterkey')
     argument_parser.add_argument('-c', '--charset', type=str, default='UTF8')
+    argument_parser.add_argument(
+        '--array-size', type=int, default=DEFAULT_ARRAY_SIZE, help="Количество строк, выбираемых за один fetch"
+    )
+    argument_parser.add_argument(
+        '--connections',
+        type=int,
+        default=1,
+        help="Количество соединений для параллельного выполнения выборок каталога",
+    )
+    argument_parser.add_argument(
+        '--snapshot', type=str, help="Генерировать документацию из снимка схемы вместо подключения к БД"
+    )
+    argument_parser.add_argument(
+        '--export-snapshot', type=str, help="Выгрузить снимок схемы в указанный файл и завершить работу"
+    )
+    argument_parser.add_argument(
+        '--incremental', action='store_true', help="Перегенерировать только страницы изменившихся объектов"
+    )
+    argument_parser.add_argument(
+        '-j', '--jobs', type=int, default=1, help="Количество процессов для рендеринга страниц"
+    )
+    argument_parser.add_argument(
+        '--gzip',
+        type=int,
+        nargs='?',
+        const=DEFAULT_COMPRESSION_LEVEL,
+        metavar='LEVEL',
+        help="Писать рядом с файлами сжатые .gz-копии с указанным уровнем сжатия",
+    )
+    argument_parser.add_argument(
+        '--brotli',
+        type=int,
+        nargs='?',
+        const=DEFAULT_COMPRESSION_LEVEL,
+        metavar='LEVEL',
+        help="Писать рядом с файлами сжатые .br-копии (нужен пакет brotli)",
+    )
+    argument_parser.add_argument(
+        '--archive', type=str, help="Записать весь сайт в один архив (.zip, .tar, .tar.gz, .tar.xz) вместо каталога"
+    )
+    argument_parser.add_argument(
+        '--compression-level', type=int, default=DEFAULT_COMPRESSION_LEVEL, help="Уровень сжатия архива"
+    )
+    argument_parser.add_argument(
+        '--template-cache',
+        type=str,
+        help="Каталог кеша скомпилированных шаблонов (пустая строка отключает кеш)",
+    )
+    argument_parser.add_argument(
+        '--watch',
+        action='store_true',
+        help="Не завершаться: опрашивать метаданные и перегенерировать документацию при их изменении",
+    )
+    argument_parser.add_argument(
+        '--watch-interval',
+        type=float,
+        default=DEFAULT_WATCH_INTERVAL,
+        help="Интервал опроса метаданных в режиме наблюдения, секунд",
+    )
+    argument_parser.add_argument(
+        '--diff-snapshot',
+        type=str,
+        help="Снимок прежней версии схемы: изменения относительно него выводятся на страницу changes.html",
+    )
+    argument_parser.add_argument(
+        '--diff-dsn', type=str, help="БД с прежней версией схемы для страницы изменений changes.html"
+    )
+    argument_parser.add_argument(
+        '--batch',
+        type=str,
+        nargs='+',
+        metavar='DSN',
+        help="Документация нескольких БД за один запуск, каждая - в подкаталог с общим оглавлением",
+    )
+    argument_parser.add_argument(
+        '--batch-config',
+        type=str,
+        help="JSON-файл со списком БД пакетного режима ({\"databases\": [{\"dsn\": ..., \"name\": ...}]})",
+    )
+    argument_parser.add_argument(
+        '--batch-concurrency',
+        type=int,
+        default=DEFAULT_BATCH_CONCURRENCY,
+        help="Количество БД, выбираемых одновременно в пакетном режиме",
+    )
+    argument_parser.add_argument(
+        '--source-in-memory',
+        action='store_true',
+        help="Держать исходный код процедур в памяти, а не выгружать его во временный файл",
+    )
+    argument_parser.add_argument(
+        '--stream-tables',
+        action='store_true',
+        help="Собирать таблицы из потока полей по одной при рендеринге, не держа поля всех таблиц в памяти",
+    )
+    argument_parser.add_argument(
+        '--monitoring',
+        type=str,
+        nargs='+',
+        metavar='FILE',
+        help="Файлы снимков мониторинга (MON$): стоимость процедур выводится в документации",
+    )
+    argument_parser.add_argument(
+        '--monitoring-captures',
+        type=int,
+        default=0,
+        metavar='N',
+        help="Снять N снимков мониторинга через подключение к БД перед генерацией",
+    )
+    argument_parser.add_argument(
+        '--monitoring-interval',
+        type=float,
+        default=DEFAULT_CAPTURE_INTERVAL,
+        help="Интервал между снимками мониторинга, секунд",
+    )
+    argument_parser.add_argument(
+        '--export-monitoring',
+        type=str,
+        help="Записать снимки мониторинга (--monitoring-captures) в файл и завершить работу",
+    )
+    argument_parser.add_argument('--report', type=str, help="Сохранить JSON-отчет о времени и памяти по этапам")
+    argument_parser.add_argument('--summary', action='store_true', help="Вывести сводку по этапам в конце работы")
+    argument_parser.add_argument(
+        '--trace-memory', action='store_true', help="Отслеживать выделения памяти через tracemalloc (медленно)"
+    )
+    argument_parser.add_argument('-v', '--verbose', action='store_true', help="Подробный лог")
+    return argument_parser
 
-    args = argument_parser.parse_args()
 
-    env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader("template"), trim_blocks=True, lstrip_blocks=True
-    )
-    gateway = FirebirdGateway(
-        dsn=args.data_source_name,
+def get_gateway(args: argparse.Namespace, snapshot: Optional[str] = None, dsn: Optional[str] = None):
+    if snapshot or (args.snapshot and not dsn):
+        return SnapshotGateway(path=snapshot or args.snapshot)
+
+    return FirebirdGateway(
+        dsn=dsn or args.data_source_name,
         user=args.user,
         password=args.password,
         charset=args.charset,
+        array_size=args.array_size,
     )
-    procedures_summary, procedures = ProcedureDataFactory(gateway=gateway).get_data()
 
-    tables_data_factory = TablesDataFactory(gateway=gateway)
-    tables_summary = tables_data_factory.get_tables_summary()
-    tables = tables_data_factory.get_tables()
+
+def get_base_gateway(args: argparse.Namespace):
+    """
+    Шлюз прежней версии схемы для страницы изменений
+    """
+    if not args.diff_snapshot and not args.diff_dsn:
+        return None
+    return get_gateway(args, snapshot=args.diff_snapshot, dsn=args.diff_dsn)
+
+
+def get_diff_labels(args: argparse.Namespace) -> Tuple[str, str]:
+    return args.diff_snapshot or args.diff_dsn, args.snapshot or args.data_source_name
+
+
+def render(
+    jobs: Iterable[RenderJob], processes: int, gzip_level: Optional[int] = None, brotli_level: Optional[int] = None
+) -> None:
+    with instrumentation.span("render"):
+        if processes > 1 and isinstance(generate_doc.sink, ArchiveSink):
+            logger.log("archive output is written by a single process, --jobs ignored")
+            processes = 1
+        if processes > 1:
+            # Страницы пишутся в рабочих процессах, их счетчики до родителя не доходят
+            instrumentation.count(
+                "pages",
+                render_jobs_parallel(
+                    jobs,
+                    processes=processes,
+                    output_dir=generate_doc.sink.output_dir,
+                    gzip_level=gzip_level,
+                    brotli_level=brotli_level,
+                ),
+            )
+        else:
+            render_jobs(jobs)
+
+
+def generate(  # pylint: disable=too-many-arguments
+    gateway,
+    incremental: bool = False,
+    processes: int = 1,
+    connections: int = 1,
+    gzip_level: Optional[int] = None,
+    brotli_level: Optional[int] = None,
+    base_gateway=None,
+    diff_labels: Tuple[str, str] = ("old", "new"),
+    stream_tables: bool = False,
+    costs: Optional[Dict[str, RuntimeCost]] = None,
+) -> None:
+    """
+    Генерация документации одной БД. Таблицы проходят через рендеринг один раз (TablesStream): поисковый индекс
+    и tables-data.js пишутся после рендеринга. С stream_tables таблицы собираются из потока полей по одной
+    и не хранятся после рендеринга своей страницы; сравнение схем в этом режиме недоступно.
+    costs - собственная стоимость процедур по данным мониторинга
+    """
+    procedures_summary, procedures, tables_summary, tables = extract_catalog(gateway, connections, stream_tables)
+    if costs is not None:
+        add_runtime_costs(procedures, costs, procedures_summary)
+
+    search_index = SearchIndexBuilder()
+    search_index.add_procedures(procedures.values())
+    tables_stream = TablesStream(tables, on_table=search_index.add_table)
 
     logger.log("generate html...")
+    # Страницы пишутся раньше файлов данных, которые раньше создавали каталог вывода
+    generate_doc.sink.make_directory("")
+    jobs = get_render_jobs(procedures_summary, procedures, tables_summary, tables_stream)
+    if base_gateway is not None:
+        logger.log("generate schema diff...")
+        _, base_procedures, _, base_tables = extract_catalog(base_gateway, connections)
+        schema_diff = diff_schemas(base_procedures, base_tables, procedures, tables, *diff_labels)
+        write_changes(schema_diff)
+        jobs = itertools.chain(jobs, [get_changes_job(schema_diff)])
+    if not incremental:
+        render(jobs, processes, gzip_level, brotli_level)
+    else:
+        manifest = IncrementalManifest(
+            output_dir=generate_doc.sink.output_dir, templates_version=get_templates_version(TEMPLATE_DIR)
+        )
+        render(manifest.select(jobs), processes, gzip_level, brotli_level)
+        with instrumentation.span("manifest"):
+            stale_files = manifest.remove_stale()
+            manifest.save()
+        logger.log(f"removed {len(stale_files)} stale pages")
+
+    logger.log("generate search index...")
+    with instrumentation.span("search_index"):
+        write_search_shards(search_index)
+    write_data_files(procedures, tables_stream.rows)
 
-    render_to_file(template="index.html", output_file="index.html")
-    render_to_file(
-        template="procedures.html",
-        output_file="procedures.html",
-        procedures=procedures,
-        procedures_summary=procedures_summary,
-    )
-    render_to_file(
-        template="tables.html",
-        output_file="tables.html",
-        tables=tables,
-        tables_summary=tables_summary,
-    )
-    for procedure_name, procedure in procedures.items():
-        render_to_file(
-            template="procedure.html",
-            output_file=f"procedure-{procedure_name}.html",
-            procedure=procedure,
+
+def get_databases(args: argparse.Namespace) -> List[BatchDatabase]:
+    defaults = {"user": args.user, "password": args.password, "charset": args.charset}
+    databases = get_batch_databases(args.batch or [], **defaults)
+    if args.batch_config:
+        databases += load_batch_config(args.batch_config, **defaults)
+    return databases
+
+
+def generate_database(
+    gateway, args: argparse.Namespace, base_gateway=None, costs: Optional[Dict[str, RuntimeCost]] = None
+) -> None:
+    generate(
+        gateway,
+        incremental=args.incremental,
+        processes=args.jobs,
+        connections=args.connections,
+        gzip_level=args.gzip,
+        brotli_level=args.brotli,
+        base_gateway=base_gateway,
+        diff_labels=get_diff_labels(args),
+        stream_tables=args.stream_tables,
+        costs=costs,
+    )
+    if isinstance(gateway, FirebirdGateway):
+        instrumentation.set_section("row_cache", gateway.cache.get_stats())
+
+
+def get_monitoring_gateway(args: argparse.Namespace, gateway) -> FirebirdGateway:
+    """
+    Шлюз, через который снимается мониторинг. С --snapshot основной шлюз читает снимок,
+    поэтому снимки мониторинга берутся через отдельное подключение к --data_source_name
+    """
+    if isinstance(gateway, FirebirdGateway):
+        return gateway
+    return get_gateway(args, dsn=args.data_source_name)
+
+
+def get_monitoring_captures(args: argparse.Namespace, gateway) -> Iterable[Any]:
+    """
+    Снимки мониторинга: сначала из файлов, затем снятые через подключение
+    """
+    captures: Iterable[Any] = itertools.chain.from_iterable(load_captures(path) for path in args.monitoring or [])
+    if args.monitoring_captures:
+        live_captures = iter_live_captures(
+            get_monitoring_gateway(args, gateway), args.monitoring_captures, args.monitoring_interval
+        )
+        captures = itertools.chain(captures, live_captures)
+    return captures
+
+
+def get_costs(args: argparse.Namespace, gateway) -> Optional[Dict[str, RuntimeCost]]:
+    if not args.monitoring and not args.monitoring_captures:
+        return None
+    logger.log("aggregate monitoring captures...")
+    return aggregate_costs(get_monitoring_captures(args, gateway))
+
+
+def generate_batch(databases: List[BatchDatabase], args: argparse.Namespace) -> List[DatabaseSummary]:
+    batch_generation = BatchGeneration(
+        databases,
+        get_gateway=functools.partial(get_database_gateway, array_size=args.array_size),
+        concurrency=args.batch_concurrency,
+        connections=args.connections,
+        incremental=args.incremental,
+    )
+    return batch_generation.run(
+        functools.partial(render, processes=args.jobs, gzip_level=args.gzip, brotli_level=args.brotli)
+    )
+
+
+def run(args: argparse.Namespace, generation: Callable[[], Any]) -> Any:
+    """
+    Одна генерация документации с отчетом о ней
+    """
+    instrumentation.reset()
+    generate_doc.sink = get_sink(
+        archive=args.archive,
+        gzip_level=args.gzip,
+        brotli_level=args.brotli,
+        compression_level=args.compression_level,
+    )
+    with open_source_store(args) as store, generate_doc.sink:
+        result = generation()
+
+    instrumentation.set_section("source_analyzer", {"hits": source_analyzer.hits, "misses": source_analyzer.misses})
+    if store is not None:
+        instrumentation.set_section("source_store", {"bytes": store.size})
+    report = instrumentation.get_report()
+    if args.report:
+        instrumentation.save_report(args.report, report)
+    if args.summary:
+        logger.log(f"run summary:\n{instrumentation.format_summary(report)}")
+    return result
+
+
+def validate_arguments(argument_parser: argparse.ArgumentParser, args: argparse.Namespace, batch: bool) -> None:
+    if not batch and not args.snapshot and not args.data_source_name:
+        argument_parser.error("Необходимо указать --data_source_name, --snapshot, --batch или --batch-config")
+    diff = args.diff_snapshot or args.diff_dsn
+    if batch and (args.data_source_name or args.snapshot or args.export_snapshot or args.watch or diff):
+        argument_parser.error(
+            "--batch несовместим с --data_source_name, --snapshot, --export-snapshot, --watch и --diff-*"
         )
+    if args.stream_tables and (batch or diff):
+        argument_parser.error("--stream-tables несовместим с --batch и --diff-*")
+    if args.stream_tables and args.connections > 1:
+        # Поля читаются при рендеринге, уже вне общей snapshot-транзакции пула соединений
+        argument_parser.error("--stream-tables несовместим с --connections больше 1")
+    if args.diff_snapshot and args.diff_dsn:
+        argument_parser.error("Укажите только одну прежнюю версию схемы: --diff-snapshot или --diff-dsn")
+    if args.archive and (args.incremental or args.gzip is not None or args.brotli is not None):
+        argument_parser.error("--archive несовместим с --incremental, --gzip и --brotli")
+    validate_monitoring_arguments(argument_parser, args, batch)
 
-    for table in tables:
-        render_to_file(
-            template="table.html", output_file=f"table-{table.name}.html", table=table
+
+def validate_monitoring_arguments(
+    argument_parser: argparse.ArgumentParser, args: argparse.Namespace, batch: bool
+) -> None:
+    if batch and (args.monitoring or args.monitoring_captures):
+        argument_parser.error("Данные мониторинга не поддерживаются в пакетном режиме")
+    if args.monitoring_captures and not args.data_source_name:
+        argument_parser.error("--monitoring-captures требует подключения к БД (--data_source_name)")
+    if args.export_monitoring and not args.monitoring_captures:
+        argument_parser.error("--export-monitoring требует --monitoring-captures")
+
+
+@contextlib.contextmanager
+def open_source_store(args: argparse.Namespace) -> Iterator[Optional[SourceStore]]:
+    """
+    Хранилище, в которое выгружается исходный код процедур на время одной генерации (см. source_store).
+    Файл хранилища удаляется после генерации, поэтому в режиме наблюдения он не растет от перегенерации
+    к перегенерации
+    """
+    if args.source_in_memory or args.export_snapshot:
+        yield None
+        return
+    with SourceStore() as store:
+        source_store.store = store
+        try:
+            yield store
+        finally:
+            source_store.store = None
+
+
+def dispatch(args: argparse.Namespace, batch: bool) -> None:
+    if batch:
+        summaries = run(args, functools.partial(generate_batch, get_databases(args), args))
+        if any(summary.error for summary in summaries):
+            sys.exit(1)
+        return
+
+    gateway = get_gateway(args)
+
+    if args.export_snapshot:
+        logger.log(f"export snapshot to {args.export_snapshot}...")
+        export_snapshot(gateway, args.export_snapshot)
+        return
+
+    if args.export_monitoring:
+        logger.log(f"export monitoring captures to {args.export_monitoring}...")
+        captures = iter_live_captures(
+            get_monitoring_gateway(args, gateway), args.monitoring_captures, args.monitoring_interval
         )
+        logger.log(f"exported {export_captures(captures, args.export_monitoring)} rows")
+        return
+
+    # Стоимость процедур собирается один раз, в режиме наблюдения - для всех перегенераций
+    costs = get_costs(args, gateway)
+    base_gateway = get_base_gateway(args)
+    generation = functools.partial(generate_database, gateway, args, base_gateway, costs)
+    if not args.watch:
+        run(args, generation)
+        return
+
+    def regenerate() -> None:
+        # Выбранные строки прежней схемы ссылаются на исходники в хранилище предыдущей генерации
+        if base_gateway is not None:
+            base_gateway.invalidate_cache()
+        run(args, generation)
+
+    # Между перегенерациями пишутся только изменившиеся страницы
+    args.incremental = not args.archive
+    watcher = MetadataWatcher(gateway, regenerate, interval=args.watch_interval)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.log(f"watch stopped after {watcher.regenerations} generations")
+
+
+def main() -> None:
+    argument_parser = get_argument_parser()
+    args = argument_parser.parse_args()
+    my_logging.configure(verbose=args.verbose)
+
+    batch = bool(args.batch or args.batch_config)
+    validate_arguments(argument_parser, args, batch)
+
+    if args.template_cache is not None:
+        generate_doc.configure_template_cache(args.template_cache)
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    dispatch(args, batch)
+
+
+if __name__ == "__main__":
+    main()
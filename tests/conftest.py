@@ -0,0 +1,12 @@
+from doc_generator.models import Procedure, ProcedureSource
+
+
+def get_procedure(name, text="", description=None):
+    """
+    Процедура для тестов: без параметров и зависимостей, с исходным кодом text
+    """
+    return Procedure(
+        name=name,
+        description=description,
+        source=ProcedureSource(text=text, length=len(text), lower_percent=0, upper_percent=0),
+    )
@@ -7,9 +7,11 @@ from doc_generator.fb_row_models import (
     CountRow,
     ProcedureParameterRow,
     ProcedureDependencyRow,
+    TableRow,
+    FieldRow,
 )
-from doc_generator.models import Procedure, DependentProcedure
-from doc_generator.generate_doc import ProcedureDataFactory
+from doc_generator.models import Procedure
+from doc_generator.generate_doc import ProcedureDataFactory, TablesDataFactory
 
 
 @pytest.fixture()
@@ -24,7 +26,6 @@ def procedures_summary():
     all_data_factory._get_procedures = MagicMock()
     all_data_factory._add_procedures_parameters = MagicMock()
     all_data_factory._add_procedures_dependencies = MagicMock()
-    all_data_factory._add_dependency_trees = MagicMock()
 
     _procedures_summary, _ = all_data_factory.get_data()
 
@@ -51,7 +52,6 @@ def procedures():
     all_data_factory._get_procedures_summary = MagicMock()
     all_data_factory._add_procedures_parameters = MagicMock()
     all_data_factory._add_procedures_dependencies = MagicMock()
-    all_data_factory._add_dependency_trees = MagicMock()
 
     _, _procedures = all_data_factory.get_data()
 
@@ -188,37 +188,34 @@ def test_add_procedures_dependencies(procedures_with_dependencies):
     ) == sorted(["PROCEDURE1", "PROCEDURE2"])
 
 
-@pytest.fixture()
-def procedures_with_dependency_tree(procedures_with_dependencies):
-    gateway = FirebirdGateway("", "", "", "")
-
-    all_data_factory = ProcedureDataFactory(gateway=gateway)
-    all_data_factory._add_dependency_trees(procedures_with_dependencies)
-
-    return procedures_with_dependencies
-
-
-def test_add_dependency_tree(procedures_with_dependency_tree):
-    reference_first_tree = [
-        DependentProcedure(name="PROCEDURE5"),
-        DependentProcedure(name="PROCEDURE6"),
+def test_reverse_dependencies(procedures):
+    fixture_dependencies = [
+        ProcedureDependencyRow(procedure_name="PROCEDURE1", name="TABLE1", field="", type=0),
+        ProcedureDependencyRow(procedure_name="PROCEDURE1", name="TABLE1", field="FIELD1", type=0),
+        ProcedureDependencyRow(procedure_name="PROCEDURE2", name="TABLE1", field="FIELD1", type=0),
+        ProcedureDependencyRow(procedure_name="PROCEDURE2", name="PROCEDURE1", field="", type=5),
+        ProcedureDependencyRow(procedure_name="PROCEDURE2", name="UDF1", field="", type=15),
     ]
+    gateway = FirebirdGateway("", "", "", "")
+    gateway.get_procedure_dependencies = MagicMock(side_effect=lambda: fixture_dependencies)
+    gateway.get_fields = MagicMock(
+        return_value=[
+            FieldRow(table_name="TABLE1", name="FIELD1", type=8, length=4, description=None),
+            FieldRow(table_name="TABLE1", name="FIELD2", type=8, length=4, description=None),
+        ]
+    )
+    gateway.get_tables = MagicMock(return_value=[TableRow(name="TABLE1", description=None)])
+    gateway.get_index_segments = MagicMock(return_value=[])
 
-    first_procedure = procedures_with_dependency_tree["PROCEDURE1"]
-
-    assert first_procedure.dependency_tree == reference_first_tree
-
-    reference_second_tree = [
-        DependentProcedure(name="PROCEDURE2", is_cycled=True),
-        DependentProcedure(
-            name="PROCEDURE1",
-            dependency_tree=[
-                DependentProcedure(name="PROCEDURE5"),
-                DependentProcedure(name="PROCEDURE6"),
-            ],
-        ),
-    ]
+    procedure_data_factory = ProcedureDataFactory(gateway=gateway)
+    procedure_data_factory._add_procedures_dependencies(procedures)
+    reverse = procedure_data_factory.reverse_dependencies
 
-    second_procedure = procedures_with_dependency_tree["PROCEDURE2"]
+    assert [dependency.name for dependency in procedures["PROCEDURE2"].dependencies.table] == []
+    assert procedures["PROCEDURE1"].used_by == ["PROCEDURE2"]
+    assert procedures["PROCEDURE2"].used_by == []
+    assert reverse.get_used_by(reverse.udf, "UDF1") == ["PROCEDURE2"]
 
-    assert second_procedure.dependency_tree == reference_second_tree
+    table = TablesDataFactory(gateway=gateway).get_tables(reverse)[0]
+    assert table.used_by == ["PROCEDURE1", "PROCEDURE2"]
+    assert [field.used_by for field in table.fields] == [["PROCEDURE1", "PROCEDURE2"], []]
@@ -0,0 +1,81 @@
+import json
+
+from doc_generator import generate_doc
+from doc_generator.batch import (
+    BatchGeneration,
+    BatchDatabase,
+    get_batch_databases,
+    get_database_name,
+    load_batch_config,
+)
+from doc_generator.generate_doc import render_jobs
+from doc_generator.output import DirectorySink
+from doc_generator.incremental import MANIFEST_FILE
+from doc_generator.snapshot import InMemoryGateway
+
+
+COUNTS = {
+    "get_procedures_count": 1,
+    "get_procedures_description_count": 0,
+    "get_tables_count": 1,
+    "get_tables_description_count": 0,
+}
+
+
+def get_gateway(database):
+    if database.name == "broken":
+        raise ConnectionError("unavailable")
+    return InMemoryGateway(
+        sections={
+            "procedures": [[f"{database.name.upper()}_PROCEDURE", None, "begin end"]],
+            "tables": [["TABLE1", None]],
+            "fields": [["TABLE1", "ID", 8, 4, None]],
+        },
+        counts=COUNTS,
+    )
+
+
+def test_get_database_name():
+    assert get_database_name("localhost:/var/db/sales.fdb") == "sales"
+    assert get_database_name("C:\\db\\Stock Base.FDB") == "Stock_Base"
+    assert [database.name for database in get_batch_databases(["a/main.fdb", "b/main.fdb"])] == ["main", "main-2"]
+
+
+def test_load_batch_config(tmp_path):
+    path = tmp_path / "batch.json"
+    path.write_text(json.dumps({"databases": [{"dsn": "host:/db/one.fdb", "user": "reader"}, {"snapshot": "two.gz"}]}))
+
+    databases = load_batch_config(str(path), password="secret")
+
+    assert databases == [
+        BatchDatabase(name="one", dsn="host:/db/one.fdb", user="reader", password="secret"),
+        BatchDatabase(name="two", snapshot="two.gz", password="secret"),
+    ]
+
+
+def test_batch_generation(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_doc, "sink", DirectorySink(str(tmp_path)))
+    databases = [BatchDatabase(name=name) for name in ("first", "broken", "second")]
+
+    summaries = BatchGeneration(databases, get_gateway=get_gateway, concurrency=2).run(render_jobs)
+
+    assert [summary.name for summary in summaries] == ["first", "broken", "second"]
+    assert summaries[1].error == "unavailable"
+    assert summaries[2].procedures_summary.total_count == 1
+    for name in ("first", "second"):
+        assert (tmp_path / name / f"procedure-{name.upper()}_PROCEDURE.html").exists()
+        assert (tmp_path / name / "procedures-data.js").exists()
+        assert (tmp_path / name / "search" / "meta.js").exists()
+    assert not (tmp_path / "broken").exists()
+    assert 'href="second/index.html"' in (tmp_path / "index.html").read_text(encoding="utf-8")
+
+
+def test_batch_generation_incremental(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_doc, "sink", DirectorySink(str(tmp_path)))
+    databases = [BatchDatabase(name=name) for name in ("first", "second")]
+
+    BatchGeneration(databases, get_gateway=get_gateway, incremental=True).run(render_jobs)
+
+    for name in ("first", "second"):
+        assert (tmp_path / name / MANIFEST_FILE).exists()
+    assert not (tmp_path / MANIFEST_FILE).exists()
@@ -0,0 +1,112 @@
+import json
+import sys
+from unittest.mock import MagicMock
+
+import run_benchmark
+from doc_generator import benchmark
+from doc_generator.benchmark import (
+    benchmark_catalog,
+    benchmark_fetch,
+    benchmark_scan,
+    benchmark_startup,
+    find_regressions,
+    FETCH_CASES,
+    FETCH_MODES,
+    STAGES,
+    STARTUP_MODES,
+)
+from doc_generator.call_graph import get_strongly_connected_components
+from doc_generator.generate_doc import ProcedureDataFactory, TablesDataFactory
+from doc_generator.synthetic_catalog import SyntheticCatalogConfig, generate_catalog
+
+
+def get_report(seconds, peak_memory):
+    return {"results": {"100": {"procedures": {"seconds": seconds, "peak_memory": peak_memory}}}}
+
+
+def test_synthetic_catalog():
+    config = SyntheticCatalogConfig(procedures=200, depth=4, fan_out=2, cycle_ratio=0.2, tables=5, fields_per_table=7)
+    gateway = generate_catalog(config)
+
+    procedures_summary, procedures = ProcedureDataFactory(gateway=gateway).get_data()
+    tables = TablesDataFactory(gateway=gateway).get_tables()
+
+    assert procedures_summary.total_count == len(procedures) == 200
+    assert len(tables) == 5
+    assert all(len(table.fields) == 7 for table in tables)
+    assert all(procedure.source.length >= config.source_length for procedure in procedures.values())
+
+    graph = {
+        name: [dependency.name for dependency in procedure.dependencies.procedure]
+        for name, procedure in procedures.items()
+    }
+    assert any(len(component) > 1 for component in get_strongly_connected_components(graph))
+
+
+def test_synthetic_catalog_deterministic():
+    config = SyntheticCatalogConfig(procedures=50)
+
+    assert list(generate_catalog(config).get_procedure_dependencies()) == list(
+        generate_catalog(config).get_procedure_dependencies()
+    )
+
+
+def test_benchmark_catalog():
+    results = benchmark_catalog(SyntheticCatalogConfig(procedures=20, source_length=100))
+
+    assert set(results) == set(STAGES)
+    assert all(result.seconds > 0 and result.peak_memory > 0 for result in results.values())
+
+
+def test_find_regressions():
+    baseline = get_report(1.0, 1000)
+
+    assert not find_regressions(get_report(1.2, 1200), baseline)
+    assert len(find_regressions(get_report(2.0, 1200), baseline)) == 1
+    assert len(find_regressions(get_report(2.0, 2000), baseline)) == 2
+    assert not find_regressions(get_report(0.1, 1000), get_report(0.01, 1000))
+
+
+def test_benchmark_startup():
+    startup = benchmark_startup(repeat=1)
+
+    assert set(startup) == set(STARTUP_MODES)
+    assert all(seconds > 0 for seconds in startup.values())
+
+
+def test_benchmark_fetch():
+    results = benchmark_fetch(rows_count=2000, repeat=1, array_size=100)
+
+    assert set(results) == {case.method for case in FETCH_CASES}
+    for modes in results.values():
+        assert set(modes) == set(FETCH_MODES)
+        assert all(result.rows_per_second > 0 and result.bytes_per_row > 0 for result in modes.values())
+        # Позиционные NamedTuple-строки с интернированными именами компактнее датаклассов из itermap
+        assert modes["fetchmany"].bytes_per_row < modes["itermap"].bytes_per_row
+
+
+def test_benchmark_scan():
+    scan = benchmark_scan(source_length=20000, repeat=1)
+
+    assert scan["chars"] >= 20000
+    assert scan["chars_per_second"] > 0
+
+
+def test_standalone_scan(tmp_path, monkeypatch):
+    benchmark_catalog_mock = MagicMock(side_effect=benchmark_catalog)
+    monkeypatch.setattr(benchmark, "benchmark_catalog", benchmark_catalog_mock)
+    output = tmp_path / "benchmark.json"
+
+    monkeypatch.setattr(sys, "argv", ["run_benchmark.py", "--scan", "--scan-length", "1000", "-o", str(output)])
+    run_benchmark.main()
+
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert report["results"] == {} and report["scan"]
+    benchmark_catalog_mock.assert_not_called()
+
+    # С явными размерами схемы прогоняются вместе с замером
+    argv = ["run_benchmark.py", "--scan", "--scan-length", "1000", "--sizes", "20", "--no-memory", "-o", str(output)]
+    monkeypatch.setattr(sys, "argv", argv)
+    run_benchmark.main()
+
+    assert list(json.loads(output.read_text(encoding="utf-8"))["results"]) == ["20"]
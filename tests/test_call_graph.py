@@ -0,0 +1,56 @@
+from doc_generator.call_graph import get_strongly_connected_components, get_component_map, get_call_graph_metrics
+from doc_generator.models import CallGraphMetrics
+
+
+def test_strongly_connected_components():
+    graph = {
+        "A": ["B"],
+        "B": ["C", "D"],
+        "C": ["A"],
+        "D": ["E"],
+        "E": ["E"],
+        "F": [],
+    }
+
+    components = get_strongly_connected_components(graph)
+
+    assert sorted(sorted(component) for component in components) == [["A", "B", "C"], ["D"], ["E"], ["F"]]
+
+    component_map = get_component_map(components)
+    # Обратный топологический порядок: достижимые компоненты идут раньше
+    assert component_map["E"] < component_map["D"] < component_map["A"]
+
+
+def test_strongly_connected_components_deep_chain():
+    graph = {f"P{number}": [f"P{number + 1}"] for number in range(10000)}
+    graph["P10000"] = ["P0"]
+
+    assert len(get_strongly_connected_components(graph)) == 1
+
+
+def test_call_graph_metrics():
+    graph = {
+        "A": ["B", "D"],
+        "B": ["C"],
+        "C": ["B", "D"],
+        "D": ["E"],
+        "E": ["E"],
+        "F": ["D", "E"],
+    }
+
+    metrics = get_call_graph_metrics(graph)
+
+    assert metrics["A"] == CallGraphMetrics(closure_size=4, depth=3, fan_in=0, fan_out=2, cycle_size=0)
+    assert metrics["B"] == CallGraphMetrics(closure_size=3, depth=2, fan_in=2, fan_out=1, cycle_size=2)
+    assert metrics["D"] == CallGraphMetrics(closure_size=1, depth=1, fan_in=3, fan_out=1, cycle_size=0)
+    assert metrics["E"] == CallGraphMetrics(closure_size=0, depth=0, fan_in=3, fan_out=1, cycle_size=1)
+    assert metrics["F"].closure_size == 2
+
+
+def test_call_graph_metrics_deep_chain():
+    graph = {f"P{number}": [f"P{number + 1}"] for number in range(10000)}
+
+    metrics = get_call_graph_metrics(graph)
+
+    assert metrics["P0"].closure_size == 10000
+    assert metrics["P0"].depth == 10000
@@ -0,0 +1,161 @@
+import threading
+import time
+
+import pytest
+
+from doc_generator.batch import extract_catalog
+from doc_generator.concurrent_extraction import ConcurrentExtraction, get_read_only_tpb, SNAPSHOT_NUMBER_QUERY
+from doc_generator.fb_gateway import FirebirdGateway
+from doc_generator.generate_doc import ProcedureDataFactory, TablesDataFactory
+
+
+class FakeDriver:
+    """
+    Заглушка драйвера: выборки выполняются с задержкой, отслеживается число одновременно выполняемых запросов
+    """
+
+    def __init__(self, supports_snapshot_number=True):
+        self.supports_snapshot_number = supports_snapshot_number
+        self.connections = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.fields_released = threading.Event()
+        self.fields_released.set()
+
+    def connect(self):
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+    @staticmethod
+    def get_rows(query):
+        if "count(*)" in query:
+            return [(2,)]
+        if "RDB$PROCEDURE_SOURCE" in query:
+            return [("PROCEDURE1  ", None, "SELECT 1"), ("PROCEDURE2  ", "description", "begin end")]
+        if "RDB$PARAMETER_TYPE" in query:
+            return [("PROCEDURE1  ", "PARAMETER1  ", 0, None)]
+        if "RDB$DEPENDED_ON_TYPE" in query:
+            return [("PROCEDURE2  ", "PROCEDURE1  ", None, 5)]
+        if "rf.rdb$field_name" in query:
+            return [("TABLE1  ", "ID  ", None, 8, 4)]
+        if "rdb$index_segments" in query:
+            return [("TABLE1  ", "PK_TABLE1  ", "ID  ", 0, 1, 0, 0.5, "PRIMARY KEY  ")]
+        return [("TABLE1  ", None)]
+
+
+class FakeConnection:
+    def __init__(self, driver):
+        self.driver = driver
+        self.tpb = None
+        self.closed = False
+
+    def begin(self, tpb=None):
+        self.tpb = tpb
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, query):
+        driver = self.connection.driver
+        if query == SNAPSHOT_NUMBER_QUERY:
+            if not driver.supports_snapshot_number:
+                raise TypeError("unsupported")
+            self.rows = [(42,)]
+            return self
+
+        with driver.lock:
+            driver.active += 1
+            driver.max_active = max(driver.max_active, driver.active)
+        if "rf.rdb$field_name" in query:
+            driver.fields_released.wait(timeout=5)
+        time.sleep(0.02)
+        with driver.lock:
+            driver.active -= 1
+
+        self.rows = driver.get_rows(query)
+        return self
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+@pytest.fixture()
+def driver():
+    return FakeDriver()
+
+
+@pytest.fixture()
+def gateway(driver):
+    fake_gateway = FirebirdGateway("", "", "")
+    fake_gateway.connect = driver.connect
+    return fake_gateway
+
+
+def test_concurrent_extraction(gateway, driver):
+    with ConcurrentExtraction(gateway, pool_size=3):
+        procedures_summary, procedures = ProcedureDataFactory(gateway=gateway).get_data()
+        tables = TablesDataFactory(gateway=gateway).get_tables()
+
+    assert driver.max_active > 1
+    assert len(driver.connections) == 3
+    assert all(connection.closed for connection in driver.connections)
+    assert driver.connections[0].tpb == get_read_only_tpb()
+    assert all(connection.tpb == get_read_only_tpb(42) for connection in driver.connections[1:])
+
+    assert procedures_summary.total_count == 2
+    assert [dependency.name for dependency in procedures["PROCEDURE2"].dependencies.procedure] == ["PROCEDURE1"]
+    assert tables[0].fields[0].name == "ID"
+    assert tables[0].fields[0].indexes == ["PK_TABLE1"]
+    assert not gateway.pending_results
+
+
+def test_results_available_as_queries_finish(gateway, driver):
+    driver.fields_released.clear()
+
+    with ConcurrentExtraction(gateway, pool_size=2) as extraction:
+        _, procedures = ProcedureDataFactory(gateway=gateway).get_data()
+
+        assert set(procedures) == {"PROCEDURE1", "PROCEDURE2"}
+        assert not extraction.futures["get_fields"].done()
+
+        driver.fields_released.set()
+        assert TablesDataFactory(gateway=gateway).get_tables()[0].name == "TABLE1"
+
+
+def test_single_connection_without_snapshot_number(gateway, driver):
+    driver.supports_snapshot_number = False
+
+    with ConcurrentExtraction(gateway, pool_size=3):
+        _, procedures = ProcedureDataFactory(gateway=gateway).get_data()
+
+    assert len(driver.connections) == 1
+    assert driver.max_active == 1
+    assert len(procedures) == 2
+
+
+def test_stream_tables_extracted_in_one_transaction(gateway, driver):
+    _, procedures, _, tables = extract_catalog(gateway, connections=3, stream_tables=True)
+
+    # Пул не открывается: поток полей и остальной каталог читаются одним соединением
+    assert [table.name for table in tables] == ["TABLE1"]
+    assert len(procedures) == 2
+    assert len(driver.connections) == 1
+    assert driver.max_active == 1
@@ -0,0 +1,74 @@
+import pytest
+from unittest.mock import MagicMock
+
+from doc_generator.fb_gateway import FirebirdGateway
+from doc_generator.fb_row_models import ProcedureDependencyRow, FieldRow, CountRow
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self._rows = rows
+        self._position = 0
+        self.fetchmany_sizes = []
+
+    def execute(self, query):  # pylint: disable=unused-argument
+        self._position = 0
+        return self
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def fetchmany(self, size):
+        self.fetchmany_sizes.append(size)
+        rows = self._rows[self._position:self._position + size]
+        self._position += size
+        return rows
+
+
+def get_gateway(rows, array_size=2):
+    gateway = FirebirdGateway("", "", "", array_size=array_size)
+    cursor = FakeCursor(rows)
+    gateway._get_cursor = MagicMock(return_value=cursor)
+    return gateway, cursor
+
+
+def test_fetch_in_batches():
+    rows = [
+        ("PROCEDURE1    ", "TABLE1    ", None, 0),
+        ("PROCEDURE1    ", "PROCEDURE2    ", None, 5),
+        ("PROCEDURE2    ", "UDF1    ", None, 15),
+    ]
+    gateway, cursor = get_gateway(rows)
+
+    dependencies = gateway.get_procedure_dependencies()
+
+    assert dependencies == (
+        ProcedureDependencyRow(procedure_name="PROCEDURE1", name="TABLE1", field=None, type=0),
+        ProcedureDependencyRow(procedure_name="PROCEDURE1", name="PROCEDURE2", field=None, type=5),
+        ProcedureDependencyRow(procedure_name="PROCEDURE2", name="UDF1", field=None, type=15),
+    )
+    assert cursor.fetchmany_sizes == [2, 2, 2]
+    assert dependencies[0].procedure_name is dependencies[1].procedure_name
+    assert dependencies[1].name is dependencies[2].procedure_name
+
+
+def test_field_rows_positional_mapping():
+    gateway, _ = get_gateway([("TABLE1   ", "ID   ", "Идентификатор", 8, 4)])
+
+    assert gateway.get_fields() == (
+        FieldRow(table_name="TABLE1", name="ID", type=8, length=4, description="Идентификатор"),
+    )
+
+
+def test_count():
+    gateway, _ = get_gateway([(42,)])
+
+    assert gateway.get_procedures_count() == CountRow(count=42)
+
+
+def test_rows_are_immutable():
+    row = FieldRow(table_name="TABLE1", name="ID", type=8, length=4, description=None)
+
+    with pytest.raises(AttributeError):
+        row.name = "NAME"
+    assert not hasattr(row, "__dict__")
@@ -0,0 +1,71 @@
+import pytest
+
+from doc_generator.generate_doc import RenderJob
+from doc_generator.incremental import IncrementalManifest, get_model_digest
+from doc_generator.models import Dependency
+from tests.conftest import get_procedure
+
+
+def get_jobs(procedures):
+    return [
+        RenderJob(
+            template="procedure.html", output_file=f"procedure-{procedure.name}.html", context={"procedure": procedure}
+        )
+        for procedure in procedures
+    ]
+
+
+def test_model_digest_references_procedures_by_name():
+    procedure = get_procedure("PROCEDURE1")
+    dependency = get_procedure("PROCEDURE2")
+    procedure.dependencies.procedure.append(dependency)
+    digest = get_model_digest({"procedure": procedure})
+
+    dependency.description = "changed"
+    assert get_model_digest({"procedure": procedure}) == digest
+
+    procedure.dependencies.table.append(Dependency(name="TABLE1"))
+    assert get_model_digest({"procedure": procedure}) != digest
+
+
+@pytest.fixture()
+def rendered(tmp_path):
+    procedures = [get_procedure("PROCEDURE1"), get_procedure("PROCEDURE2")]
+    manifest = IncrementalManifest(output_dir=str(tmp_path), templates_version="v1")
+    for job in manifest.select(get_jobs(procedures)):
+        (tmp_path / job.output_file).write_text("")
+    manifest.save()
+    return procedures
+
+
+def test_select_changed(tmp_path, rendered):
+    rendered[0].description = "changed"
+
+    manifest = IncrementalManifest(output_dir=str(tmp_path), templates_version="v1")
+    selected = [job.output_file for job in manifest.select(get_jobs(rendered))]
+
+    assert selected == ["procedure-PROCEDURE1.html"]
+
+
+def test_select_missing_file(tmp_path, rendered):
+    (tmp_path / "procedure-PROCEDURE2.html").unlink()
+
+    manifest = IncrementalManifest(output_dir=str(tmp_path), templates_version="v1")
+    selected = [job.output_file for job in manifest.select(get_jobs(rendered))]
+
+    assert selected == ["procedure-PROCEDURE2.html"]
+
+
+def test_select_templates_changed(tmp_path, rendered):
+    manifest = IncrementalManifest(output_dir=str(tmp_path), templates_version="v2")
+
+    assert len(list(manifest.select(get_jobs(rendered)))) == 2
+
+
+def test_remove_stale(tmp_path, rendered):
+    manifest = IncrementalManifest(output_dir=str(tmp_path), templates_version="v1")
+    list(manifest.select(get_jobs(rendered[:1])))
+
+    assert manifest.remove_stale() == {"procedure-PROCEDURE2.html"}
+    assert not (tmp_path / "procedure-PROCEDURE2.html").exists()
+    assert (tmp_path / "procedure-PROCEDURE1.html").exists()
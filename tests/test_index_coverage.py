@@ -0,0 +1,88 @@
+import gzip
+import json
+
+from doc_generator.generate_doc import TablesDataFactory, get_render_jobs
+from doc_generator.index_coverage import get_indexes, get_leading_indexes
+from doc_generator.models import Index, ProceduresSummary, ReverseDependencies, TablesSummary, UnindexedColumn
+from doc_generator.snapshot import InMemoryGateway, SnapshotGateway, export_snapshot
+
+
+COUNTS = {
+    "get_procedures_count": 0,
+    "get_procedures_description_count": 0,
+    "get_tables_count": 1,
+    "get_tables_description_count": 0,
+}
+
+
+def get_reverse_dependencies():
+    reverse = ReverseDependencies()
+    for procedure_name in ("P1", "P2", "P3"):
+        for field_name in ("ID", "CUSTOMER_ID", "CREATED_AT"):
+            reverse.add(reverse.column, ("ORDERS", field_name), procedure_name)
+    reverse.add(reverse.column, ("ORDERS", "STATUS"), "P1")
+    return reverse
+
+
+def get_gateway():
+    return InMemoryGateway(
+        sections={
+            "tables": [["ORDERS", None]],
+            "fields": [["ORDERS", name, 8, 4, None] for name in ("ID", "CUSTOMER_ID", "CREATED_AT", "STATUS")],
+            "index_segments": [
+                ["ORDERS", "PK_ORDERS", "ID", 0, True, False, 0.0001, "PRIMARY KEY"],
+                ["ORDERS", "IDX_STATUS_CREATED", "STATUS", 0, False, False, 0.25, None],
+                ["ORDERS", "IDX_STATUS_CREATED", "CREATED_AT", 1, False, False, 0.25, None],
+                ["ORDERS", "IDX_CUSTOMER", "CUSTOMER_ID", 0, False, True, None, None],
+                ["ORDERS", "IDX_EXPRESSION", None, None, False, False, 0.5, None],
+            ],
+        },
+        counts=COUNTS,
+    )
+
+
+def test_get_indexes():
+    indexes = get_indexes(get_gateway().get_index_segments())["ORDERS"]
+
+    assert indexes[0] == Index(
+        name="PK_ORDERS", fields=["ID"], unique=True, selectivity=0.0001, constraint="PRIMARY KEY"
+    )
+    assert indexes[1].fields == ["STATUS", "CREATED_AT"]
+    assert indexes[3].fields == []
+    # Неактивный индекс и второй сегмент составного индекса поиск по полю не ускоряют
+    assert get_leading_indexes(indexes) == {"ID": ["PK_ORDERS"], "STATUS": ["IDX_STATUS_CREATED"]}
+
+
+def test_unindexed_columns():
+    table = TablesDataFactory(gateway=get_gateway()).get_tables(get_reverse_dependencies())[0]
+
+    assert {field.name: field.unindexed for field in table.fields} == {
+        "ID": False,
+        "CUSTOMER_ID": True,
+        "CREATED_AT": True,
+        # Индекс есть, а редко используемые поля не отмечаются в любом случае
+        "STATUS": False,
+    }
+
+    jobs = list(get_render_jobs(ProceduresSummary(0, 0), {}, TablesSummary(1, 0), [table]))
+
+    assert jobs[-1].context["columns"] == [
+        UnindexedColumn(table_name="ORDERS", field_name="CREATED_AT", procedures_count=3),
+        UnindexedColumn(table_name="ORDERS", field_name="CUSTOMER_ID", procedures_count=3),
+    ]
+
+
+def test_snapshot_without_index_segments(tmp_path):
+    path = str(tmp_path / "schema.snapshot")
+    export_snapshot(get_gateway(), path)
+
+    # Снимок, выгруженный до появления секции индексов
+    with gzip.open(path, "rt", encoding="utf-8") as source:
+        header, *chunks = (json.loads(line) for line in source)
+    del header["sections"]["index_segments"]
+    with gzip.open(path, "wt", encoding="utf-8") as out:
+        for line in [header] + [chunk for chunk in chunks if chunk[0] != "index_segments"]:
+            out.write(json.dumps(line) + "\n")
+
+    assert list(SnapshotGateway(path).get_index_segments()) == []
+    assert TablesDataFactory(gateway=SnapshotGateway(path)).get_tables()[0].indexes == []
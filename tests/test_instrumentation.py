@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from doc_generator.instrumentation import Instrumentation, instrumentation
+from tests.test_fb_gateway import get_gateway
+
+
+@pytest.fixture()
+def global_instrumentation():
+    instrumentation.reset()
+    yield instrumentation
+    instrumentation.reset()
+
+
+def get_spans(report):
+    return {tuple(span["path"]): span for span in report["spans"]}
+
+
+def test_nested_spans():
+    tracker = Instrumentation()
+
+    with tracker.span("extract"):
+        for _ in range(2):
+            with tracker.span("fetch"):
+                tracker.count("rows", 10)
+        tracker.count("procedures")
+
+    spans = get_spans(tracker.get_report())
+
+    assert list(spans) == [("extract",), ("extract", "fetch")]
+    assert spans[("extract", "fetch")]["calls"] == 2
+    assert spans[("extract", "fetch")]["counters"] == {"rows": 20}
+    assert spans[("extract",)]["counters"] == {"procedures": 1}
+    assert spans[("extract",)]["seconds"] >= spans[("extract", "fetch")]["seconds"]
+
+
+def test_span_in_thread_is_root():
+    tracker = Instrumentation()
+
+    def fetch():
+        with tracker.span("fetch"):
+            tracker.count("rows")
+
+    with tracker.span("extract"):
+        worker = threading.Thread(target=fetch)
+        worker.start()
+        worker.join()
+
+    spans = get_spans(tracker.get_report())
+    assert set(spans) == {("extract",), ("fetch",)}
+    assert spans[("fetch",)]["counters"] == {"rows": 1}
+
+
+def test_sections_and_summary():
+    tracker = Instrumentation()
+    tracker.set_section("row_cache", {"hits": 1})
+    with tracker.span("render"):
+        tracker.count("pages", 3)
+
+    report = tracker.get_report()
+
+    assert report["row_cache"] == {"hits": 1}
+    assert "pages=3" in tracker.format_summary(report)
+
+
+def test_gateway_fetch_instrumented(global_instrumentation):
+    gateway, _ = get_gateway([("PROCEDURE1  ", "PROCEDURE2  ", None, 5)] * 3)
+
+    gateway.get_procedure_dependencies()
+    gateway.get_procedure_dependencies()
+
+    fetch_span = get_spans(global_instrumentation.get_report())[("fetch.get_procedure_dependencies",)]
+    assert fetch_span["calls"] == 1
+    assert fetch_span["counters"] == {"rows": 3, "bytes": 3 * (12 + 12 + 8 + 8)}
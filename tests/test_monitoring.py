@@ -0,0 +1,106 @@
+from unittest.mock import MagicMock
+
+import run_doc_generator
+from doc_generator import monitoring
+from doc_generator.fb_gateway import FirebirdGateway
+from doc_generator.fb_row_models import CallStatsRow
+from doc_generator.generate_doc import get_call_graph
+from doc_generator.models import ProceduresSummary, RuntimeCost
+from doc_generator.snapshot import SnapshotGateway
+from doc_generator.monitoring import (
+    CostAggregator,
+    add_runtime_costs,
+    aggregate_costs,
+    export_captures,
+    iter_live_captures,
+    load_captures,
+)
+from tests.conftest import get_procedure
+
+
+def get_captures():
+    return [
+        # P1 вызывает P2, оба выполняются
+        (0, [CallStatsRow(1, 10, None, "P1", 100, 1, 10, 5), CallStatsRow(1, 11, 10, "P2", 60, 2, 20, 7)]),
+        # P2 завершился, P1 еще выполняется и набрал статистику; новый вызов P2 в другом соединении
+        (1, [CallStatsRow(1, 10, None, "P1", 300, 3, 30, 9), CallStatsRow(2, 10, None, "P2", 40, 0, 4, 1)]),
+    ]
+
+
+def test_cost_aggregator():
+    aggregator = CostAggregator()
+    for _, rows in get_captures():
+        aggregator.add_capture(rows)
+
+    costs = aggregator.finish()
+
+    # Вызов учитывается один раз, по последнему снимку, в котором он был
+    assert costs["P1"] == RuntimeCost(calls=1, elapsed_ms=300, page_reads=3, page_fetches=30, record_reads=9)
+    assert costs["P2"] == RuntimeCost(calls=2, elapsed_ms=100, page_reads=2, page_fetches=24, record_reads=8)
+
+
+def test_own_elapsed_excludes_nested_calls():
+    costs = aggregate_costs(get_captures()[:1])
+
+    assert costs["P1"].elapsed_ms == 40
+    assert costs["P2"].elapsed_ms == 60
+
+
+def test_export_and_load_captures(tmp_path, monkeypatch):
+    monkeypatch.setattr(monitoring, "CHUNK_SIZE", 1)
+    path = str(tmp_path / "monitoring.gz")
+
+    assert export_captures(get_captures(), path) == 4
+
+    captures = [(number, list(rows)) for number, rows in load_captures(path)]
+    assert captures == get_captures()
+    assert aggregate_costs(load_captures(path)) == aggregate_costs(get_captures())
+
+
+def test_live_captures_end_transaction():
+    gateway = FirebirdGateway("", "", "", "")
+    cursor = MagicMock()
+    cursor.fetchmany.side_effect = [[(1, 10, None, "P1   ", 5, 0, 1, 2)], [], [], []]
+    gateway._cursor = cursor
+    sleeps = []
+
+    captures = [list(rows) for _, rows in iter_live_captures(gateway, 2, interval=0.5, sleep=sleeps.append)]
+
+    assert captures == [[CallStatsRow(1, 10, None, "P1", 5, 0, 1, 2)], []]
+    assert sleeps == [0.5]
+    assert cursor.transaction.commit.call_count == 2
+
+
+def test_costs_rolled_up_along_call_graph():
+    procedures = {name: get_procedure(name) for name in ("A", "B", "C", "D", "E", "F", "G")}
+    for caller, callees in {"A": "BC", "B": "D", "C": "D", "E": "F", "F": "E"}.items():
+        procedures[caller].dependencies.procedure.extend(procedures[callee] for callee in callees)
+    costs = {name: RuntimeCost(calls=1, elapsed_ms=elapsed) for name, elapsed in {"B": 1, "D": 10, "E": 100}.items()}
+    procedures_summary = ProceduresSummary(total_count=7, description_count=0)
+
+    add_runtime_costs(procedures, {**costs, "DROPPED": RuntimeCost(calls=1)}, procedures_summary)
+
+    # D достижима из A двумя путями, но учитывается один раз
+    assert procedures["A"].cost is None
+    assert procedures["A"].total_cost == RuntimeCost(calls=2, elapsed_ms=11)
+    assert procedures["C"].total_cost.elapsed_ms == 10
+    assert procedures["F"].total_cost == procedures["E"].total_cost == RuntimeCost(calls=1, elapsed_ms=100)
+    assert procedures["G"].total_cost is None
+    assert procedures_summary.cost_count == 3
+    assert get_call_graph(procedures)["costs"] == [11, 11, 10, 10, 100, 100, None]
+
+
+def test_monitoring_gateway_with_snapshot():
+    args = run_doc_generator.get_argument_parser().parse_args(
+        ["--snapshot", "schema.snapshot", "--data_source_name", "host:/db.fdb", "--monitoring-captures", "2"]
+    )
+    gateway = run_doc_generator.get_gateway(args)
+    assert isinstance(gateway, SnapshotGateway)
+
+    # Мониторинг снимается с подключенной БД, а не со снимка
+    monitoring_gateway = run_doc_generator.get_monitoring_gateway(args, gateway)
+    assert isinstance(monitoring_gateway, FirebirdGateway)
+    assert monitoring_gateway.cache_scope == "host:/db.fdb"
+
+    live_gateway = run_doc_generator.get_gateway(args, dsn="host:/db.fdb")
+    assert run_doc_generator.get_monitoring_gateway(args, live_gateway) is live_gateway
@@ -0,0 +1,81 @@
+import gzip
+import tarfile
+import zipfile
+
+import pytest
+
+from doc_generator.output import ArchiveSink, DirectorySink, Precompressor, get_sink, write_atomic, write_if_changed
+
+
+def test_write_atomic(tmp_path):
+    path = tmp_path / "page.html"
+
+    write_atomic(str(path), ["<html>", "страница", "</html>"])
+
+    assert path.read_text(encoding="utf-8") == "<html>страница</html>"
+    assert [item.name for item in tmp_path.iterdir()] == ["page.html"]
+
+
+def test_write_atomic_keeps_previous_file_on_error(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_text("previous")
+
+    def get_chunks():
+        yield "partial"
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        write_atomic(str(path), get_chunks())
+
+    assert path.read_text() == "previous"
+    assert [item.name for item in tmp_path.iterdir()] == ["page.html"]
+
+
+def test_write_if_changed(tmp_path):
+    path = tmp_path / "shard.json.gz"
+
+    assert write_if_changed(str(path), b"data")
+    assert not write_if_changed(str(path), b"data")
+    assert write_if_changed(str(path), b"changed")
+    assert path.read_bytes() == b"changed"
+
+
+def test_precompressed_siblings(tmp_path):
+    with DirectorySink(str(tmp_path), after_write=Precompressor(gzip_level=9)) as sink:
+        sink.write("page.html", ["<html>", "страница", "</html>"])
+        sink.write_if_changed("search/shard.json.gz", gzip.compress(b"{}"))
+
+    assert gzip.decompress((tmp_path / "page.html.gz").read_bytes()).decode("utf-8") == "<html>страница</html>"
+    assert not (tmp_path / "search" / "shard.json.gz.gz").exists()
+
+
+@pytest.mark.parametrize("file_name", ["site.zip", "site.tar.gz"])
+def test_archive_sink(tmp_path, file_name):
+    path = tmp_path / file_name
+
+    with get_sink(archive=str(path)) as sink:
+        assert sink.write("index.html", ["<html>", "</html>"]) == 13
+        sink.write_if_changed("search/meta.json.gz", b"data")
+
+    assert [item.name for item in tmp_path.iterdir()] == [file_name]
+    if file_name.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            assert archive.read("index.html") == b"<html></html>"
+            assert archive.read("search/meta.json.gz") == b"data"
+    else:
+        with tarfile.open(path) as archive:
+            assert archive.extractfile("index.html").read() == b"<html></html>"
+            assert archive.getnames() == ["index.html", "search/meta.json.gz"]
+
+
+def test_archive_sink_keeps_previous_archive_on_error(tmp_path):
+    path = tmp_path / "site.zip"
+    path.write_bytes(b"previous")
+
+    with pytest.raises(RuntimeError):
+        with ArchiveSink(str(path)) as sink:
+            sink.write("index.html", ["<html>"])
+            raise RuntimeError
+
+    assert path.read_bytes() == b"previous"
+    assert [item.name for item in tmp_path.iterdir()] == ["site.zip"]
@@ -0,0 +1,66 @@
+import multiprocessing
+import pickle
+
+import pytest
+
+from doc_generator import generate_doc
+from doc_generator.generate_doc import RenderJob, render_jobs
+from doc_generator.models import Dependency
+from doc_generator.output import DirectorySink
+from doc_generator.parallel_render import _map_job, _detach_procedure, render_jobs_parallel
+from tests.conftest import get_procedure
+
+
+@pytest.fixture()
+def procedures():
+    first_procedure = get_procedure("PROCEDURE1")
+    second_procedure = get_procedure("PROCEDURE2")
+    first_procedure.dependencies.procedure.append(second_procedure)
+    first_procedure.dependencies.table.append(Dependency(name="TABLE1"))
+    second_procedure.dependencies.procedure.append(first_procedure)
+    return {procedure.name: procedure for procedure in (first_procedure, second_procedure)}
+
+
+def test_detach_procedure(procedures):
+    job = RenderJob(template="procedure.html", output_file="procedure.html", context={"procedure": procedures})
+
+    detached_job = pickle.loads(pickle.dumps(_map_job(job, _detach_procedure)))
+
+    detached_procedure = detached_job.context["procedure"]["PROCEDURE1"]
+    assert detached_procedure.dependencies.procedure == [Dependency(name="PROCEDURE2")]
+    assert detached_procedure.dependencies.table == [Dependency(name="TABLE1")]
+    assert procedures["PROCEDURE1"].dependencies.procedure == [procedures["PROCEDURE2"]]
+
+
+# Каталог вывода передается процессам явно, поэтому результат не зависит от способа их запуска
+@pytest.mark.parametrize("start_method", multiprocessing.get_all_start_methods())
+def test_render_jobs_parallel_output(procedures, tmp_path, monkeypatch, start_method):
+    def get_jobs():
+        yield RenderJob(
+            template="procedures.html",
+            output_file="procedures.html",
+            context={"procedures": procedures, "procedures_summary": None},
+        )
+        for procedure in procedures.values():
+            yield RenderJob(
+                template="procedure.html",
+                output_file=f"procedure-{procedure.name}.html",
+                context={"procedure": procedure},
+            )
+
+    (tmp_path / "serial").mkdir()
+    (tmp_path / "parallel").mkdir()
+
+    monkeypatch.setattr(generate_doc, "sink", DirectorySink(str(tmp_path / "serial")))
+    render_jobs(get_jobs())
+    rendered_count = render_jobs_parallel(
+        get_jobs(),
+        processes=2,
+        output_dir=str(tmp_path / "parallel"),
+        batch_size=1,
+        mp_context=multiprocessing.get_context(start_method),
+    )
+    assert rendered_count == 3
+
+    for serial_file in (tmp_path / "serial").iterdir():
+        assert (tmp_path / "parallel" / serial_file.name).read_bytes() == serial_file.read_bytes()
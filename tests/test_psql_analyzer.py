@@ -0,0 +1,62 @@
+from doc_generator.psql_analyzer import scan_source, is_camel_case, SourceAnalyzer
+
+
+def test_case_statistics():
+    statistics = scan_source("SELECT COUNT(*) FROM data_table;")
+
+    assert statistics.length == 32
+    assert statistics.letters == 24
+    assert statistics.lower == 9
+    assert statistics.upper == 15
+
+
+def test_case_statistics_of_code_only():
+    statistics = scan_source("select ID -- Комментарий\n, 'Строка' /* БЛОК */, \"Quoted\" from T")
+
+    assert statistics.letters == len("selectIDfromT")
+    assert statistics.lower == len("selectfrom")
+    assert statistics.upper == len("IDT")
+
+
+def test_camel_case_outside_strings_and_comments():
+    statistics = scan_source(
+        "select myVar, 'StringConst' from t -- CommentWord\n"
+        '/* BlockComment */ "QuotedName", it\'\'s, \'It\'\'s MixedCase\', getIt(1), ÀbC, A1b, aB1'
+    )
+
+    assert statistics.camel_case_identifiers == ("aB1", "getIt", "myVar", "ÀbC")
+
+
+def test_capitalized_keywords_are_not_camel_case():
+    statistics = scan_source("Begin\n  For Select Id, GetBalance From Clients Into :Id Do Suspend;\nEnd")
+
+    assert statistics.camel_case_identifiers == ("GetBalance",)
+    assert not is_camel_case("Select") and not is_camel_case("SelecT") and not is_camel_case("ID")
+    assert is_camel_case("clientId")
+
+
+def test_deprecated_udf_calls():
+    statistics = scan_source(
+        "select z(a), MaxNum (b), c\n(1), minnum, abc(1), 'minnum(1)' /* c(2) */ from rdb$database"
+    )
+
+    assert statistics.deprecated_udfs == ("C", "MAXNUM", "Z")
+
+
+def test_unterminated_comment():
+    statistics = scan_source("select 1 from t /* z(1) camelCase")
+
+    assert statistics.deprecated_udfs == ()
+    assert statistics.camel_case_identifiers == ()
+
+
+def test_analyzer_cache():
+    analyzer = SourceAnalyzer(max_entries=1)
+
+    first = analyzer.analyze("select myVar from t")
+    assert analyzer.analyze("select myVar from t") is first
+    analyzer.analyze("select 1 from t")
+    analyzer.analyze("select myVar from t")
+
+    assert analyzer.hits == 1
+    assert analyzer.misses == 3
@@ -0,0 +1,91 @@
+import jinja2
+
+from doc_generator import generate_doc
+from doc_generator.generate_doc import (
+    render_to_file,
+    write_data_files,
+    get_tables_rows,
+    get_procedures_rows,
+    get_call_graph,
+    get_bytecode_cache,
+    env,
+    TEMPLATE_DIR,
+    TEMPLATE_CACHE_ENV,
+)
+from doc_generator.models import Procedure, ProcedureSource, ProcedureParameter, Table, Field
+from doc_generator.output import DirectorySink
+from tests.conftest import get_procedure
+
+
+def test_render_to_file_matches_render(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_doc, "sink", DirectorySink(str(tmp_path)))
+    tables = [{"name": f"TABLE{number}", "description": None, "fields": []} for number in range(100)]
+    tables_summary = {"total_count": 100, "description_count": 0}
+
+    render_to_file("tables.html", "tables.html", tables=tables, tables_summary=tables_summary)
+
+    expected = env.get_template("tables.html").render(tables=tables, tables_summary=tables_summary)
+    assert (tmp_path / "tables.html").read_text(encoding="utf-8") == expected
+
+
+def test_index_coverage_table_id():
+    html = env.get_template("index-coverage.html").render(columns=[], threshold=3)
+
+    assert 'id="index_coverage_table"' in html and "$('#index_coverage_table')" in html
+    assert "procedure_table" not in html
+
+
+def test_write_data_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_doc, "sink", DirectorySink(str(tmp_path)))
+    procedure = Procedure(
+        name="PROCEDURE1",
+        description="описание",
+        source=ProcedureSource(text="begin end", length=9, lower_percent=100, upper_percent=0),
+    )
+    procedure.parameters.input.append(ProcedureParameter(name="ID"))
+    table = Table(name="TABLE1", description=None, fields=[Field(name="ID", type="integer", description=None)])
+
+    write_data_files({procedure.name: procedure}, get_tables_rows([table]))
+
+    assert (tmp_path / "procedures-data.js").read_text(encoding="utf-8") == (
+        'var PROCEDURES_DATA = [["PROCEDURE1",1,1,0,0,0,0,9,0,100,0,0,0,0,null,null,null,null,null]];\n'
+    )
+    assert (tmp_path / "tables-data.js").read_text(encoding="utf-8") == 'var TABLES_DATA = [["TABLE1",null,1]];\n'
+    assert (tmp_path / "call-graph.js").read_text(encoding="utf-8") == (
+        'var CALL_GRAPH = {"max_depth":5,"names":["PROCEDURE1"],"edges":[[]]};\n'
+    )
+
+
+def test_procedures_rows_percent_rounding():
+    source = ProcedureSource(text="", length=8, lower_percent=12.5, upper_percent=87.5)
+    row = get_procedures_rows([Procedure(name="PROCEDURE1", description=None, source=source)])[0]
+
+    # Как фильтр round в прежнем шаблоне procedures.html
+    expected = env.from_string("{{ 87.5|round }} {{ 12.5|round }}").render()
+    assert f"{row[8]} {row[9]}" == expected == "88.0 12.0"
+
+
+def test_get_call_graph():
+    procedures = {
+        name: get_procedure(name)
+        for name in ("PROCEDURE1", "PROCEDURE2", "PROCEDURE3")
+    }
+    procedures["PROCEDURE1"].dependencies.procedure.extend((procedures["PROCEDURE2"], procedures["PROCEDURE3"]))
+    procedures["PROCEDURE3"].dependencies.procedure.append(procedures["PROCEDURE1"])
+
+    call_graph = get_call_graph(procedures)
+
+    assert call_graph["names"] == ["PROCEDURE1", "PROCEDURE2", "PROCEDURE3"]
+    assert call_graph["edges"] == [[1, 2], [], [0]]
+
+
+def test_template_bytecode_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv(TEMPLATE_CACHE_ENV, str(tmp_path / "cache"))
+    environment = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATE_DIR), bytecode_cache=get_bytecode_cache())
+
+    environment.get_template("index.html").render()
+
+    assert len(list((tmp_path / "cache").iterdir())) == 2
+
+    monkeypatch.setenv(TEMPLATE_CACHE_ENV, "")
+    assert get_bytecode_cache() is None
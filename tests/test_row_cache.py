@@ -0,0 +1,75 @@
+import pytest
+from unittest.mock import MagicMock
+
+from doc_generator.fb_gateway import FirebirdGateway, with_caching
+from doc_generator.fb_row_models import TableRow, CountRow
+from doc_generator.row_cache import RowCache
+
+
+class FakeGateway(FirebirdGateway):
+    def __init__(self, dsn, cache=None):
+        super().__init__(dsn, "", "", cache=cache)
+        self.query = MagicMock(side_effect=lambda: [TableRow(name=self._dsn, description=None)])
+
+    @with_caching()
+    def get_tables(self):
+        for row in self.query():
+            yield row
+
+    @with_caching()
+    def get_tables_count(self):
+        return CountRow(count=len(self.query()))
+
+
+def test_cache_hit_returns_same_rows():
+    gateway = FakeGateway("db1")
+
+    first_result = gateway.get_tables()
+    second_result = gateway.get_tables()
+
+    assert isinstance(first_result, tuple)
+    assert second_result is first_result
+    assert gateway.query.call_count == 1
+    assert gateway.cache.hits == 1
+    assert gateway.cache.misses == 1
+    assert gateway.cache.hit_ratio == 0.5
+
+
+def test_cache_scoped_by_dsn():
+    shared_cache = RowCache()
+    first_gateway = FakeGateway("db1", cache=shared_cache)
+    second_gateway = FakeGateway("db2", cache=shared_cache)
+
+    assert first_gateway.get_tables()[0].name == "db1"
+    assert second_gateway.get_tables()[0].name == "db2"
+
+    separate_gateway = FakeGateway("db1")
+    separate_gateway.get_tables()
+    assert separate_gateway.query.call_count == 1
+
+
+def test_cache_invalidation():
+    gateway = FakeGateway("db1")
+    gateway.get_tables()
+    gateway.get_tables_count()
+
+    assert gateway.invalidate_cache(method_name="get_tables") == 1
+    gateway.get_tables()
+    gateway.get_tables_count()
+
+    assert gateway.query.call_count == 3
+    assert gateway.invalidate_cache() == 2
+
+
+@pytest.mark.parametrize("max_rows, expected_calls", [(None, 1), (1, 2), (0, 3)])
+def test_cache_size_bound(max_rows, expected_calls):
+    cache = RowCache(max_rows=max_rows)
+
+    loader = MagicMock(side_effect=lambda: iter([1]))
+    other_loader = MagicMock(side_effect=lambda: iter([2]))
+    cache.get_or_load(("db", "first", ()), loader)
+    cache.get_or_load(("db", "second", ()), other_loader)
+    cache.get_or_load(("db", "first", ()), loader)
+    cache.get_or_load(("db", "first", ()), loader)
+
+    assert loader.call_count + other_loader.call_count == expected_calls + 1
@@ -0,0 +1,75 @@
+import json
+
+from doc_generator.generate_doc import ProcedureDataFactory, TablesDataFactory, env
+from doc_generator.schema_diff import diff_schemas, get_changes_data, get_changes_job
+from doc_generator.snapshot import InMemoryGateway
+
+
+COUNTS = {
+    "get_procedures_count": 2,
+    "get_procedures_description_count": 0,
+    "get_tables_count": 1,
+    "get_tables_description_count": 0,
+}
+
+
+def get_catalog(procedures, parameters, dependencies, fields):
+    gateway = InMemoryGateway(
+        sections={
+            "procedures": procedures,
+            "procedure_parameters": parameters,
+            "procedure_dependencies": dependencies,
+            "tables": [["TABLE1", None]],
+            "fields": fields,
+        },
+        counts=COUNTS,
+    )
+    _, procedures = ProcedureDataFactory(gateway=gateway).get_data()
+    return procedures, TablesDataFactory(gateway=gateway).get_tables()
+
+
+def test_diff_schemas():
+    old_procedures, old_tables = get_catalog(
+        procedures=[["P1", None, "begin\n  select 1;\nend"], ["P2", None, "begin end"], ["P3", None, "begin end"]],
+        parameters=[["P1", None, "A", 0]],
+        dependencies=[["P1", "TABLE1", None, 0], ["P2", "P3", None, 5]],
+        fields=[["TABLE1", "ID", 8, 4, None], ["TABLE1", "NAME", 37, 10, None]],
+    )
+    new_procedures, new_tables = get_catalog(
+        procedures=[
+            ["P1", None, "begin\n  select 2;\nend"],
+            ["P2", "описание", "begin end"],
+            ["P4", None, "begin end"],
+        ],
+        parameters=[["P1", None, "A", 0], ["P1", None, "B", 0]],
+        dependencies=[["P1", "TABLE1", None, 0]],
+        fields=[["TABLE1", "ID", 8, 4, "Идентификатор"], ["TABLE1", "CODE", 8, 4, None]],
+    )
+
+    schema_diff = diff_schemas(old_procedures, old_tables, new_procedures, new_tables, "v1", "v2")
+
+    assert schema_diff.procedures.added == ["P4"]
+    assert schema_diff.procedures.removed == ["P3"]
+    p1, p2 = schema_diff.procedures.changed
+    assert p1.aspects == ["source", "parameters"]
+    assert p1.added == ["input:B"]
+    assert "-  select 1;" in p1.source_diff and "+  select 2;" in p1.source_diff
+    assert p2.aspects == ["description", "dependencies"]
+    assert p2.removed == ["procedure:P3"]
+    assert not p2.source_diff
+
+    (table,) = schema_diff.tables.changed
+    assert (table.added, table.removed, table.changed) == (["field:CODE"], ["field:NAME"], ["field:ID"])
+
+    assert json.loads(get_changes_data(schema_diff))["procedures"]["added"] == ["P4"]
+    job = get_changes_job(schema_diff)
+    assert "procedure-P4.html" in env.get_template(job.template).render(**job.context)
+
+
+def test_diff_schemas_unchanged():
+    catalog = get_catalog([["P1", None, "begin end"]], [], [], [["TABLE1", "ID", 8, 4, None]])
+
+    schema_diff = diff_schemas(*catalog, *catalog)
+
+    assert not schema_diff.procedures.changed and not schema_diff.tables.changed
+    assert not schema_diff.procedures.added and not schema_diff.procedures.removed
@@ -0,0 +1,81 @@
+import json
+
+from doc_generator.output import DirectorySink, Precompressor
+from doc_generator.models import ProcedureParameter, Dependency, Table, Field
+from doc_generator.search_index import (
+    SearchIndexBuilder,
+    get_tokens,
+    get_shard_key,
+    write_search_index,
+    LOADED_CALLBACK,
+    META_FILE,
+    NAME_WEIGHT,
+    PARAMETER_WEIGHT,
+    SOURCE_WEIGHT,
+)
+from tests.conftest import get_procedure
+
+
+def read_index_script(path):
+    prefix, text = path.read_text(encoding="utf-8").split("(", 1)
+    assert prefix == LOADED_CALLBACK
+    key, data = json.loads(f"[{text.rstrip().rstrip(';').rstrip(')')}]")
+    assert f"{key}.js" == path.name
+    return data
+
+
+def test_get_tokens():
+    tokens = get_tokens("select CLIENT_ID from GET_CLIENT(:x) -- Баланс клиента")
+
+    assert tokens == {"client_id", "client", "id", "get_client", "get", "баланс", "клиента"}
+
+
+def test_get_shard_key():
+    assert get_shard_key("client") == "63-6c"
+    assert get_shard_key("баланс") == "431-430"
+
+
+def test_builder_weights_and_postings():
+    procedure1 = get_procedure("GET_BALANCE", text="select 1 from clients")
+    procedure1.parameters.input.append(ProcedureParameter(name="CLIENT_ID"))
+    procedure2 = get_procedure("CLIENTS_LIST")
+    procedure2.dependencies.table.append(Dependency(name="CLIENTS"))
+
+    builder = SearchIndexBuilder()
+    builder.add_procedures([procedure1, procedure2])
+    table = Table(name="CLIENTS", description=None, fields=[Field(name="ID", type="integer", description=None)])
+    builder.add_tables([table])
+    shards = builder.get_shards()
+
+    assert shards["63-6c"]["client"] == [0, PARAMETER_WEIGHT]
+    assert shards["63-6c"]["clients"] == [0, SOURCE_WEIGHT, 1, NAME_WEIGHT | 4, 1, NAME_WEIGHT]
+    assert builder.get_meta(shards)["documents"] == [("p", "GET_BALANCE"), ("p", "CLIENTS_LIST"), ("t", "CLIENTS")]
+
+
+def test_write_search_index(tmp_path):
+    sink = DirectorySink(str(tmp_path))
+    write_search_index([get_procedure("GET_BALANCE"), get_procedure("OLD_PROCEDURE")], [], sink=sink)
+    search_dir = tmp_path / "search"
+
+    meta = read_index_script(search_dir / META_FILE)
+    assert meta["documents"] == [["p", "GET_BALANCE"], ["p", "OLD_PROCEDURE"]]
+    assert read_index_script(search_dir / "67-65.js") == {"get": [0, NAME_WEIGHT], "get_balance": [0, NAME_WEIGHT]}
+    shard_mtime = (search_dir / "67-65.js").stat().st_mtime_ns
+
+    write_search_index([get_procedure("GET_BALANCE")], [], sink=sink)
+
+    assert not (search_dir / "6f-6c.js").exists()
+    assert (search_dir / "67-65.js").stat().st_mtime_ns == shard_mtime
+    assert sorted(meta["shards"]) == meta["shards"]
+
+
+def test_write_search_index_keeps_compressed_copies(tmp_path):
+    with DirectorySink(str(tmp_path), after_write=Precompressor(gzip_level=9)) as sink:
+        write_search_index([get_procedure("GET_BALANCE"), get_procedure("OLD_PROCEDURE")], [], sink=sink)
+    with DirectorySink(str(tmp_path), after_write=Precompressor(gzip_level=9)) as sink:
+        write_search_index([get_procedure("GET_BALANCE")], [], sink=sink)
+    search_dir = tmp_path / "search"
+
+    assert (search_dir / "67-65.js.gz").exists()
+    assert (search_dir / f"{META_FILE}.gz").exists()
+    assert not (search_dir / "6f-6c.js.gz").exists()
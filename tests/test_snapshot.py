@@ -0,0 +1,103 @@
+import gzip
+import json
+
+import pytest
+from unittest.mock import MagicMock
+
+from doc_generator.fb_gateway import FirebirdGateway
+from doc_generator.fb_row_models import (
+    ProcedureRow,
+    CountRow,
+    ProcedureParameterRow,
+    ProcedureDependencyRow,
+    TableRow,
+    FieldRow,
+    IndexSegmentRow,
+)
+from doc_generator.generate_doc import ProcedureDataFactory, TablesDataFactory
+from doc_generator.snapshot import SnapshotGateway, SnapshotError, export_snapshot
+
+
+@pytest.fixture()
+def gateway():
+    fixture_gateway = FirebirdGateway("", "", "", "")
+
+    fixture_gateway.get_procedures_count = MagicMock(return_value=CountRow(count=2))
+    fixture_gateway.get_procedures_description_count = MagicMock(return_value=CountRow(count=1))
+    fixture_gateway.get_tables_count = MagicMock(return_value=CountRow(count=1))
+    fixture_gateway.get_tables_description_count = MagicMock(return_value=CountRow(count=0))
+    fixture_gateway.get_procedures = MagicMock(
+        side_effect=lambda: [
+            ProcedureRow(name="PROCEDURE1", description=None, source="SELECT 1"),
+            ProcedureRow(name="PROCEDURE2", description="Описание", source="begin end"),
+        ]
+    )
+    fixture_gateway.get_procedure_parameters = MagicMock(
+        side_effect=lambda: [
+            ProcedureParameterRow(procedure_name="PROCEDURE1", dependency_field="P1", name="P1", type=1),
+        ]
+    )
+    fixture_gateway.get_procedure_dependencies = MagicMock(
+        side_effect=lambda: [
+            ProcedureDependencyRow(procedure_name="PROCEDURE2", name="PROCEDURE1", field=None, type=5),
+            ProcedureDependencyRow(procedure_name="PROCEDURE2", name="TABLE1", field=None, type=0),
+        ]
+    )
+    fixture_gateway.get_tables = MagicMock(side_effect=lambda: [TableRow(name="TABLE1", description=None)])
+    fixture_gateway.get_fields = MagicMock(
+        side_effect=lambda: [
+            FieldRow(table_name="TABLE1", name="ID", type=8, length=4, description="Идентификатор"),
+        ]
+    )
+    fixture_gateway.get_index_segments = MagicMock(
+        side_effect=lambda: [
+            IndexSegmentRow("TABLE1", "PK_TABLE1", "ID", 0, True, False, 1.0, "PRIMARY KEY"),
+        ]
+    )
+
+    return fixture_gateway
+
+
+@pytest.fixture()
+def snapshot_path(gateway, tmp_path):
+    path = str(tmp_path / "schema.snapshot")
+    export_snapshot(gateway, path)
+    return path
+
+
+def test_snapshot_rows(gateway, snapshot_path):
+    snapshot_gateway = SnapshotGateway(snapshot_path)
+
+    assert snapshot_gateway.get_procedures_count() == CountRow(count=2)
+    assert snapshot_gateway.get_tables_description_count() == CountRow(count=0)
+    assert list(snapshot_gateway.get_procedures()) == gateway.get_procedures()
+    assert list(snapshot_gateway.get_procedure_parameters()) == gateway.get_procedure_parameters()
+    assert list(snapshot_gateway.get_procedure_dependencies()) == gateway.get_procedure_dependencies()
+    assert list(snapshot_gateway.get_tables()) == gateway.get_tables()
+    assert list(snapshot_gateway.get_fields()) == gateway.get_fields()
+    assert list(snapshot_gateway.get_index_segments()) == gateway.get_index_segments()
+
+
+def test_snapshot_data_factories(snapshot_path):
+    snapshot_gateway = SnapshotGateway(snapshot_path)
+
+    procedures_summary, procedures = ProcedureDataFactory(gateway=snapshot_gateway).get_data()
+    tables = TablesDataFactory(gateway=snapshot_gateway).get_tables()
+
+    assert procedures_summary.total_count == 2
+    assert [dependency.name for dependency in procedures["PROCEDURE2"].dependencies.procedure] == ["PROCEDURE1"]
+    assert [table.name for table in tables] == ["TABLE1"]
+    assert tables[0].fields[0].type == "integer"
+
+
+def test_snapshot_version_mismatch(snapshot_path):
+    with gzip.open(snapshot_path, "rt", encoding="utf-8") as source:
+        lines = source.readlines()
+    header = json.loads(lines[0])
+    header["version"] = 0
+    with gzip.open(snapshot_path, "wt", encoding="utf-8") as out:
+        out.write(json.dumps(header) + "\n")
+        out.writelines(lines[1:])
+
+    with pytest.raises(SnapshotError):
+        SnapshotGateway(snapshot_path).get_procedures_count()
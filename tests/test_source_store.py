@@ -0,0 +1,83 @@
+import os
+
+import run_doc_generator
+from doc_generator import generate_doc, source_store
+from doc_generator.generate_doc import ProcedureDataFactory
+from doc_generator.incremental import get_model_digest
+from doc_generator.output import DirectorySink
+from doc_generator.snapshot import InMemoryGateway, SnapshotGateway, export_snapshot
+from doc_generator.source_store import SourceBlob, SourceStore, read_text, get_digest
+
+
+COUNTS = {
+    "get_procedures_count": 2,
+    "get_procedures_description_count": 0,
+    "get_tables_count": 0,
+    "get_tables_description_count": 0,
+}
+SOURCES = {"PROCEDURE1": "begin\n  -- комментарий\nend", "PROCEDURE2": "begin suspend; end"}
+
+
+def get_gateway():
+    return InMemoryGateway(
+        sections={"procedures": [[name, None, source] for name, source in SOURCES.items()]}, counts=COUNTS
+    )
+
+
+def test_source_store(tmp_path):
+    with SourceStore(directory=str(tmp_path)) as store:
+        first = store.put("первый")
+        second = store.put("second")
+
+        assert (first.read(), second.read()) == ("первый", "second")
+        assert second.offset == first.length == len("первый".encode("utf-8"))
+        assert get_digest(first) == get_digest("первый")
+        assert read_text("text") == "text" and read_text(None) is None
+
+    assert not os.path.exists(store.path)
+
+
+def test_spilled_procedure_source(tmp_path, monkeypatch):
+    snapshot_path = str(tmp_path / "schema.snapshot")
+    export_snapshot(get_gateway(), snapshot_path)
+
+    digests = []
+    for padding in ("", "x" * 100):
+        with SourceStore(directory=str(tmp_path)) as store:
+            monkeypatch.setattr(source_store, "store", store)
+            store.put(padding or "-")
+            _, procedures = ProcedureDataFactory(gateway=SnapshotGateway(snapshot_path)).get_data()
+
+            assert all(isinstance(procedure.source.text, SourceBlob) for procedure in procedures.values())
+            assert {name: procedure.source.read_text() for name, procedure in procedures.items()} == SOURCES
+            digests.append([get_model_digest(procedure) for procedure in procedures.values()])
+
+            exported_path = str(tmp_path / "exported.snapshot")
+            export_snapshot(SnapshotGateway(snapshot_path), exported_path)
+            monkeypatch.setattr(source_store, "store", None)
+            assert [row.source for row in SnapshotGateway(exported_path).get_procedures()] == list(SOURCES.values())
+
+    # Хеш модели не зависит от смещения исходника в файле хранилища
+    assert digests[0] == digests[1]
+
+
+def test_source_store_per_generation(tmp_path, monkeypatch):
+    # run подменяет общий sink, после теста он восстанавливается
+    monkeypatch.setattr(generate_doc, "sink", generate_doc.sink)
+    monkeypatch.setattr(run_doc_generator, "get_sink", lambda **kwargs: DirectorySink(str(tmp_path)))
+    args = run_doc_generator.get_argument_parser().parse_args(["--snapshot", str(tmp_path / "schema.snapshot")])
+    blobs = []
+
+    def generation():
+        blob = source_store.spill("begin end")
+        assert blob.read() == "begin end"
+        blobs.append(blob)
+
+    # Каждая генерация (например, перегенерация в режиме наблюдения) пишет в свое хранилище
+    for _ in range(2):
+        run_doc_generator.run(args, generation)
+        assert source_store.store is None
+
+    assert blobs[0].path != blobs[1].path
+    assert not any(os.path.exists(blob.path) for blob in blobs)
+    assert not source_store._readers  # pylint: disable=protected-access
@@ -0,0 +1,102 @@
+import pytest
+
+from doc_generator.fb_row_models import FieldRow
+from doc_generator.generate_doc import TablesDataFactory, TablesStream, get_render_jobs
+from doc_generator.models import ProceduresSummary, TablesSummary
+from doc_generator.search_index import SearchIndexBuilder
+from doc_generator.snapshot import InMemoryGateway
+
+
+COUNTS = {
+    "get_procedures_count": 0,
+    "get_procedures_description_count": 0,
+    "get_tables_count": 3,
+    "get_tables_description_count": 0,
+}
+
+
+class StreamingGateway(InMemoryGateway):
+    """
+    Шлюз, отдающий поля по одной строке и запоминающий, сколько строк уже прочитано
+    """
+
+    def __init__(self, field_rows, **kwargs):
+        super().__init__(**kwargs)
+        self._field_rows = field_rows
+        self.read_count = 0
+
+    def iter_fields(self):
+        for field_row in self._field_rows:
+            self.read_count += 1
+            yield field_row
+
+
+def get_table_rows():
+    return [["TABLE1", None], ["TABLE2", "Вторая"], ["EMPTY", None]]
+
+
+def test_fields_grouped_by_table():
+    # Снимок прежней версии: поля упорядочены только по позиции
+    gateway = InMemoryGateway(
+        sections={
+            "tables": get_table_rows(),
+            "fields": [
+                ["TABLE2", "ID", 8, 4, None],
+                ["TABLE1", "ID", 8, 4, None],
+                ["TABLE2", "NAME", 37, 20, None],
+                ["TABLE1", "VALUE", 27, 8, None],
+                ["EMPTY", None, None, None, None],
+            ],
+        },
+        counts=COUNTS,
+    )
+
+    tables = {table.name: table for table in TablesDataFactory(gateway=gateway).iter_tables()}
+
+    assert [field.name for field in tables["TABLE1"].fields] == ["ID", "VALUE"]
+    assert [field.type for field in tables["TABLE2"].fields] == ["integer", "varchar(20)"]
+    assert tables["EMPTY"].fields == []
+    assert TablesDataFactory(gateway=gateway).get_tables() == list(tables.values())
+
+
+def test_table_is_yielded_before_next_fields_are_read():
+    field_rows = [
+        FieldRow(table_name="TABLE1", name="ID", type=8, length=4, description=None),
+        FieldRow(table_name="TABLE1", name="VALUE", type=8, length=4, description=None),
+        FieldRow(table_name="TABLE2", name="ID", type=8, length=4, description=None),
+    ]
+    gateway = StreamingGateway(field_rows, sections={"tables": get_table_rows()}, counts=COUNTS)
+
+    tables = TablesDataFactory(gateway=gateway).iter_tables()
+
+    assert next(tables).name == "TABLE1"
+    # Прочитана первая строка следующей таблицы - по ней закончилась группа TABLE1
+    assert gateway.read_count == 3
+    assert [table.name for table in tables] == ["TABLE2", "EMPTY"]
+
+
+def test_interleaved_fields_are_rejected():
+    field_rows = [
+        FieldRow(table_name="TABLE1", name="ID", type=8, length=4, description=None),
+        FieldRow(table_name="TABLE2", name="ID", type=8, length=4, description=None),
+        FieldRow(table_name="TABLE1", name="VALUE", type=8, length=4, description=None),
+    ]
+    gateway = StreamingGateway(field_rows, sections={"tables": get_table_rows()}, counts=COUNTS)
+
+    with pytest.raises(ValueError):
+        list(TablesDataFactory(gateway=gateway).iter_tables())
+
+
+def test_tables_stream():
+    gateway = InMemoryGateway(
+        sections={"tables": [["TABLE1", "Клиенты"]], "fields": [["TABLE1", "ID", 8, 4, None]]}, counts=COUNTS
+    )
+    search_index = SearchIndexBuilder()
+    tables_stream = TablesStream(TablesDataFactory(gateway=gateway).iter_tables(), on_table=search_index.add_table)
+
+    jobs = get_render_jobs(ProceduresSummary(0, 0), {}, TablesSummary(1, 0), tables_stream)
+
+    assert tables_stream.rows == []
+    assert [job.output_file for job in jobs][-2:] == ["table-TABLE1.html", "index-coverage.html"]
+    assert tables_stream.rows == [["TABLE1", "Клиенты", 1]]
+    assert [name for _, name in search_index.get_meta([])["documents"]] == ["TABLE1"]
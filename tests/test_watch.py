@@ -0,0 +1,85 @@
+from unittest.mock import MagicMock
+
+from doc_generator.fb_gateway import FirebirdGateway
+from doc_generator.fb_row_models import MetadataFingerprintRow
+from doc_generator.generate_doc import ProcedureDataFactory
+from doc_generator.snapshot import InMemoryGateway
+from doc_generator.watch import MetadataWatcher
+
+
+COUNTS = {
+    "get_procedures_count": 1,
+    "get_procedures_description_count": 0,
+    "get_tables_count": 0,
+    "get_tables_description_count": 0,
+}
+
+
+def get_gateway():
+    return InMemoryGateway(sections={"procedures": [["PROCEDURE1", None, "begin end"]]}, counts=dict(COUNTS))
+
+
+def test_watch_regenerates_on_change():
+    gateway = get_gateway()
+    generated = []
+    polls = []
+
+    def regenerate():
+        _, procedures = ProcedureDataFactory(gateway=gateway).get_data()
+        generated.append(sorted(procedures))
+
+    def sleep(interval):
+        # Схема меняется между вторым и третьим опросом
+        polls.append(interval)
+        if len(polls) == 2:
+            gateway._sections["procedures"].append(["PROCEDURE2", None, "begin end"])
+            gateway._counts["get_procedures_count"] = 2
+
+    watcher = MetadataWatcher(gateway, regenerate, interval=5, sleep=sleep)
+    watcher.run(max_polls=4)
+
+    assert polls == [5, 5, 5]
+    assert generated == [["PROCEDURE1"], ["PROCEDURE1", "PROCEDURE2"]]
+    assert watcher.regenerations == 2
+
+
+def test_watch_regenerates_on_same_length_source_change():
+    gateway = FirebirdGateway("", "", "", "")
+    cursor = MagicMock()
+    # Исходник изменился с x = 1 на x = 2: длины те же, меняется только хеш исходников
+    cursor.fetchone.side_effect = [
+        (1, 1, 100, 77, 0, 1, 1, 5, 0, 4, 3.5),
+        (1, 1, 100, 77, 0, 1, 1, 5, 0, 4, 3.5),
+        (1, 1, 100, 78, 0, 1, 1, 5, 0, 4, 3.5),
+    ]
+    gateway._cursor = cursor
+    regenerate = MagicMock()
+
+    watcher = MetadataWatcher(gateway, regenerate, sleep=lambda interval: None)
+    watcher.run(max_polls=3)
+
+    assert "hash(RDB$PROCEDURE_SOURCE)" in cursor.execute.call_args[0][0]
+    assert regenerate.call_count == 2
+
+
+def test_watch_retries_failed_generation():
+    gateway = get_gateway()
+    regenerate = MagicMock(side_effect=[RuntimeError("connection lost"), None])
+
+    watcher = MetadataWatcher(gateway, regenerate, sleep=lambda interval: None)
+    watcher.run(max_polls=3)
+
+    assert regenerate.call_count == 2
+    assert watcher.regenerations == 1
+
+
+def test_firebird_fingerprint_ends_transaction():
+    gateway = FirebirdGateway("", "", "", "")
+    cursor = MagicMock()
+    cursor.fetchone.return_value = (2, 2, 100, 77, 3, 1, 1, 5, 12, 4, 3.5)
+    gateway._cursor = cursor
+
+    fingerprint = gateway.get_metadata_fingerprint()
+
+    assert fingerprint == MetadataFingerprintRow(2, 2, 100, 77, 3, 1, 1, 5, 12, 4, 3.5)
+    cursor.transaction.commit.assert_called_once()